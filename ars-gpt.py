@@ -1,8 +1,13 @@
 import sys
-from PyQt6.QtWidgets import QApplication
-from assets.py.ui.main import ARSGPTMainWindow
 
 def main():
+    # Headless mode: ars-gpt.py batch in.jsonl out.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from assets.py.chat.batch_module import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+
+    from PyQt6.QtWidgets import QApplication
+    from assets.py.ui.main import ARSGPTMainWindow
     app = QApplication(sys.argv)
     window = ARSGPTMainWindow()
     window.show()
@@ -0,0 +1,210 @@
+import base64
+import codecs
+import mimetypes
+import mmap
+import os
+from assets.py.chat.retrieval_module import IndexCache, RETRIEVAL_MIN_CHARS, CHUNK_CHARS, TOP_K, format_excerpts
+
+# Size limits; small text goes into the prompt, large text is indexed
+# (see retrieval_module), binaries are sent as native parts
+MAX_TEXT_BYTES = 20 * 1024 * 1024
+MAX_BINARY_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+# Rough prompt cost of one image/file part and of one set of text excerpts, for token budgeting
+ATTACHMENT_TOKENS = 1000
+EXCERPT_TOKENS = TOP_K * CHUNK_CHARS // 4
+
+# Retrieval indexes of large text attachments, shared by every request
+INDEX_CACHE = IndexCache()
+
+# Providers that accept images/files as message parts
+MULTIMODAL_PROVIDERS = {"openai", "google"}
+# MIME types each API takes as parts; any other type fails the whole request,
+# so those files are described in the text instead
+OPENAI_IMAGE_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+OPENAI_FILE_TYPES = {"application/pdf"}
+GEMINI_INLINE_TYPES = {
+    "image/png", "image/jpeg", "image/webp", "image/heic", "image/heif",
+    "audio/wav", "audio/x-wav", "audio/mp3", "audio/mpeg", "audio/aiff", "audio/x-aiff",
+    "audio/aac", "audio/ogg", "audio/flac",
+    "video/mp4", "video/mpeg", "video/quicktime", "video/x-msvideo", "video/x-flv",
+    "video/webm", "video/x-ms-wmv", "video/3gpp", "audio/3gpp",
+    "application/pdf",
+}
+
+
+class AttachmentError(Exception):
+    pass
+
+
+class Attachment:
+    """
+    A file picked by the user, copied into the blob store. Chats only keep
+    the reference from to_dict(); the content is read from the blob on a
+    worker thread when a request is built. Small text files are inlined
+    ("inline"), large ones are indexed under the blob hash.
+    """
+
+    def __init__(self, name, mime, size, kind, blob, inline=False):
+        self.name = name
+        self.mime = mime
+        self.size = size
+        self.kind = kind # "text" | "image" | "file"
+        self.blob = blob # sha256 in the BlobStore
+        self.inline = inline
+
+    def to_dict(self):
+        """Reference stored with the message (no file content)."""
+        attachment = {
+            "name": self.name,
+            "mime": self.mime,
+            "size": self.size,
+            "kind": self.kind,
+            "blob": self.blob,
+        }
+        if self.inline:
+            attachment["inline"] = True
+        return attachment
+
+
+def read_text(path, limit=None, chunk_size=CHUNK_SIZE):
+    """Decodes a UTF-8 file chunk by chunk; raises UnicodeDecodeError for binaries."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    read = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            if read == 0 and b"\x00" in chunk[:8192]:
+                raise UnicodeDecodeError("utf-8", chunk[:1], 0, 1, "binary data")
+            read += len(chunk)
+            if limit is not None and read > limit:
+                raise AttachmentError(f"Text file is larger than {limit // (1024 * 1024)} MB")
+            parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+def load_attachment(path, blob_store, max_text_bytes=MAX_TEXT_BYTES, max_binary_bytes=MAX_BINARY_BYTES):
+    """
+    Checks an attachment, copies it into blob_store and, for large text
+    files, builds the retrieval index. Meant to run on a worker thread.
+    Raises AttachmentError when the file is over the limits.
+    """
+    name = os.path.basename(path)
+    size = os.path.getsize(path)
+    mime = mimetypes.guess_type(name)[0]
+
+    if not mime or mime.startswith("text/") or mime in ("application/json", "application/xml", "application/javascript"):
+        try:
+            text = read_text(path, max_text_bytes)
+        except UnicodeDecodeError:
+            mime = mime if mime and not mime.startswith("text/") else "application/octet-stream"
+        else:
+            blob = blob_store.put_file(path)
+            if len(text) < RETRIEVAL_MIN_CHARS:
+                return Attachment(name, mime or "text/plain", size, "text", blob, inline=True)
+            # Too large to paste: build (or reuse) its index now, off the GUI thread
+            INDEX_CACHE.get(blob, lambda: text)
+            return Attachment(name, mime or "text/plain", size, "text", blob)
+
+    if size > max_binary_bytes:
+        raise AttachmentError(f"File is larger than {max_binary_bytes // (1024 * 1024)} MB")
+    kind = "image" if mime.startswith("image/") else "file"
+    return Attachment(name, mime, size, kind, blob_store.put_file(path))
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def attachment_text(part):
+    """
+    A text attachment as prompt text: the whole file if it is inlined,
+    otherwise the indexed chunks that best match part["query"].
+    """
+    try:
+        if part.get("inline"):
+            return f"Here is a file content ({part['name']}):\n\n{read_text(part['path'])}"
+        key = part.get("blob") or part["sha256"]
+        index = INDEX_CACHE.get(key, lambda: read_text(part["path"]))
+    except (OSError, UnicodeDecodeError):
+        return _unavailable(part, "is no longer available")
+    return format_excerpts(part["name"], index, part.get("query", ""))
+
+def encode_base64(path):
+    """Base64 of a file, encoded straight from a memory map (no extra copy)."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return base64.b64encode(mm).decode("ascii")
+
+
+# ===== PROVIDER PARTS =====
+# Messages built by ContextBuilder use provider-neutral parts:
+#   {"type": "text", "text": ...}
+#   {"type": "attachment", "name", "path", "mime", "kind", ...}
+# ("path" is resolved from the blob hash by ContextBuilder) and are
+# converted right before the request, on the worker thread.
+# Text attachments become prompt text for every provider: inlined whole,
+# or as the excerpts matching the part's "query" (the latest user question).
+
+def content_text(content):
+    """The text of a message content (a string or a list of parts)."""
+    if isinstance(content, str):
+        return content
+    return "\n".join(part["text"] for part in content if part.get("type") == "text")
+
+def _unavailable(part, reason):
+    return f"[Attached file {part['name']} ({part['mime']}) {reason}]"
+
+def openai_content(content, provider="openai"):
+    """Content for OpenAI-compatible APIs; text-only providers get a plain string."""
+    if isinstance(content, str):
+        return content
+    if provider not in MULTIMODAL_PROVIDERS:
+        texts = []
+        for part in content:
+            if part["type"] == "text":
+                texts.append(part["text"])
+            elif part["kind"] == "text":
+                texts.append(attachment_text(part))
+            else:
+                texts.append(_unavailable(part, "can't be read by this model"))
+        return "\n\n".join(texts)
+    parts = []
+    for part in content:
+        if part["type"] == "text":
+            parts.append({"type": "text", "text": part["text"]})
+        elif part["kind"] == "text":
+            parts.append({"type": "text", "text": attachment_text(part)})
+        elif part["mime"] not in OPENAI_IMAGE_TYPES | OPENAI_FILE_TYPES:
+            parts.append({"type": "text", "text": _unavailable(part, "can't be read by this model")})
+        elif not os.path.exists(part["path"]):
+            parts.append({"type": "text", "text": _unavailable(part, "is no longer available")})
+        else:
+            data_url = f"data:{part['mime']};base64,{encode_base64(part['path'])}"
+            if part["mime"] in OPENAI_IMAGE_TYPES:
+                parts.append({"type": "image_url", "image_url": {"url": data_url}})
+            else:
+                parts.append({"type": "file", "file": {"filename": part["name"], "file_data": data_url}})
+    return parts
+
+def gemini_parts(content):
+    if isinstance(content, str):
+        return [{"text": content}]
+    parts = []
+    for part in content:
+        if part["type"] == "text":
+            parts.append({"text": part["text"]})
+        elif part["kind"] == "text":
+            parts.append({"text": attachment_text(part)})
+        elif part["mime"] not in GEMINI_INLINE_TYPES:
+            parts.append({"text": _unavailable(part, "can't be read by this model")})
+        elif not os.path.exists(part["path"]):
+            parts.append({"text": _unavailable(part, "is no longer available")})
+        else:
+            parts.append({"inline_data": {"mime_type": part["mime"], "data": read_bytes(part["path"])}})
+    return parts
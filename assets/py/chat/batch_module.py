@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from assets.py.chat.dispatcher_module import ChatDispatcher, ChatTarget
+from assets.py.chat.metrics_module import percentile
+from assets.py.chat.models_config_module import load_models, active_model, model_type_for, model_targets
+
+# Headless batch runner: uses the dispatcher directly, so no PyQt import is needed.
+# Input lines:  {"id": ..., "prompt": "..."} or {"id": ..., "messages": [{"role", "content"}, ...]}
+#               optional "temperature"; id defaults to the line number
+# Output lines: {"id": ..., "response": "..." | "error": "...", "latency": seconds, "model": ...}
+
+
+def read_jobs(path):
+    jobs = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                print(f"Error reading {path} line {line_no}: {e}")
+                continue
+            if isinstance(job, str):
+                job = {"prompt": job}
+            elif not isinstance(job, dict):
+                print(f"Error reading {path} line {line_no}: expected an object or a string")
+                continue
+            job.setdefault("id", line_no)
+            jobs.append(job)
+    return jobs
+
+def read_done_ids(path):
+    """Ids that already have a response in path (the checkpoint). A line cut
+    short by an interrupted run is ignored; failed jobs are run again."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            if "response" in result:
+                done.add(json.dumps(result.get("id")))
+    return done
+
+def ends_with_newline(path):
+    with open(path, 'rb') as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class BatchRunner:
+    """
+    Runs jobs through a ChatDispatcher with at most `concurrency` requests in
+    flight and appends each result to the output file as soon as it arrives,
+    so an interrupted run can resume where it stopped.
+    """
+
+    def __init__(self, api_key, model, base_url=None, fallbacks=None, concurrency=4, limits=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.fallbacks = fallbacks
+        self.concurrency = concurrency
+        providers = {"openai", "google", "deepseek"}
+        self.dispatcher = ChatDispatcher(max_workers=concurrency,
+                                         provider_limits={p: concurrency for p in providers})
+        # Keys with "rpm"/"tpm" in models.json override the provider defaults
+        for target in [ChatTarget(api_key, model, base_url, limits=limits)] + list(fallbacks or []):
+            if target.limits:
+                self.dispatcher.rate_limiter.configure(target)
+
+        self.latencies = []
+        self.errors = 0
+        self._slot_count = concurrency * 2 # Keep the queue short
+        self._slots = threading.Semaphore(self._slot_count)
+        self._lock = threading.Lock()
+
+    def run(self, jobs, out_path):
+        started = time.monotonic()
+        with open(out_path, 'a', encoding='utf-8') as out:
+            # Don't glue the first result onto a line cut short by an interrupted run
+            if not ends_with_newline(out_path):
+                out.write("\n")
+            try:
+                for job in jobs:
+                    self._slots.acquire()
+                    self._submit(job, out)
+                # Each callback gives its slot back after writing its result; the
+                # dispatcher is idle before the last callbacks have run
+                for _ in range(self._slot_count):
+                    self._slots.acquire()
+                for _ in range(self._slot_count):
+                    self._slots.release()
+            except KeyboardInterrupt:
+                print("\nInterrupted, finished results are saved; run again to resume.")
+                self.dispatcher.shutdown()
+        return time.monotonic() - started
+
+    def _submit(self, job, out):
+        messages = job.get("messages") or job.get("prompt", "")
+        submitted = time.monotonic()
+
+        def finish(result):
+            result["latency"] = round(time.monotonic() - submitted, 3)
+            result["model"] = self.model
+            with self._lock:
+                if "error" in result:
+                    self.errors += 1
+                else:
+                    self.latencies.append(result["latency"])
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+            self._slots.release()
+
+        self.dispatcher.submit(
+            self.api_key, self.model, messages,
+            params={"temperature": job.get("temperature")}, use_cache=False,
+            base_url=self.base_url, fallbacks=self.fallbacks,
+            on_done=lambda _, text: finish({"id": job["id"], "response": text}),
+            on_error=lambda _, error: finish({"id": job["id"], "error": error}),
+            on_cancel=lambda _: self._slots.release()
+        )
+
+    def summary(self, elapsed):
+        total = len(self.latencies) + self.errors
+        lines = [
+            f"Requests:   {total} ({len(self.latencies)} ok, {self.errors} failed)",
+            f"Elapsed:    {elapsed:.1f}s",
+            f"Throughput: {total / elapsed if elapsed else 0.0:.2f} requests/s",
+            f"Latency:    p50 {percentile(self.latencies, 0.5) or 0.0:.2f}s, p95 {percentile(self.latencies, 0.95) or 0.0:.2f}s",
+            f"Error rate: {100.0 * self.errors / total if total else 0.0:.1f}%",
+        ]
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="ars-gpt.py batch",
+                                     description="Run a JSONL file of prompts with the active model in api/models.json.")
+    parser.add_argument("input", help="JSONL file, one prompt per line")
+    parser.add_argument("output", help="JSONL results file; existing results are kept and skipped")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="requests in flight (default 4)")
+    parser.add_argument("--failover", action="store_true", help="hedge/fail over to the other configured keys")
+    args = parser.parse_args(argv)
+
+    models = load_models()
+    name, info = active_model(models)
+    if not info or not info.get("key"):
+        print("Error: no active model with an API key in api/models.json")
+        return 1
+    model = model_type_for(name, info)
+    if model is None:
+        print(f"Error: unknown provider for {name}; add a \"model\" field to its entry in api/models.json")
+        return 1
+    targets = model_targets(models)
+    limits = next((t.limits for t in targets if t.name == name), None)
+    fallbacks = [t for t in targets if t.name != name] if args.failover else None
+
+    jobs = read_jobs(args.input)
+    done = read_done_ids(args.output)
+    todo = [job for job in jobs if json.dumps(job["id"]) not in done]
+    if len(todo) < len(jobs):
+        print(f"Resuming: {len(jobs) - len(todo)} of {len(jobs)} already done")
+    print(f"Running {len(todo)} requests on {name} ({model}), concurrency {args.concurrency}")
+
+    runner = BatchRunner(info["key"], model, info.get("base_url"), fallbacks, max(1, args.concurrency), limits)
+    elapsed = runner.run(todo, args.output)
+    runner.dispatcher.shutdown()
+    print(runner.summary(elapsed))
+    return 1 if runner.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import hashlib
+import os
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+# File times come from a coarse kernel clock and can lag time.time() slightly
+MTIME_SLACK = 1.0
+
+
+class BlobStore:
+    """
+    Content-addressed file store: every blob lives at <root>/<sha[:2]>/<sha>,
+    so identical attachments are stored once and chats only keep the hash.
+    Blobs are written to a temp file and renamed, so a blob that exists is
+    always complete. Storing a blob again refreshes its mtime, which tells
+    collect_garbage() it is in use.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        # (path, size, mtime) -> sha256 of files already stored this session
+        self._known = {}
+        self._lock = threading.Lock()
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256)
+
+    def has(self, sha256):
+        return os.path.exists(self.path_for(sha256))
+
+    def put_file(self, path):
+        """Copies a file into the store in chunks and returns its sha256.
+        An unchanged file that was already stored is not read again."""
+        st = os.stat(path)
+        signature = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            sha256 = self._known.get(signature)
+        if sha256:
+            try:
+                os.utime(self.path_for(sha256))
+                return sha256
+            except OSError:
+                pass # Collected meanwhile; store it again
+
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.root, f".tmp-{threading.get_ident()}-{os.getpid()}")
+        try:
+            with open(path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    dst.write(chunk)
+            sha256 = digest.hexdigest()
+            target = self.path_for(sha256)
+            try:
+                os.utime(target) # Same content is already stored; mark it as in use
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(tmp_path, target)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self._known[signature] = sha256
+        return sha256
+
+    def collect_garbage(self, referenced, since=None):
+        """
+        Deletes every blob whose hash is not in referenced, except those stored
+        at or after since (a time.time(), e.g. for a file still being read).
+        Returns the count.
+        """
+        removed = 0
+        if not os.path.isdir(self.root):
+            return removed
+        for prefix in os.listdir(self.root):
+            folder = os.path.join(self.root, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name not in referenced:
+                    path = os.path.join(folder, name)
+                    try:
+                        if since is not None and os.path.getmtime(path) >= since - MTIME_SLACK:
+                            continue
+                        os.remove(path)
+                        removed += 1
+                    except OSError as e:
+                        logger.warning("Error removing blob %s: %s", name, e)
+        return removed
+
+
+def referenced_blobs(messages):
+    """Hashes of the blobs a chat's messages point to."""
+    return {a["blob"] for m in messages for a in m.get("attachments", []) if a.get("blob")}
@@ -1,51 +1,385 @@
 import json
 import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from assets.py.chat.journal_module import list_chats, chat_stem, load_messages
+from assets.py.chat.blob_store_module import referenced_blobs
 
-HISTORY_DIR = "chat_history"
-ARCHIVE_DIR = os.path.join(HISTORY_DIR, "archived")
-
-if not os.path.exists(HISTORY_DIR):
-    os.makedirs(HISTORY_DIR)
-if not os.path.exists(ARCHIVE_DIR):
-    os.makedirs(ARCHIVE_DIR)
-
-def get_history_files():
-    return sorted([f for f in os.listdir(HISTORY_DIR) if f.endswith(".json")])
-
-def save_chat(chat_id, messages):
-    file_path = os.path.join(HISTORY_DIR, f"{chat_id}.json")
-    with open(file_path, 'w') as f:
-        json.dump(messages, f, indent=4)
-
-def load_chat(chat_id):
-    file_path = os.path.join(HISTORY_DIR, f"{chat_id}.json")
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    return []
-
-def create_new_chat_id():
-    return datetime.now().strftime("%Y%m%d_%H%M%S")
-
-def archive_chat(chat_id):
-    """Moves a chat from the history to the archive."""
-    src = os.path.join(HISTORY_DIR, f"{chat_id}.json")
-    dst = os.path.join(ARCHIVE_DIR, f"{chat_id}.json")
-    if os.path.exists(src):
-        os.rename(src, dst)
-
-def delete_chat(chat_id):
-    """Deletes a chat file."""
-    file_path = os.path.join(HISTORY_DIR, f"{chat_id}.json")
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
-def rename_chat(old_chat_id, new_chat_id):
-    """Renames a chat file."""
-    old_file = os.path.join(HISTORY_DIR, f"{old_chat_id}.json")
-    new_file = os.path.join(HISTORY_DIR, f"{new_chat_id}.json")
-    if os.path.exists(old_file):
-        os.rename(old_file, new_file)
-        return True
-    return False
\ No newline at end of file
+logger = logging.getLogger(__name__)
+
+# Legacy chat folders (one file per chat), imported once into the database
+LEGACY_ARCHIVE_DIRS = ("archive", "archived")
+
+# Characters of the last message kept in the chat manifest
+MANIFEST_SNIPPET_CHARS = 120
+
+# The chats table doubles as the manifest the sidebar is built from: one row
+# per chat with its message count and the start of its last message, kept up
+# to date by triggers, so listing never touches the messages
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    archived INTEGER NOT NULL DEFAULT 0,
+    message_count INTEGER NOT NULL DEFAULT 0,
+    last_snippet TEXT NOT NULL DEFAULT ''
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    sender TEXT NOT NULL,
+    text TEXT NOT NULL,
+    data TEXT NOT NULL DEFAULT '{}', -- every other message field (prompt, notice, attachments, tokens)
+    UNIQUE (chat_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+MANIFEST_SCHEMA = f"""
+DROP INDEX IF EXISTS chats_by_created;
+CREATE INDEX IF NOT EXISTS chats_by_updated ON chats (archived, updated_at DESC);
+CREATE TRIGGER IF NOT EXISTS manifest_insert AFTER INSERT ON messages BEGIN
+    UPDATE chats SET message_count = message_count + 1,
+        last_snippet = substr(new.text, 1, {MANIFEST_SNIPPET_CHARS})
+    WHERE id = new.chat_id;
+END;
+CREATE TRIGGER IF NOT EXISTS manifest_delete AFTER DELETE ON messages BEGIN
+    UPDATE chats SET message_count = message_count - 1,
+        last_snippet = COALESCE((SELECT substr(text, 1, {MANIFEST_SNIPPET_CHARS}) FROM messages
+                                 WHERE chat_id = old.chat_id ORDER BY position DESC LIMIT 1), '')
+    WHERE id = old.chat_id;
+END;
+"""
+
+# Columns of a manifest row
+CHAT_COLUMNS = "id, title, created_at, updated_at, archived, message_count, last_snippet"
+
+# Full-text indexes (name, table, column, FTS5 options), kept in sync by triggers
+# whenever a message is saved or deleted or a chat renamed:
+#   messages_fts      words of the messages, for word/prefix queries (queries
+#                     shorter than a trigram, so 1-2 character prefixes are indexed)
+#   messages_trigram  trigrams of the messages, for substring queries
+#   chats_trigram     trigrams of the chat titles
+FTS_INDEXES = [
+    ("messages_fts", "messages", "text", "tokenize='unicode61', prefix='1 2'"),
+    ("messages_trigram", "messages", "text", "tokenize='trigram'"),
+    ("chats_trigram", "chats", "title", "tokenize='trigram'"),
+]
+
+def _fts_triggers(name, table, column):
+    """CREATE TRIGGER statements keeping an index in sync, by event."""
+    return {
+        "insert": f"""
+CREATE TRIGGER IF NOT EXISTS {name}_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO {name} (rowid, {column}) VALUES (new.id, new.{column});
+END;""",
+        "delete": f"""
+CREATE TRIGGER IF NOT EXISTS {name}_delete AFTER DELETE ON {table} BEGIN
+    INSERT INTO {name} ({name}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+END;""",
+        "update": f"""
+CREATE TRIGGER IF NOT EXISTS {name}_update AFTER UPDATE OF {column} ON {table} BEGIN
+    INSERT INTO {name} ({name}, rowid, {column}) VALUES ('delete', old.id, old.{column});
+    INSERT INTO {name} (rowid, {column}) VALUES (new.id, new.{column});
+END;""",
+    }
+
+def _fts_schema(name, table, column, options):
+    return [f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5 (
+    {column}, content='{table}', content_rowid='id', {options}
+);"""] + list(_fts_triggers(name, table, column).values())
+
+
+def _split_message(message):
+    data = {k: v for k, v in message.items() if k not in ("sender", "text")}
+    return message.get("sender", "user"), message.get("text", ""), json.dumps(data, ensure_ascii=False)
+
+def _join_message(sender, text, data):
+    message = {"sender": sender, "text": text}
+    message.update(json.loads(data))
+    return message
+
+def fetch_dicts(conn, sql, params=()):
+    cursor = conn.execute(sql, params)
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class HistoryStore:
+    """
+    Chats and their messages in one SQLite database. Listing, search and
+    clearing are indexed queries instead of folder scans; archiving is a
+    flag. Chats are identified by their integer id, so renaming a chat only
+    changes its title.
+    The connection is shared by the GUI and worker threads behind a lock.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(SCHEMA)
+        self._migrate_manifest()
+        self._conn.executescript(MANIFEST_SCHEMA)
+        # Commits by other connections (another window, an external tool) change this
+        self._data_version = self._data_version_now()
+        # Names of the full-text indexes this SQLite build supports (FTS5, trigram
+        # tokenizer since 3.34); search falls back to scans without them
+        self.indexes = set()
+        for name, table, column, options in FTS_INDEXES:
+            self._create_index(name, table, column, options)
+        self.fts = "messages_fts" in self.indexes
+        self.trigram = {"messages_trigram", "chats_trigram"} <= self.indexes
+
+    def _migrate_manifest(self):
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chats)")}
+        if "message_count" in columns:
+            return
+        # Database from before the manifest columns: add and fill them once
+        with self._conn:
+            self._conn.execute("ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("ALTER TABLE chats ADD COLUMN last_snippet TEXT NOT NULL DEFAULT ''")
+            self._conn.execute(f"""
+                UPDATE chats SET
+                    message_count = (SELECT COUNT(*) FROM messages WHERE chat_id = chats.id),
+                    last_snippet = COALESCE((SELECT substr(text, 1, {MANIFEST_SNIPPET_CHARS}) FROM messages
+                                             WHERE chat_id = chats.id ORDER BY position DESC LIMIT 1), '')""")
+
+    def _create_index(self, name, table, column, options):
+        row = self._conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+        self._conn.execute("BEGIN")
+        try:
+            if row and options not in row[0]:
+                # Created by an older version with other options: rebuild it
+                self._conn.execute(f"DROP TABLE {name}")
+                row = None
+            for statement in _fts_schema(name, table, column, options):
+                self._conn.execute(statement)
+            if not row:
+                # New index on an existing database: fill it once
+                self._conn.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+        except sqlite3.OperationalError as e:
+            self._conn.rollback()
+            logger.warning("Search index %s unavailable: %s", name, e)
+            return
+        self._conn.commit()
+        self.indexes.add(name)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def connect(self):
+        """
+        A separate read connection, for long reads (search) that must neither
+        wait for nor block the store's writes (WAL readers see the last commit).
+        """
+        conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextmanager
+    def _bulk(self, event):
+        """
+        For a bulk insert or delete inside a transaction: the per-row index
+        triggers for event are dropped and every index is rebuilt once at the
+        end, which is several times faster than updating them row by row.
+        The drops are part of the transaction (sqlite3 only opens one by itself
+        for DML), so if the block fails, rolling back restores the triggers.
+        """
+        indexes = [i for i in FTS_INDEXES if i[0] in self.indexes]
+        if not self._conn.in_transaction:
+            self._conn.execute("BEGIN")
+        try:
+            for name, _, _, _ in indexes:
+                self._conn.execute(f"DROP TRIGGER {name}_{event}")
+            yield
+        except BaseException:
+            self._conn.rollback()
+            raise
+        for name, table, column, _ in indexes:
+            self._conn.execute(_fts_triggers(name, table, column)[event])
+            self._conn.execute(f"INSERT INTO {name} ({name}) VALUES ('rebuild')")
+
+    def query(self, sql, params=()):
+        """Rows of a read-only query, as dicts."""
+        with self._lock:
+            return fetch_dicts(self._conn, sql, params)
+
+    def _data_version_now(self):
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def changed_elsewhere(self):
+        """True once per batch of commits made through other connections
+        (this store's own writes never count)."""
+        with self._lock:
+            version = self._data_version_now()
+            changed = version != self._data_version
+            self._data_version = version
+            return changed
+
+    # ===== CHATS =====
+    def create_chat(self, title, created_at=None):
+        now = created_at or time.time()
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO chats (title, created_at, updated_at) VALUES (?, ?, ?)", (title, now, now))
+            return cursor.lastrowid
+
+    def list_chats(self, archived=False):
+        """The manifest, most recently active first: [{"id", "title", "created_at",
+        "updated_at", "archived", "message_count", "last_snippet"}, ...]."""
+        return self.query(
+            f"SELECT {CHAT_COLUMNS} FROM chats WHERE archived = ? "
+            "ORDER BY updated_at DESC, id DESC", (int(archived),))
+
+    def get_chat(self, chat_id):
+        rows = self.query(f"SELECT {CHAT_COLUMNS} FROM chats WHERE id = ?", (chat_id,))
+        return rows[0] if rows else None
+
+    def rename_chat(self, chat_id, title):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE chats SET title = ? WHERE id = ?", (title, chat_id))
+
+    def set_archived(self, chat_id, archived=True):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE chats SET archived = ? WHERE id = ?", (int(archived), chat_id))
+
+    # Messages go with their chat (ON DELETE CASCADE); deleting the chat first
+    # spares the manifest triggers from updating a row that is going away
+
+    def delete_chat(self, chat_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+
+    def clear(self, archived=False):
+        """Deletes every chat (not the archived ones unless archived=True)."""
+        where = "" if archived else " WHERE archived = 0"
+        with self._lock, self._conn, self._bulk("delete"):
+            self._conn.execute(f"DELETE FROM chats{where}")
+
+    # ===== MESSAGES =====
+    def load_tail(self, chat_id, limit, before=None):
+        """
+        The last limit messages before position before (the end of the chat by
+        default), read newest first through the (chat_id, position) index, so a
+        page costs the same in any chat. Returns (position of the first, messages).
+        """
+        if before is None:
+            before = 1 << 62
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT position, sender, text, data FROM messages WHERE chat_id = ? AND position < ? "
+                "ORDER BY position DESC LIMIT ?", (chat_id, before, limit)).fetchall()
+        rows.reverse()
+        start = rows[0][0] if rows else 0
+        return start, [_join_message(*row[1:]) for row in rows]
+
+    def append_message(self, chat_id, message):
+        """Saves a message after the chat's last one; returns the position it was saved at."""
+        sender, text, data = _split_message(message)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO messages (chat_id, position, sender, text, data) VALUES "
+                "(?, (SELECT COALESCE(MAX(position) + 1, 0) FROM messages WHERE chat_id = ?), ?, ?, ?)",
+                (chat_id, chat_id, sender, text, data))
+            position = self._conn.execute(
+                "SELECT position FROM messages WHERE id = ?", (cursor.lastrowid,)).fetchone()[0]
+            self._conn.execute("UPDATE chats SET updated_at = ? WHERE id = ?", (time.time(), chat_id))
+        return position
+
+    def truncate_messages(self, chat_id, position):
+        """Deletes the message saved at position (as returned by append_message/load_tail) and every later one."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE chat_id = ? AND position >= ?", (chat_id, position))
+
+    def save_tokens(self, chat_id, counts):
+        """Stores token counts ({position: tokens}) with saved messages, so they're counted once."""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE messages SET data = json_set(data, '$.tokens', ?) WHERE chat_id = ? AND position = ?",
+                [(tokens, chat_id, position) for position, tokens in counts.items()])
+
+    def _insert_messages(self, chat_id, messages):
+        self._conn.executemany(
+            "INSERT INTO messages (chat_id, position, sender, text, data) VALUES (?, ?, ?, ?, ?)",
+            [(chat_id, i, *_split_message(m)) for i, m in enumerate(messages)])
+
+    def referenced_blobs(self):
+        """Hashes of the attachment blobs any chat (archived ones too) points to."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT data FROM messages WHERE data LIKE '%\"attachments\"%'").fetchall()
+        return referenced_blobs(json.loads(data) for (data,) in rows)
+
+    # ===== LEGACY IMPORT =====
+    def is_imported(self):
+        return bool(self.query("SELECT 1 FROM meta WHERE key = 'legacy_imported'"))
+
+    def import_legacy(self, history_dir, workers=None):
+        """
+        One-time import of the old one-file-per-chat folders (history_dir and
+        its archive folders). Files are read in parallel and inserted in one
+        transaction, so an interrupted import simply runs again next time.
+        The files are left in place. Returns the number of chats imported.
+        """
+        if self.is_imported():
+            return 0
+        paths = []
+        for folder, archived in [(history_dir, False)] + [(os.path.join(history_dir, d), True) for d in LEGACY_ARCHIVE_DIRS]:
+            paths += [(os.path.join(folder, f), archived) for f in list_chats(folder)]
+
+        workers = workers or min(8, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            chats = [chat for chat in pool.map(_read_legacy_chat, paths) if chat]
+
+        with self._lock, self._conn, self._bulk("insert"):
+            for title, created_at, archived, messages in chats:
+                cursor = self._conn.execute(
+                    "INSERT INTO chats (title, created_at, updated_at, archived) VALUES (?, ?, ?, ?)",
+                    (title, created_at, created_at, int(archived)))
+                self._insert_messages(cursor.lastrowid, messages)
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', ?)",
+                               (str(time.time()),))
+        logger.info("Imported %s chats from %s", len(chats), history_dir)
+        return len(chats)
+
+
+_LEGACY_NAME_RE = re.compile(r"^(\d{8}_\d{6})_(.*)$")
+
+def _read_legacy_chat(item):
+    """(title, created_at, archived, messages) of a YYYYMMDD_HHMMSS_Title chat file, or None."""
+    path, archived = item
+    try:
+        messages = load_messages(path)
+        created_at = os.path.getmtime(path)
+    except (OSError, ValueError) as e:
+        logger.warning("Error importing %s: %s", path, e)
+        return None
+    if not isinstance(messages, list):
+        return None
+    title = chat_stem(os.path.basename(path))
+    match = _LEGACY_NAME_RE.match(title)
+    if match:
+        created_at = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+        title = match.group(2)
+    return title, created_at, archived, messages
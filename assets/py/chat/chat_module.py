@@ -1,57 +1,53 @@
 # chat_module.py
-from PyQt6.QtCore import QObject, QThread, pyqtSignal
-from google import genai
-import openai
+from PyQt6.QtCore import QObject, pyqtSignal
+from assets.py.chat.dispatcher_module import ChatDispatcher
 import logging
 
 class ChatModule(QObject):
-    ai_response = pyqtSignal(str)     # emits AI message
-    error_signal = pyqtSignal(str)    # emits crash info
+    # Every signal carries the request id returned by send_message
+    ai_response = pyqtSignal(int, str)     # emits AI message
+    ai_delta = pyqtSignal(int, str)        # emits streamed chunks of the AI message
+    error_signal = pyqtSignal(int, str)    # emits crash info
+    cancelled = pyqtSignal(int)            # emits once an aborted request has stopped
 
-    def __init__(self, api_key):
+    def __init__(self, api_key, client_pool=None, response_cache=None, metrics=None):
         super().__init__()
         self.api_key = api_key
-
-    def send_message(self, model, text):
-        self.thread = QThread()
-        self.worker = ChatWorker(self.api_key, model, text)
-        self.worker.moveToThread(self.thread)
-
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.ai_response.emit)
-        self.worker.error.connect(self.error_signal.emit)
-        self.worker.finished.connect(self.thread.quit)
-
-        self.thread.start()
-
-
-class ChatWorker(QObject):
-    finished = pyqtSignal(str)
-    error = pyqtSignal(str)
-
-    def __init__(self, api_key, model, text):
-        super().__init__()
-        self.api_key = api_key
-        self.model = model
-        self.text = text
-
-    def run(self):
-        try:
-            if "gemini" in self.model:
-                client = genai.Client(api_key=self.api_key)
-                response = client.models.generate_content(
-                    model="gemini-3-flash-preview", # Using a known valid model
-                    contents=self.text
-                )
-                self.finished.emit(response.text)
-
-            else:
-                openai_client = openai.OpenAI(api_key=self.api_key)
-                result = openai_client.chat.completions.create(
-                    model=self.model,
-                    messages=[{"role": "user", "content": self.text}]
-                )
-                self.finished.emit(result.choices[0].message.content)
-
-        except Exception as e:
-            self.error.emit(str(e))
+        self.temperature = None
+        self.base_url = None # Custom endpoint for api_key, if any
+        # One long-lived dispatcher (worker pool + queue) serves every request
+        self.dispatcher = ChatDispatcher(client_pool, response_cache=response_cache, metrics=metrics)
+        self.client_pool = self.dispatcher.client_pool
+        # Per-key requests/tokens-per-minute buckets
+        self.rate_limiter = self.dispatcher.rate_limiter
+
+    def set_response_cache(self, cache):
+        # None disables caching
+        self.dispatcher.response_cache = cache
+
+    def send_message(self, model, messages, stream=False, chat_id=None, use_cache=True, fallbacks=None):
+        """Queues a request and returns its id. messages is a role/content list
+        or a single prompt string; fallbacks are ChatTargets to hedge to when
+        the active key is slow or failing. Signals are emitted from worker
+        threads and delivered to GUI-thread slots through queued connections."""
+        return self.dispatcher.submit(
+            self.api_key, model, messages, stream=stream, chat_id=chat_id,
+            params={"temperature": self.temperature}, use_cache=use_cache,
+            base_url=self.base_url, fallbacks=fallbacks,
+            on_delta=self.ai_delta.emit,
+            on_done=self.ai_response.emit,
+            on_error=self.error_signal.emit,
+            on_cancel=self.cancelled.emit,
+        )
+
+    def is_running(self):
+        return self.dispatcher.pending_count() > 0
+
+    def cancel(self, request_id):
+        """Drops a queued request or aborts the HTTP connection of a running one."""
+        return self.dispatcher.cancel(request_id)
+
+    def shutdown(self, timeout=2.0):
+        """Aborts every request and stops the worker threads."""
+        self.dispatcher.shutdown(timeout)
+        self.client_pool.close()
@@ -0,0 +1,193 @@
+import threading
+import socket
+import time
+import logging
+import httpcore
+import httpx
+from google import genai
+from google.genai import types
+import openai
+
+logger = logging.getLogger(__name__)
+
+# OpenAI-compatible providers that need a non-default endpoint
+PROVIDER_BASE_URLS = {
+    "deepseek": "https://api.deepseek.com",
+}
+
+def provider_for_model(model):
+    """Maps a model type (e.g. "gemini", "gpt-4o") to its provider name."""
+    if "gemini" in model:
+        return "google"
+    if "deepseek" in model:
+        return "deepseek"
+    return "openai"
+
+
+class RequestAborted(Exception):
+    """Raised on a requesting thread whose request was aborted before it was sent."""
+
+
+class _TrackedStream(httpcore.NetworkStream):
+    # A pooled connection's socket stream that notes which thread last sent a
+    # request on it, so that request can be aborted before its response arrives
+
+    def __init__(self, stream, owners):
+        self._stream = stream
+        self._owners = owners
+
+    def read(self, max_bytes, timeout=None):
+        return self._stream.read(max_bytes, timeout)
+
+    def write(self, buffer, timeout=None):
+        self._owners[threading.get_ident()] = self
+        self._stream.write(buffer, timeout)
+
+    def close(self):
+        self._stream.close()
+
+    def start_tls(self, ssl_context, server_hostname=None, timeout=None):
+        return _TrackedStream(self._stream.start_tls(ssl_context, server_hostname, timeout), self._owners)
+
+    def get_extra_info(self, info):
+        return self._stream.get_extra_info(info)
+
+
+class _TrackingBackend(httpcore.NetworkBackend):
+    # Wraps the streams of every connection a transport opens in _TrackedStream
+
+    def __init__(self, backend, owners):
+        self._backend = backend
+        self._owners = owners
+
+    def connect_tcp(self, *args, **kwargs):
+        return _TrackedStream(self._backend.connect_tcp(*args, **kwargs), self._owners)
+
+    def connect_unix_socket(self, *args, **kwargs):
+        return _TrackedStream(self._backend.connect_unix_socket(*args, **kwargs), self._owners)
+
+    def sleep(self, seconds):
+        self._backend.sleep(seconds)
+
+
+def _shutdown_socket(network_stream):
+    # Wakes a thread blocked reading the socket; the provider sees the disconnect
+    sock = network_stream.get_extra_info("socket") if network_stream else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class ClientPool:
+    """
+    Keeps one long-lived SDK client per (provider, API key).
+    The SDK clients hold keep-alive HTTP connection pools, so reusing them
+    skips the TCP/TLS handshake on every message.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+        # Open HTTP response per requesting thread, so requests can be aborted
+        self._responses = {}
+        # When that response's headers arrived (monotonic), for metrics
+        self._response_times = {}
+        # Connection stream each thread last sent a request on, and threads
+        # whose request was aborted before its response headers arrived
+        self._streams = {}
+        self._cancelled = set()
+
+    def get(self, provider, api_key, base_url=None):
+        key = (provider, api_key, base_url)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create(provider, api_key, base_url)
+                self._clients[key] = client
+            return client
+
+    def _create(self, provider, api_key, base_url):
+        event_hooks = {"request": [self._check_cancelled], "response": [self._track_response]}
+        if provider == "google":
+            http_client = self._track_streams(httpx.Client(event_hooks=event_hooks, follow_redirects=True))
+            http_options = types.HttpOptions(base_url=base_url, httpx_client=http_client)
+            return genai.Client(api_key=api_key, http_options=http_options)
+
+        # The dispatcher owns retries (rate limits, backoff), so the SDK must not retry too
+        http_client = self._track_streams(openai.DefaultHttpxClient(event_hooks=event_hooks))
+        base_url = base_url or PROVIDER_BASE_URLS.get(provider)
+        if base_url:
+            return openai.OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        return openai.OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+
+    def _track_streams(self, http_client):
+        # Has the client's transports (proxy mounts too) wrap their connections
+        # in _TrackedStream. httpx has no public hook for the network backend
+        for transport in [http_client._transport] + list(http_client._mounts.values()):
+            pool = getattr(transport, "_pool", None)
+            if pool is not None:
+                pool._network_backend = _TrackingBackend(pool._network_backend, self._streams)
+        return http_client
+
+    def _check_cancelled(self, request):
+        # Runs on the requesting thread before the request is sent
+        if threading.get_ident() in self._cancelled:
+            raise RequestAborted("Request aborted")
+
+    def _track_response(self, response):
+        # Runs on the requesting thread as soon as the response headers arrive
+        thread_id = threading.get_ident()
+        self._responses[thread_id] = response
+        self._response_times[thread_id] = time.monotonic()
+        if thread_id in self._cancelled:
+            # Aborted while waiting for the headers; don't read the answer
+            self.abort(thread_id)
+
+    def response_time(self, thread_id=None):
+        """When the current response on thread_id started arriving, or None."""
+        return self._response_times.get(thread_id or threading.get_ident())
+
+    def release(self, thread_id=None):
+        """Forgets the request state tracked for thread_id (the calling thread if None)."""
+        thread_id = thread_id or threading.get_ident()
+        self._responses.pop(thread_id, None)
+        self._response_times.pop(thread_id, None)
+        self._streams.pop(thread_id, None)
+        self._cancelled.discard(thread_id)
+
+    def abort(self, thread_id):
+        """
+        Aborts the HTTP request running on thread_id.
+        The socket is shut down first, so a thread blocked reading it wakes up
+        immediately and the provider sees the disconnect and stops generating.
+        Before the response headers arrive, the connection the request was
+        sent on is shut down instead; a request not sent yet never will be.
+        """
+        response = self._responses.pop(thread_id, None)
+        if response is None:
+            self._cancelled.add(thread_id)
+            _shutdown_socket(self._streams.get(thread_id))
+            return
+
+        _shutdown_socket(response.extensions.get("network_stream"))
+        try:
+            response.close()
+        except Exception as e:
+            logger.warning("Error closing response: %s", e)
+
+    def invalidate(self, api_key=None):
+        """Closes and drops pooled clients for api_key (all clients if None)."""
+        with self._lock:
+            stale = [k for k in self._clients if api_key is None or k[1] == api_key]
+            clients = [self._clients.pop(k) for k in stale]
+
+        for client in clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning("Error closing client: %s", e)
+
+    def close(self):
+        self.invalidate()
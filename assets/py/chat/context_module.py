@@ -0,0 +1,108 @@
+import re
+from assets.py.chat.attachment_module import ATTACHMENT_TOKENS, EXCERPT_TOKENS
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    # tiktoken is optional; fall back to a word/punctuation estimate
+    _ENCODING = None
+
+# Prompt token budget per model type (leaves room for the answer)
+MODEL_TOKEN_BUDGETS = {
+    "gpt-4o": 16000,
+    "gemini": 32000,
+    "deepseek-chat": 16000,
+}
+DEFAULT_TOKEN_BUDGET = 8000
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+def count_tokens(text):
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    # Most tokenizers split long words, so weight words a bit above 1 token
+    return int(len(_WORD_RE.findall(text)) * 1.3) + 1
+
+def message_content(message):
+    """Text sent to the model for a stored message (full prompt for attachments)."""
+    return message.get("prompt") or message.get("text", "")
+
+def message_parts(message, query="", blob_store=None):
+    """
+    Content sent to the model: one part per attachment, then the text.
+    Attachment parts get the path of their blob, and indexed text
+    attachments the question their excerpts are picked for.
+    """
+    attachments = message.get("attachments")
+    if not attachments:
+        return message_content(message)
+    parts = []
+    for attachment in attachments:
+        part = dict(attachment, type="attachment")
+        if blob_store is not None and attachment.get("blob"):
+            part["path"] = blob_store.path_for(attachment["blob"])
+        if attachment.get("kind") == "text":
+            part["query"] = query
+        parts.append(part)
+    parts.append({"type": "text", "text": message_content(message)})
+    return parts
+
+def attachment_tokens(attachment):
+    if attachment.get("inline"):
+        return attachment.get("size", 0) // 4 + 1
+    return EXCERPT_TOKENS if attachment.get("kind") == "text" else ATTACHMENT_TOKENS
+
+
+class ContextBuilder:
+    """
+    Builds the provider message list from a conversation, newest first,
+    until the model's token budget is used up.
+    Token counts are cached on each message dict ("tokens"), which is saved
+    with the chat history, so only new messages are ever tokenized.
+    """
+
+    def __init__(self, budgets=None, blob_store=None):
+        self.budgets = dict(MODEL_TOKEN_BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        # Where attachment blobs referenced by messages live
+        self.blob_store = blob_store
+
+    def budget_for(self, model):
+        return self.budgets.get(model, DEFAULT_TOKEN_BUDGET)
+
+    def message_tokens(self, message):
+        tokens = message.get("tokens")
+        if tokens is None:
+            tokens = count_tokens(message_content(message))
+            tokens += sum(attachment_tokens(a) for a in message.get("attachments", []))
+            message["tokens"] = tokens
+        return tokens
+
+    def build(self, messages, model, budget=None):
+        if budget is None:
+            budget = self.budget_for(model)
+
+        # Large text attachments anywhere in the chat are searched with the latest question
+        query = next((message_content(m) for m in reversed(messages)
+                      if m.get("sender") == "user" and not m.get("notice")), "")
+
+        context = []
+        used = 0
+        for message in reversed(messages):
+            # UI notices ("Generation stopped.", errors) are not part of the conversation
+            if message.get("notice"):
+                continue
+            tokens = self.message_tokens(message)
+            # The newest message is always sent, even if it alone exceeds the budget
+            if context and used + tokens > budget:
+                break
+            used += tokens
+            role = "user" if message.get("sender") == "user" else "assistant"
+            context.append({"role": role, "content": message_parts(message, query, self.blob_store)})
+
+        context.reverse()
+        return context
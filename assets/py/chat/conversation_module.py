@@ -0,0 +1,114 @@
+import itertools
+
+
+class Conversation:
+    """
+    The loaded messages of the open chat, as the history store keeps them
+    ({"sender", "text", ...}), each with a stable id and the store position
+    it was saved at (None for messages that aren't saved, e.g. notices shown
+    before the chat existed).
+    Only a window of the chat is loaded: older pages are added in front with
+    prepend(), and offset is the store position of the first loaded page.
+    Ids map to a sequence number that doesn't move when pages are added, so
+    finding a message, checking whether it is the last (user) message and
+    cutting the chat at it never scan the conversation.
+    """
+
+    def __init__(self):
+        # Never reused, so an id kept from another chat matches nothing
+        self._next_id = itertools.count(1)
+        self.clear()
+
+    def clear(self, offset=0):
+        self.offset = offset # Store position of the first loaded page
+        self.messages = []
+        self.ids = []
+        self.positions = [] # Store position of each message, or None
+        self._base = 0 # Sequence number of messages[0]
+        self._seq = {} # id -> sequence number (row + _base)
+        self._last_user = None # Sequence number of the last user message
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, message, position=None):
+        """Adds a message at the end, saved at store position position; returns its id."""
+        message_id = next(self._next_id)
+        seq = self._base + len(self.messages)
+        self._seq[message_id] = seq
+        if message.get("sender") == "user":
+            self._last_user = seq
+        self.messages.append(message)
+        self.ids.append(message_id)
+        self.positions.append(position)
+        return message_id
+
+    def prepend(self, start, messages):
+        """Adds the page of messages at store positions start, start + 1, ...; returns their ids."""
+        ids = [next(self._next_id) for _ in messages]
+        self._base -= len(messages)
+        for seq, message_id in enumerate(ids, self._base):
+            self._seq[message_id] = seq
+        if self._last_user is None:
+            self._last_user = self._find_last_user(messages, self._base)
+        self.messages[:0] = messages
+        self.ids[:0] = ids
+        self.positions[:0] = range(start, start + len(messages))
+        self.offset = start
+        return ids
+
+    def truncate(self, message_id):
+        """
+        Removes a message and every later one. Returns the store position to
+        cut the saved chat at (that of the first saved message removed), or
+        None if none of them was saved.
+        """
+        row = self.row(message_id)
+        if row is None:
+            return None
+        for removed in self.ids[row:]:
+            del self._seq[removed]
+        position = next((p for p in self.positions[row:] if p is not None), None)
+        del self.messages[row:]
+        del self.ids[row:]
+        del self.positions[row:]
+        if self._last_user is not None and self._last_user >= self._base + row:
+            self._last_user = self._find_last_user(self.messages, self._base)
+        return position
+
+    # ===== LOOKUPS =====
+    def row(self, message_id):
+        """Index of a loaded message in messages (and in the transcript), or None."""
+        seq = self._seq.get(message_id)
+        return None if seq is None else seq - self._base
+
+    def message(self, message_id):
+        row = self.row(message_id)
+        return None if row is None else self.messages[row]
+
+    def sender(self, message_id):
+        message = self.message(message_id)
+        return message and message.get("sender")
+
+    def is_last(self, message_id):
+        return self.row(message_id) == len(self.messages) - 1
+
+    def is_last_user(self, message_id):
+        return message_id in self._seq and self._seq[message_id] == self._last_user
+
+    def has_user_before(self, message_id):
+        # Holds for the last message; older ones may have later user messages
+        seq = self._seq.get(message_id)
+        return seq is not None and self._last_user is not None and self._last_user < seq
+
+    def before(self, message_id):
+        """The loaded messages before this one (the context to answer it again)."""
+        row = self.row(message_id)
+        return [] if row is None else self.messages[:row]
+
+    def _find_last_user(self, messages, base):
+        # Walks back only as far as the closest user message
+        for row in range(len(messages) - 1, -1, -1):
+            if messages[row].get("sender") == "user":
+                return base + row
+        return None
@@ -0,0 +1,533 @@
+import itertools
+import threading
+import time
+import logging
+from collections import deque
+from assets.py.chat.client_pool_module import ClientPool, provider_for_model
+from assets.py.chat.hedging_module import HedgePolicy
+from assets.py.chat.context_module import count_tokens
+from assets.py.chat.attachment_module import ATTACHMENT_TOKENS, content_text, openai_content, gemini_parts
+from assets.py.chat.rate_limit_module import RateLimiter, is_retryable, retry_after_seconds, backoff_delay, error_status
+
+logger = logging.getLogger(__name__)
+
+# Max requests in flight per provider; providers not listed use the default
+PROVIDER_CONCURRENCY = {
+    "openai": 4,
+    "google": 4,
+    "deepseek": 2,
+}
+DEFAULT_CONCURRENCY = 2
+# Retries on the same target for rate limits and transient errors
+MAX_RETRIES = 4
+
+
+def gemini_contents(messages):
+    """Converts role/content messages to Gemini's contents format."""
+    return [
+        {"role": "model" if m["role"] == "assistant" else "user", "parts": gemini_parts(m["content"])}
+        for m in messages
+    ]
+
+def openai_messages(messages, provider):
+    """Role/content messages with attachments turned into OpenAI-style parts."""
+    return [{"role": m["role"], "content": openai_content(m["content"], provider)} for m in messages]
+
+def estimate_tokens(messages):
+    tokens = 0
+    for m in messages:
+        tokens += count_tokens(content_text(m["content"]))
+        if not isinstance(m["content"], str):
+            tokens += ATTACHMENT_TOKENS * sum(1 for part in m["content"] if part["type"] == "attachment")
+    return tokens
+
+
+class ChatTarget:
+    """Where a request can be sent: an API key, a model type and an optional endpoint."""
+
+    def __init__(self, api_key, model, base_url=None, name=None, limits=None):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.name = name
+        # Optional {"rpm": ..., "tpm": ...} overriding the provider defaults
+        self.limits = limits
+        self.provider = provider_for_model(model)
+        # Latency statistics are kept per provider endpoint
+        self.key = f"{self.provider}@{base_url}" if base_url else self.provider
+
+
+class ChatAttempt:
+    """One provider call made on behalf of a ChatRequest."""
+
+    def __init__(self, request, target, retries=0, not_before=0.0):
+        self.request = request
+        self.target = target
+        self.provider = target.provider
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        # Response headers, first output and provider-reported (input, output) tokens, for metrics
+        self.connected_at = None
+        self.first_token_at = None
+        self.usage = None
+        self.cached = False
+        # Retry number and earliest start (monotonic) for backoff/rate limits
+        self.retries = retries
+        self.not_before = not_before
+        self.is_cancelled = False
+        self.is_done = False
+        self.thread_id = None
+
+
+class ChatRequest:
+    """
+    A logical completion request and its callbacks.
+    It is served by one or more attempts: the primary target first, then
+    fallback targets when the primary is slow (hedging) or fails (failover).
+    The first attempt to produce output wins and the others are cancelled.
+    """
+
+    def __init__(self, request_id, targets, messages, stream=False, chat_id=None,
+                 params=None, use_cache=True,
+                 on_delta=None, on_done=None, on_error=None, on_cancel=None):
+        self.request_id = request_id
+        self.targets = targets
+        self.submitted_at = time.monotonic()
+        # [{"role": "user" | "assistant", "content": str}, ...]
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        self.messages = messages
+        # Estimated prompt size, charged against tokens-per-minute limits
+        self.tokens = estimate_tokens(messages)
+        self.stream = stream
+        self.chat_id = chat_id
+        # Generation parameters, e.g. {"temperature": 0.7}
+        self.params = {k: v for k, v in (params or {}).items() if v is not None}
+        # False forces a fresh answer (the result still refreshes the cache)
+        self.use_cache = use_cache
+        self.on_delta = on_delta
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+
+        self.attempts = []
+        self.live_attempts = 0
+        self.next_target = 0
+        self.winner = None
+        self.is_cancelled = False
+        self.is_finished = False
+        self.hedge_timer = None
+
+
+class ChatDispatcher:
+    """
+    Runs chat requests on a fixed pool of long-lived worker threads.
+    Attempts wait in a FIFO queue; a worker takes the oldest attempt whose
+    provider is below its concurrency limit and whose key has rate-limit
+    budget left, so a busy provider never blocks requests for another one.
+    Rate limits and transient errors keep an attempt queued with backoff
+    instead of failing it. Callbacks run on the worker thread.
+    """
+
+    def __init__(self, client_pool=None, max_workers=6, provider_limits=None, response_cache=None,
+                 hedge_policy=None, rate_limiter=None, max_retries=MAX_RETRIES, metrics=None):
+        self.client_pool = client_pool if client_pool is not None else ClientPool()
+        self.provider_limits = dict(PROVIDER_CONCURRENCY)
+        if provider_limits:
+            self.provider_limits.update(provider_limits)
+        # Optional ResponseCache; None disables caching
+        self.response_cache = response_cache
+        self.hedge_policy = hedge_policy if hedge_policy is not None else HedgePolicy()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.max_retries = max_retries
+        # Optional MetricsRecorder that gets one record per finished request
+        self.metrics = metrics
+
+        self._ids = itertools.count(1)
+        self._pending = deque()
+        self._requests = {}
+        self._active = {}
+        self._cond = threading.Condition()
+        self._running = True
+
+        self._workers = []
+        for i in range(max_workers):
+            worker = threading.Thread(target=self._work, name=f"chat-worker-{i}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def submit(self, api_key, model, messages, stream=False, chat_id=None, params=None, use_cache=True,
+               base_url=None, fallbacks=None,
+               on_delta=None, on_done=None, on_error=None, on_cancel=None):
+        """
+        Queues a request and returns its request id.
+        messages is a list of role/content dicts, or a plain prompt string.
+        fallbacks is an optional list of ChatTarget to hedge/fail over to.
+        """
+        targets = [ChatTarget(api_key, model, base_url)] + list(fallbacks or [])
+        with self._cond:
+            request = ChatRequest(next(self._ids), targets, messages, stream, chat_id,
+                                  params, use_cache, on_delta, on_done, on_error, on_cancel)
+            self._requests[request.request_id] = request
+            self._launch_next(request)
+        return request.request_id
+
+    def cancel(self, request_id):
+        """Cancels a queued request or aborts the HTTP requests of a running one."""
+        with self._cond:
+            request = self._requests.get(request_id)
+            if request is None or request.is_cancelled or request.is_finished:
+                return False
+            request.is_cancelled = True
+            self._cancel_attempts(request)
+            notify = self._finish_if_idle(request)
+
+        if notify:
+            self._record(request, "cancelled")
+            self._notify(request.on_cancel, request_id)
+        return True
+
+    def cancel_all(self, chat_id=None):
+        with self._cond:
+            ids = [r.request_id for r in self._requests.values() if chat_id is None or r.chat_id == chat_id]
+        for request_id in ids:
+            self.cancel(request_id)
+
+    def pending_count(self):
+        with self._cond:
+            return len(self._requests)
+
+    def wait_idle(self, timeout=None):
+        """Blocks until no request is queued or running. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._requests, timeout)
+
+    def shutdown(self, timeout=2.0):
+        """Cancels everything and stops the worker threads."""
+        self.cancel_all()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join(timeout)
+
+    # ===== ATTEMPTS (called with self._cond held) =====
+    def _launch_next(self, request):
+        if request.next_target >= len(request.targets):
+            return False
+        target = request.targets[request.next_target]
+        request.next_target += 1
+
+        attempt = ChatAttempt(request, target)
+        request.attempts.append(attempt)
+        request.live_attempts += 1
+        self._pending.append(attempt)
+        self._cond.notify_all()
+
+        # Arm a hedge: if no output arrives in time, try the next target as well
+        if request.next_target < len(request.targets):
+            delay = self.hedge_policy.delay_for(target.key)
+            request.hedge_timer = threading.Timer(delay, self._hedge, args=(request,))
+            request.hedge_timer.daemon = True
+            request.hedge_timer.start()
+        return True
+
+    def _hedge(self, request):
+        with self._cond:
+            if request.winner is None and not request.is_cancelled and not request.is_finished:
+                logger.info("Request %s: no first token yet, hedging to %s",
+                            request.request_id, request.targets[request.next_target].key)
+                self._launch_next(request)
+
+    def _cancel_attempts(self, request, keep=None):
+        if request.hedge_timer:
+            request.hedge_timer.cancel()
+        for attempt in request.attempts:
+            if attempt is keep or attempt.is_cancelled or attempt.is_done:
+                continue
+            attempt.is_cancelled = True
+            if attempt in self._pending:
+                self._pending.remove(attempt)
+                attempt.is_done = True
+                request.live_attempts -= 1
+            elif attempt.thread_id is not None:
+                # Still holding the lock, so the worker can't have moved on to another attempt
+                self.client_pool.abort(attempt.thread_id)
+
+    def _finish_if_idle(self, request):
+        # Drops a cancelled request once none of its attempts is running;
+        # returns True if on_cancel should be sent
+        if request.is_finished or request.live_attempts > 0:
+            return False
+        request.is_finished = True
+        self._requests.pop(request.request_id, None)
+        self._cond.notify_all()
+        return True
+
+    def _claim(self, attempt, record_latency=True):
+        # The first attempt to produce output wins the request; returns False for losers
+        request = attempt.request
+        with self._cond:
+            if attempt.is_cancelled or request.is_cancelled:
+                return False
+            if request.winner is None:
+                request.winner = attempt
+                attempt.first_token_at = time.monotonic()
+                attempt.connected_at = self.client_pool.response_time(attempt.thread_id)
+                if record_latency:
+                    # Time to first token from when the call started, excluding queueing
+                    self.hedge_policy.record_first_token(attempt.target.key, time.monotonic() - attempt.started_at)
+                self._cancel_attempts(request, keep=attempt)
+            return request.winner is attempt
+
+    # ===== WORKERS =====
+    def _next_attempt(self):
+        # Oldest queued attempt whose provider has a free slot and whose key
+        # has rate-limit budget. Returns (attempt, None) or (None, seconds to
+        # wait before something becomes ready; None if only a slot can free it)
+        now = time.monotonic()
+        wait = None
+        waiting_keys = set()
+        for attempt in self._pending:
+            target = attempt.target
+            # Keep FIFO order per key: nothing overtakes an attempt that is waiting
+            if (target.key, target.api_key) in waiting_keys:
+                continue
+            delay = attempt.not_before - now
+            if delay <= 0:
+                limit = self.provider_limits.get(attempt.provider, DEFAULT_CONCURRENCY)
+                if self._active.get(attempt.provider, 0) >= limit:
+                    continue
+                delay = self.rate_limiter.reserve(target, attempt.request.tokens, now)
+                if delay <= 0:
+                    return attempt, None
+            waiting_keys.add((target.key, target.api_key))
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _work(self):
+        while True:
+            with self._cond:
+                attempt = None
+                while self._running:
+                    attempt, wait = self._next_attempt()
+                    if attempt:
+                        break
+                    self._cond.wait(wait)
+                if not self._running:
+                    return
+                self._pending.remove(attempt)
+                self._active[attempt.provider] = self._active.get(attempt.provider, 0) + 1
+                attempt.thread_id = threading.get_ident()
+                attempt.started_at = time.monotonic()
+
+            request = attempt.request
+            try:
+                self._run(attempt)
+            finally:
+                with self._cond:
+                    # Under the lock, so a late abort can't leak into this thread's next attempt
+                    self.client_pool.release()
+                    self._active[attempt.provider] -= 1
+                    attempt.is_done = True
+                    request.live_attempts -= 1
+                    notify = request.is_cancelled and self._finish_if_idle(request)
+                    self._cond.notify_all()
+                if notify:
+                    self._record(request, "cancelled")
+                    self._notify(request.on_cancel, request.request_id)
+
+    def _run(self, attempt):
+        request = attempt.request
+        cache = self.response_cache
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.make_key(attempt.provider, attempt.target.model, request.messages, request.params)
+            text = cache.get(cache_key) if request.use_cache else None
+            if text is not None:
+                attempt.cached = True
+                if self._claim(attempt, record_latency=False):
+                    self._complete(attempt, text)
+                return
+
+        try:
+            client = self.client_pool.get(attempt.provider, attempt.target.api_key, attempt.target.base_url)
+            if request.stream:
+                text = self._run_stream(attempt, client)
+
+            elif attempt.provider == "google":
+                response = client.models.generate_content(
+                    model="gemini-3-flash-preview", # Using a known valid model
+                    contents=gemini_contents(request.messages),
+                    config=request.params or None
+                )
+                text = response.text
+                usage = response.usage_metadata
+                if usage:
+                    attempt.usage = (usage.prompt_token_count, usage.candidates_token_count)
+
+            else:
+                result = client.chat.completions.create(
+                    model=attempt.target.model,
+                    messages=openai_messages(request.messages, attempt.provider),
+                    **request.params
+                )
+                text = result.choices[0].message.content
+                if result.usage:
+                    attempt.usage = (result.usage.prompt_tokens, result.usage.completion_tokens)
+
+            # Non-streamed answers claim the request when they complete.
+            # A cancelled or losing attempt never delivers a late answer
+            if self._claim(attempt):
+                if cache_key is not None:
+                    cache.put(cache_key, text)
+                self._complete(attempt, text)
+
+        except Exception as e:
+            if not attempt.is_cancelled and not self._retry(attempt, e):
+                self._fail(attempt, e)
+
+    def _run_stream(self, attempt, client):
+        # Emits each chunk as it arrives and returns the full text
+        request = attempt.request
+        chunks = []
+        if attempt.provider == "google":
+            stream = client.models.generate_content_stream(
+                model="gemini-3-flash-preview",
+                contents=gemini_contents(request.messages),
+                config=request.params or None
+            )
+            for chunk in stream:
+                if chunk.text:
+                    if not self._claim(attempt):
+                        stream.close()
+                        break
+                    chunks.append(chunk.text)
+                    self._notify(request.on_delta, request.request_id, chunk.text)
+
+        else:
+            stream = client.chat.completions.create(
+                model=attempt.target.model,
+                messages=openai_messages(request.messages, attempt.provider),
+                stream=True,
+                **request.params
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if not self._claim(attempt):
+                        stream.close()
+                        break
+                    chunks.append(chunk.choices[0].delta.content)
+                    self._notify(request.on_delta, request.request_id, chunk.choices[0].delta.content)
+
+        return "".join(chunks)
+
+    def _complete(self, attempt, text):
+        request = attempt.request
+        with self._cond:
+            if request.is_finished:
+                return
+            request.is_finished = True
+            if request.hedge_timer:
+                request.hedge_timer.cancel()
+            self._requests.pop(request.request_id, None)
+            self._cond.notify_all()
+        self._record(request, "ok", attempt, text)
+        self._notify(request.on_done, request.request_id, text)
+
+    def _retry(self, attempt, error):
+        # Requeues a rate-limited or transiently failing attempt with backoff.
+        # Returns False if the error should go through _fail instead
+        if not is_retryable(error):
+            return False
+        request = attempt.request
+        target = attempt.target
+        retry_after = retry_after_seconds(error)
+        delay = backoff_delay(attempt.retries, retry_after)
+        with self._cond:
+            if error_status(error) == 429:
+                # The whole key is over its limit, not just this request
+                self.rate_limiter.block(target, delay)
+            if attempt.is_cancelled or request.is_finished or request.is_cancelled:
+                return True
+            if request.winner is not None:
+                # Output was already shown; a retry would repeat it
+                return False
+            if request.next_target < len(request.targets):
+                # Another key is available, fail over rather than wait
+                return False
+            if attempt.retries >= self.max_retries:
+                return False
+
+            attempt.is_done = True
+            retry = ChatAttempt(request, target, attempt.retries + 1, time.monotonic() + delay)
+            request.attempts.append(retry)
+            request.live_attempts += 1
+            self._pending.append(retry)
+            self._cond.notify_all()
+        logger.info("Request %s: %s on %s, retry %s in %.1fs",
+                    request.request_id, error, target.key, retry.retries, delay)
+        return True
+
+    def _fail(self, attempt, error):
+        # Fails over to the next target, unless another attempt is still running
+        request = attempt.request
+        with self._cond:
+            attempt.is_done = True
+            if request.is_finished or request.is_cancelled:
+                return
+            if request.winner is None:
+                if any(not a.is_done and not a.is_cancelled for a in request.attempts):
+                    logger.info("Request %s: attempt on %s failed (%s), waiting for the others",
+                                request.request_id, attempt.target.key, error)
+                    return
+                if request.hedge_timer:
+                    request.hedge_timer.cancel()
+                if self._launch_next(request):
+                    logger.info("Request %s: attempt on %s failed (%s), failing over",
+                                request.request_id, attempt.target.key, error)
+                    return
+            request.is_finished = True
+            self._requests.pop(request.request_id, None)
+            self._cond.notify_all()
+        self._record(request, "error", attempt)
+        self._notify(request.on_error, request.request_id, str(error))
+
+    def _record(self, request, outcome, attempt=None, text=""):
+        # One metrics record per finished request, from the winning (or last) attempt
+        if self.metrics is None:
+            return
+        attempt = attempt or request.winner or (request.attempts[-1] if request.attempts else None)
+        if attempt is None:
+            return
+        now = time.monotonic()
+
+        def since(start, end):
+            return round(end - start, 4) if start is not None and end is not None else None
+
+        input_tokens, output_tokens = attempt.usage or (request.tokens, count_tokens(text) if text else 0)
+        generation = since(attempt.first_token_at, now)
+        self.metrics.record({
+            "request_id": request.request_id,
+            "provider": attempt.provider,
+            "model": attempt.target.model,
+            "endpoint": attempt.target.key,
+            "outcome": outcome,
+            "attempts": len(request.attempts),
+            "cached": attempt.cached,
+            "queue_wait": since(attempt.queued_at, attempt.started_at),
+            "connect": since(attempt.started_at, attempt.connected_at),
+            "ttft": since(request.submitted_at, attempt.first_token_at),
+            "total": since(request.submitted_at, now),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "tokens_per_s": round(output_tokens / generation, 1) if output_tokens and generation and generation > 0.05 else None,
+        })
+
+    def _notify(self, callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.exception("Chat callback failed: %s", e)
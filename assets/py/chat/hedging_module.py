@@ -0,0 +1,62 @@
+import bisect
+import threading
+
+# Upper bounds (seconds) of the latency histogram buckets, roughly log-spaced
+LATENCY_BUCKETS = [
+    0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0,
+    4.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 60.0, float("inf"),
+]
+
+
+class LatencyHistogram:
+    """Bucketed latency distribution; percentiles are bucket upper bounds."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        target = p * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return self.buckets[-1]
+
+
+class HedgePolicy:
+    """
+    Decides how long to wait for the first token before sending a hedge
+    request to a fallback target.
+    The delay is the given percentile of the target's time-to-first-token
+    histogram, clamped to [min_delay, max_delay]; max_delay is also used
+    until min_samples latencies have been recorded.
+    """
+
+    def __init__(self, percentile=0.95, min_delay=0.5, max_delay=4.0, min_samples=5):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def record_first_token(self, key, seconds):
+        with self._lock:
+            self.histograms.setdefault(key, LatencyHistogram()).record(seconds)
+
+    def delay_for(self, key):
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None or histogram.count < self.min_samples:
+                return self.max_delay
+            value = histogram.percentile(self.percentile)
+        return min(self.max_delay, max(self.min_delay, value))
@@ -0,0 +1,112 @@
+import bisect
+import re
+
+try:
+    from pygments.lexers import get_lexer_by_name
+    from pygments.token import Comment, Keyword, Name, Number, String
+    from pygments.util import ClassNotFound
+except ImportError:
+    # pygments is optional; fall back to a generic keyword/string/comment tokenizer
+    get_lexer_by_name = None
+
+# Token kinds the chat view has colors for
+KINDS = ("keyword", "type", "string", "comment", "number", "function", "builtin")
+
+# ===== GENERIC TOKENIZER =====
+# Good enough for the C-like and scripting languages models usually answer in
+_KEYWORDS = {
+    "and", "as", "assert", "async", "await", "break", "case", "catch", "class", "const", "continue",
+    "def", "default", "del", "do", "elif", "else", "enum", "except", "export", "extends", "finally",
+    "fn", "for", "from", "func", "function", "global", "go", "if", "impl", "import", "in", "interface",
+    "is", "lambda", "let", "match", "mod", "new", "nonlocal", "not", "or", "package", "pass", "private",
+    "protected", "pub", "public", "raise", "return", "static", "struct", "switch", "this", "throw",
+    "throws", "trait", "try", "type", "typeof", "use", "var", "void", "while", "with", "yield",
+    "True", "False", "None", "true", "false", "null", "nil", "undefined", "self",
+}
+_HASH_COMMENT_LANGS = {"python", "py", "sh", "bash", "shell", "zsh", "ruby", "rb", "perl", "r",
+                       "yaml", "yml", "toml", "ini", "dockerfile", "makefile", "powershell", "ps1"}
+_GENERIC_RE = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>"(?:\\.|[^"\\\n])*"?|'(?:\\.|[^'\\\n])*'?|`(?:\\.|[^`\\])*`?)
+  | (?P<number>\b(?:0[xX][0-9a-fA-F_]+|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)\b)
+  | (?P<word>[A-Za-z_]\w*)(?P<call>\s*\()?
+""", re.VERBOSE | re.DOTALL)
+_HASH_GENERIC_RE = re.compile(r"(?P<hash>\#[^\n]*)|" + _GENERIC_RE.pattern, re.VERBOSE | re.DOTALL)
+
+
+def _generic_tokens(code, lang):
+    pattern = _HASH_GENERIC_RE if lang in _HASH_COMMENT_LANGS else _GENERIC_RE
+    for match in pattern.finditer(code):
+        kind = match.lastgroup
+        if kind in ("word", "call"):
+            word = match.group("word")
+            if word in _KEYWORDS:
+                yield match.start("word"), match.end("word"), "keyword"
+            elif match.group("call"):
+                yield match.start("word"), match.end("word"), "function"
+            elif word[0].isupper():
+                yield match.start("word"), match.end("word"), "type"
+        else:
+            yield match.start(), match.end(), "comment" if kind == "hash" else kind
+
+
+# ===== PYGMENTS =====
+def _token_kind(token):
+    if token in Comment:
+        return "comment"
+    if token in String:
+        return "string"
+    if token in Number:
+        return "number"
+    if token in Keyword.Type:
+        return "type"
+    if token in Keyword:
+        return "keyword"
+    if token in Name.Function or token in Name.Decorator:
+        return "function"
+    if token in Name.Class or token in Name.Namespace:
+        return "type"
+    if token in Name.Builtin:
+        return "builtin"
+    return None
+
+def _lexer_for(lang):
+    if get_lexer_by_name is None or not lang:
+        return None
+    try:
+        # Keep the text as is, so token offsets match the displayed code
+        return get_lexer_by_name(lang, stripnl=False, stripall=False, ensurenl=False, tabsize=0)
+    except ClassNotFound:
+        return None
+
+def _pygments_tokens(code, lexer):
+    for start, token, value in lexer.get_tokens_unprocessed(code):
+        kind = _token_kind(token)
+        if kind and value:
+            yield start, start + len(value), kind
+
+
+def tokenize(code, lang=""):
+    """
+    Highlighted spans of a code block, per line: [[(start, length, kind), ...], ...]
+    with start relative to the line and kind one of KINDS. Pure Python, so
+    it can run on a worker thread.
+    """
+    lang = (lang or "").lower()
+    lexer = _lexer_for(lang)
+    tokens = _pygments_tokens(code, lexer) if lexer else _generic_tokens(code, lang)
+
+    line_starts = [0] + [m.end() for m in re.finditer("\n", code)]
+    lines = [[] for _ in line_starts]
+    for start, end, kind in tokens:
+        # Multi-line tokens (block comments, docstrings) are split at each line
+        line = bisect.bisect_right(line_starts, start) - 1
+        while start < end and line < len(line_starts):
+            line_end = line_starts[line + 1] - 1 if line + 1 < len(line_starts) else len(code)
+            stop = min(end, line_end)
+            if stop > start:
+                lines[line].append((start - line_starts[line], stop - start, kind))
+            line += 1
+            if line < len(line_starts):
+                start = line_starts[line]
+    return lines
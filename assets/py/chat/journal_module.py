@@ -0,0 +1,81 @@
+import json
+import os
+import zlib
+
+# Reads the chat files kept before the history store (HistoryStore imports
+# them once): append-only journals (.jsonl) and plain JSON lists (.json)
+JOURNAL_EXT = ".jsonl"
+LEGACY_EXT = ".json"
+CHAT_EXTENSIONS = (JOURNAL_EXT, LEGACY_EXT)
+
+
+# ===== RECORDS =====
+# One JSON object per line:
+#   {"op": "append", "message": {...}, "crc": ...}   adds a message
+#   {"op": "truncate", "count": n, "crc": ...}       keeps the first n messages
+# crc is the CRC-32 of the record without it, so torn or damaged lines are skipped.
+
+def _checksum(record):
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False)
+    return zlib.crc32(payload.encode("utf-8"))
+
+def decode_record(line):
+    """The record on a journal line, or None if it is damaged."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    crc = record.pop("crc", None)
+    if crc != _checksum(record):
+        return None
+    return record
+
+
+# ===== PATHS =====
+def is_chat_file(filename):
+    return filename.endswith(CHAT_EXTENSIONS)
+
+def chat_stem(filename):
+    """File name without the chat extension: YYYYMMDD_HHMMSS_Title."""
+    for ext in CHAT_EXTENSIONS:
+        if filename.endswith(ext):
+            return filename[:-len(ext)]
+    return filename
+
+def list_chats(folder):
+    """Chat file names in folder, newest first. If a chat exists in both
+    formats (interrupted migration), the journal wins."""
+    try:
+        names = [f for f in os.listdir(folder) if is_chat_file(f)]
+    except OSError:
+        return []
+    journals = {chat_stem(f) for f in names if f.endswith(JOURNAL_EXT)}
+    names = [f for f in names if f.endswith(JOURNAL_EXT) or chat_stem(f) not in journals]
+    return sorted(names, key=chat_stem, reverse=True)
+
+
+# ===== READ =====
+def read_journal(path):
+    """Replays a journal into its messages; damaged records are skipped."""
+    messages = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = decode_record(line)
+            if record is None:
+                continue
+            if record.get("op") == "append":
+                messages.append(record["message"])
+            elif record.get("op") == "truncate":
+                del messages[record["count"]:]
+    return messages
+
+def load_messages(path):
+    """Messages of a chat in either format."""
+    if path.endswith(LEGACY_EXT):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return read_journal(path)
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Fields summarised per provider in the diagnostics panel
+SUMMARY_FIELDS = ["queue_wait", "connect", "ttft", "total", "tokens_per_s"]
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers, or None if empty."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+class MetricsRecorder:
+    """
+    Keeps the last `capacity` request records in memory and optionally
+    appends every record to a JSONL file.
+
+    A record is a dict with: time, request_id, provider, model, endpoint,
+    outcome ("ok" | "error" | "cancelled"), attempts, cached, and the
+    timings in seconds: queue_wait (queued until a worker started it),
+    connect (started until the response headers arrived), ttft (submitted
+    until the first token), total (submitted until done), plus
+    input_tokens, output_tokens and tokens_per_s (output tokens over the
+    generation time). Token counts are estimates unless the provider
+    reported usage.
+    """
+
+    def __init__(self, capacity=500, sink_path=None):
+        self.records = deque(maxlen=capacity)
+        self.sink_path = sink_path
+        self._lock = threading.Lock()
+
+    def set_sink(self, path):
+        """Starts (or with None, stops) appending records to a JSONL file."""
+        with self._lock:
+            self.sink_path = path
+
+    def record(self, record):
+        record.setdefault("time", time.time())
+        with self._lock:
+            self.records.append(record)
+            if not self.sink_path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.sink_path), exist_ok=True)
+                with open(self.sink_path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning("Error writing request metrics: %s", e)
+
+    def recent(self, provider=None):
+        with self._lock:
+            return [r for r in self.records if provider is None or r["provider"] == provider]
+
+    def summary(self):
+        """
+        {provider: {"count", "errors", "<field>_p50", "<field>_p95", ...}}
+        over the records in the buffer; percentiles use successful requests.
+        """
+        by_provider = {}
+        for record in self.recent():
+            by_provider.setdefault(record["provider"], []).append(record)
+
+        result = {}
+        for provider, records in sorted(by_provider.items()):
+            ok = [r for r in records if r["outcome"] == "ok"]
+            stats = {
+                "count": len(records),
+                "errors": sum(1 for r in records if r["outcome"] == "error"),
+            }
+            for field in SUMMARY_FIELDS:
+                values = [r[field] for r in ok if r.get(field) is not None]
+                stats[f"{field}_p50"] = percentile(values, 0.5)
+                stats[f"{field}_p95"] = percentile(values, 0.95)
+            result[provider] = stats
+        return result
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
@@ -0,0 +1,60 @@
+import json
+import os
+from assets.py.chat.dispatcher_module import ChatTarget
+
+# Calculate path to api/models.json relative to this file
+# assets/py/chat/models_config_module.py -> ... -> api/models.json
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+MODELS_FILE = os.path.join(BASE_DIR, 'api', 'models.json')
+
+# Model type used for each provider name in models.json entries ("Google key (2)", ...)
+PROVIDER_MODEL_TYPES = [
+    ("Google", "gemini"),
+    ("OpenAI", "gpt-4o"),
+    ("DeepSeek", "deepseek-chat"),
+]
+
+def model_type_for(name, info=None):
+    """Model type for a models.json entry; an explicit "model" field wins."""
+    if info and info.get("model"):
+        return info["model"]
+    for provider, model_type in PROVIDER_MODEL_TYPES:
+        if provider in name:
+            return model_type
+    return None
+
+def load_models(path=MODELS_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Error loading models: {e}")
+        return {}
+
+def active_model(models):
+    """Returns (name, info) of the active entry, or (None, None)."""
+    for name, info in models.items():
+        if info.get("state") == "active":
+            return name, info
+    return None, None
+
+def model_targets(models):
+    """
+    ChatTargets for every usable entry, active one first.
+    Entries may set "base_url" to point at an OpenAI-compatible endpoint,
+    and "rpm"/"tpm" to override the provider's default rate limits.
+    """
+    targets = []
+    for name, info in models.items():
+        model_type = model_type_for(name, info)
+        if not model_type or not info.get("key"):
+            continue
+        limits = {k: info[k] for k in ("rpm", "tpm") if k in info}
+        target = ChatTarget(info["key"], model_type, info.get("base_url"), name, limits or None)
+        if info.get("state") == "active":
+            targets.insert(0, target)
+        else:
+            targets.append(target)
+    return targets
@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+# Client-side limits per provider key: requests and tokens per minute.
+# None means unlimited; models.json entries can override them with "rpm"/"tpm"
+PROVIDER_RATE_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 30000},
+    "google": {"rpm": 60, "tpm": 1000000},
+    "deepseek": {"rpm": None, "tpm": None},
+}
+DEFAULT_RATE_LIMITS = {"rpm": 60, "tpm": None}
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 per second up to capacity (a minute's worth by default)."""
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now=None):
+        """Seconds until amount can be taken; 0 if it's available now."""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        amount = min(amount, self.capacity) # A huge request still gets through eventually
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class KeyLimits:
+    """The buckets of one API key, plus a server-imposed pause (Retry-After)."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.blocked_until = 0.0
+
+
+class RateLimiter:
+    """
+    Paces requests per API key with request and token buckets.
+    reserve() either takes from the buckets or says how long to wait, so
+    callers can keep a request queued instead of failing it.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = {provider: dict(value) for provider, value in PROVIDER_RATE_LIMITS.items()}
+        if limits:
+            self.limits.update(limits)
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def _limits_for(self, target):
+        key = (target.key, target.api_key)
+        state = self._keys.get(key)
+        if state is None:
+            limits = dict(self.limits.get(target.provider, DEFAULT_RATE_LIMITS))
+            limits.update(getattr(target, "limits", None) or {})
+            state = self._keys[key] = KeyLimits(limits.get("rpm"), limits.get("tpm"))
+        return state
+
+    def configure(self, target):
+        """(Re)applies target.limits to its key."""
+        with self._lock:
+            self._keys.pop((target.key, target.api_key), None)
+            self._limits_for(target)
+
+    def reserve(self, target, tokens=0, now=None):
+        """Takes one request and `tokens` tokens if both are available and
+        returns 0; otherwise takes nothing and returns the seconds to wait."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            state = self._limits_for(target)
+            wait = state.blocked_until - now
+            if state.requests:
+                wait = max(wait, state.requests.wait_time(1, now))
+            if state.tokens and tokens:
+                wait = max(wait, state.tokens.wait_time(tokens, now))
+            if wait > 0:
+                return wait
+            if state.requests:
+                state.requests.take(1)
+            if state.tokens and tokens:
+                state.tokens.take(tokens)
+            return 0.0
+
+    def block(self, target, seconds):
+        """Pauses every request on target's key, e.g. after a 429."""
+        with self._lock:
+            state = self._limits_for(target)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+
+
+# ===== ERRORS =====
+def error_status(error):
+    """HTTP status of an OpenAI or Gemini SDK error, if any."""
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def is_retryable(error):
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+    # Connection problems and timeouts (openai.APIConnectionError, httpx.TransportError, ...)
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    names = {cls.__name__ for cls in type(error).__mro__}
+    return bool(names & {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException"})
+
+def retry_after_seconds(error):
+    """Reads Retry-After (seconds or an HTTP date) from the error's response."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(retry, retry_after=None, base=1.0, cap=60.0):
+    """Full-jitter exponential backoff; never shorter than the server's Retry-After."""
+    delay = random.uniform(0, min(cap, base * (2 ** retry)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap * 5))
+    return delay
@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Two-tier cache of completed responses.
+    Entries live in an in-memory LRU and in one small JSON file each under
+    cache_dir; the disk tier evicts least recently used files once it grows
+    past max_disk_bytes.
+    """
+
+    def __init__(self, cache_dir, max_memory_entries=128, max_disk_bytes=50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def make_key(provider, model, messages, params=None):
+        payload = json.dumps([provider, model, messages, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                logger.info("Response cache hit (memory) %s", key[:12])
+                return self._memory[key]
+
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    text = json.load(f)["text"]
+                os.utime(path) # Refresh LRU position on disk
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                logger.info("Response cache miss %s", key[:12])
+                return None
+
+            self.disk_hits += 1
+            logger.info("Response cache hit (disk) %s", key[:12])
+            self._remember(key, text)
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({"text": text}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warning("Error writing response cache: %s", e)
+                return
+
+            self._disk_bytes += os.path.getsize(path) - old_size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            for path, _, _ in self._disk_entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        # Drop least recently used files until we're back under 90% of the limit
+        target = self.max_disk_bytes * 0.9
+        for path, size, _ in sorted(self._disk_entries(), key=lambda e: e[2]):
+            if self._disk_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
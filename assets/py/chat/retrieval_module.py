@@ -0,0 +1,206 @@
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import logging
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+INDEX_DIR = os.path.join(BASE_DIR, "cache", "retrieval")
+
+# Text attachments above this size are indexed and only their best chunks are sent
+RETRIEVAL_MIN_CHARS = 16000
+CHUNK_CHARS = 1500
+CHUNK_OVERLAP_LINES = 2
+TOP_K = 6
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+def tokenize(text):
+    return [t.lower() for t in _TOKEN_RE.findall(text)]
+
+def chunk_text(text, max_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP_LINES):
+    """Splits text into line-aligned chunks of about max_chars, overlapping by a few lines."""
+    lines = []
+    for line in text.splitlines(keepends=True):
+        # Very long lines (minified files, dumps) are cut so no chunk is huge
+        while len(line) > max_chars:
+            lines.append(line[:max_chars])
+            line = line[max_chars:]
+        lines.append(line)
+
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = start
+        size = 0
+        while end < len(lines) and (end == start or size + len(lines[end]) <= max_chars):
+            size += len(lines[end])
+            end += 1
+        chunks.append({"start_line": start + 1, "end_line": end, "text": "".join(lines[start:end])})
+        if end >= len(lines):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over the chunks of one document."""
+
+    def __init__(self, chunks, postings=None, lengths=None, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        if postings is None:
+            postings = {}
+            lengths = []
+            for i, chunk in enumerate(chunks):
+                counts = Counter(tokenize(chunk["text"]))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    postings.setdefault(term, []).append((i, tf))
+        self.postings = postings # term -> [(chunk index, term frequency), ...]
+        self.lengths = lengths
+        self.avg_length = (sum(lengths) / len(lengths)) if lengths else 1.0
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(chunk_text(text))
+
+    def search(self, query, k=TOP_K):
+        """Indices of the k best chunks for query, best first."""
+        n = len(self.chunks)
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, tf in postings:
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length))
+                scores[i] = scores.get(i, 0.0) + idf * norm
+        return [i for i, _ in heapq.nlargest(k, scores.items(), key=lambda item: item[1])]
+
+    def excerpts(self, query, k=TOP_K):
+        """Best chunks in document order; the start of the document if nothing matches."""
+        hits = self.search(query, k) or list(range(min(k, len(self.chunks))))
+        return [self.chunks[i] for i in sorted(hits)]
+
+    def to_dict(self):
+        return {"chunks": self.chunks, "postings": self.postings, "lengths": self.lengths}
+
+    @classmethod
+    def from_dict(cls, data):
+        postings = {term: [tuple(p) for p in plist] for term, plist in data["postings"].items()}
+        return cls(data["chunks"], postings, data["lengths"])
+
+
+class IndexCache:
+    """
+    BM25 indexes keyed by the content hash of the attachment: an in-memory
+    LRU backed by one JSON file per index, so follow-up questions (and
+    restarts) reuse the index instead of re-chunking the file.
+    The disk tier evicts least recently used files once it grows past
+    max_disk_bytes.
+    """
+
+    def __init__(self, cache_dir=INDEX_DIR, max_entries=8, max_disk_bytes=50 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock() # Guards _memory, _building and _disk_bytes
+        self._building = {} # key -> lock held while that index is loaded or built
+        self._disk_bytes = None # Counted on first write; the cache is created at import
+
+    def get(self, key, load_text):
+        """The index for key; load_text() is only called if it must be built."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            key_lock = self._building.setdefault(key, threading.Lock())
+
+        # Building can take a while; only requests for the same key wait for it
+        with key_lock:
+            with self._lock:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    return self._memory[key]
+
+            path = os.path.join(self.cache_dir, f"{key}.json")
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    index = BM25Index.from_dict(json.load(f))
+                os.utime(path) # Refresh LRU position on disk
+            except (OSError, ValueError, KeyError):
+                index = BM25Index.from_text(load_text())
+                self._save(path, index)
+
+            with self._lock:
+                self._memory[key] = index
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+                self._building.pop(key, None)
+            return index
+
+    def _save(self, path, index):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(index.to_dict(), f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning("Error saving retrieval index: %s", e)
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += size - old_size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _disk_entries(self):
+        entries = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evict_disk(self):
+        # Drop least recently used files until we're back under 90% of the limit
+        target = self.max_disk_bytes * 0.9
+        for path, size, _ in sorted(self._disk_entries(), key=lambda e: e[2]):
+            if self._disk_bytes <= target:
+                break
+            try:
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
+
+
+def format_excerpts(name, index, query, k=TOP_K):
+    chunks = index.excerpts(query, k)
+    lines = [f"Relevant excerpts from {name} ({len(chunks)} of {len(index.chunks)} sections):"]
+    for chunk in chunks:
+        lines.append(f"\n[lines {chunk['start_line']}-{chunk['end_line']}]\n{chunk['text'].rstrip()}")
+    return "\n".join(lines)
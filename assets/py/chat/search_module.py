@@ -1,57 +1,251 @@
-import os
-import json
+import re
+import sqlite3
+import threading
+from assets.py.chat.chat_history_module import CHAT_COLUMNS, fetch_dicts
+
+# Query words for the word index; each one must match the start of a word
+_WORD_RE = re.compile(r"\w+")
+# Substring queries need at least one trigram
+TRIGRAM_MIN_CHARS = 3
+# Results come in pages of this many chats, so a query costs the same on
+# any history size; later pages are read only when they are asked for
+CHAT_PAGE = 30
+# Matching messages read per step while looking for the chats of a page,
+# newest first
+HIT_PAGE = 1000
+SNIPPET_CONTEXT = 15
+# BM25 parameters, see rank_hits
+BM25_K1 = 1.2
+BM25_B = 0.75
+# End of a search's pages
+_DONE = object()
 
 class SearchModule:
-    def __init__(self, history_dir):
-        self.history_dir = history_dir
+    """
+    Ranked search over the history store's full-text indexes: substrings
+    through the trigram indexes (titles and messages), queries shorter than
+    a trigram through the word index. Chats whose title matches come first,
+    then chats by their newest match, a page at a time, each page ranked by
+    its chats' best message.
+    Searches use their own read connection, so they can run on a worker
+    thread without holding up the store, and cancel() aborts one mid-query.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._conn = store.connect()
+        self._lock = threading.Lock() # One search at a time on the connection
+
+    def close(self):
+        self._conn.close()
 
-    def search(self, query):
+    def cancel(self):
+        """Interrupts the running search (safe from any thread); it returns None."""
+        self._conn.interrupt()
+
+    def search(self, query, cancelled=None):
+        """Every page of results (see pages) in one list, or None if cancelled."""
         results = []
-        if not os.path.exists(self.history_dir):
-            return results
+        for page in self.pages(query, cancelled):
+            if page is None:
+                return None
+            results += page
+        return results
+
+    def pages(self, query, cancelled=None):
+        """
+        The results in pages of up to CHAT_PAGE chats:
+        [{"chat_id", "title", "snippet", "snippets"}, ...] best first within
+        the page; snippet is the best match, snippets every match in
+        conversation order. Chats whose title matches come first, then chats
+        by their newest matching message. There is always a first page (maybe
+        empty). Yields None and stops if cancel() was called or cancelled()
+        became true.
+        """
+        steps = self._pages(query.strip())
+        while True:
+            if cancelled and cancelled():
+                yield None
+                return
+            # Held per page only, so a search left waiting doesn't block the next one
+            with self._lock:
+                try:
+                    page = next(steps, _DONE)
+                except sqlite3.OperationalError as e:
+                    if "interrupt" not in str(e):
+                        raise
+                    page = None
+            if page is _DONE:
+                return
+            yield page
+            if page is None:
+                return
 
-        query = query.strip().lower()
-        try:
-            files = sorted([f for f in os.listdir(self.history_dir) if f.endswith('.json')], reverse=True)
-        except OSError:
-            return results
+    def _query(self, sql, params=()):
+        return fetch_dicts(self._conn, sql, params)
 
+    def _pages(self, query):
         if not query:
-            # Return all files with no snippet
-            return [{"filename": f, "snippet": None} for f in files]
-
-        for f in files:
-            file_path = os.path.join(self.history_dir, f)
-            match = False
-            snippet = None
-            
-            # Check filename (display name)
-            display_name = f.replace(".json", "")
-            parts = display_name.split('_', 2)
-            if len(parts) > 2:
-                display_name = parts[2]
-            
-            if query in display_name.lower():
-                match = True
+            # Return all chats with no snippet, most recently active first
+            yield [manifest_result(c) for c in self._query(
+                f"SELECT {CHAT_COLUMNS} FROM chats WHERE archived = 0 ORDER BY updated_at DESC, id DESC")]
+            return
+
+        substring = self.store.trigram and len(query) >= TRIGRAM_MIN_CHARS
+        if substring or not self.store.fts:
+            terms = [re.escape(query)]
+        else:
+            terms = [re.escape(w) for w in _WORD_RE.findall(query)] or [re.escape(query)]
+        pattern = re.compile("|".join(terms), re.IGNORECASE)
+        if substring or not self.store.fts:
+            required = [pattern]
+        else:
+            # The word index matches messages with a word starting with each query word
+            required = [re.compile(r"(?<![^\W_])" + term, re.IGNORECASE) for term in terms]
+
+        seen = set()
+        titles = self._title_matches(query, substring)
+        for start in range(0, len(titles), CHAT_PAGE):
+            chats = titles[start:start + CHAT_PAGE]
+            seen.update(chat["id"] for chat in chats)
+            yield self._results(chats, pattern, required, title_match=True)
+
+        shown = bool(titles)
+        for chats in self._message_matches(query, substring, seen):
+            yield self._results(chats, pattern, required)
+            shown = True
+        if not shown:
+            yield []
+
+    def _results(self, chats, pattern, required, title_match=False):
+        """Ranked results for a page of chats, with every matching message of each."""
+        marks = ", ".join("?" * len(chats))
+        # Read through the (chat_id, position) index and matched here: cheaper than
+        # asking the full-text index about each message of these chats
+        rows = [row for row in self._query(
+            f"SELECT chat_id, position, text FROM messages WHERE chat_id IN ({marks}) ORDER BY chat_id, position",
+            [chat["id"] for chat in chats]) if all(r.search(row["text"]) for r in required)]
+
+        hits = {}
+        for row, score in zip(rows, rank_hits([row["text"] for row in rows], pattern)):
+            hits.setdefault(row["chat_id"], []).append((score, row["position"], _snippet(row["text"], pattern)))
+        results = []
+        for chat in chats:
+            chat_hits = hits.get(chat["id"], [])
+            if not chat_hits and not title_match:
+                continue # Changed since the index was read
+            results.append((max((h[0] for h in chat_hits), default=0.0), chat, chat_hits))
+
+        results.sort(key=lambda r: (-r[0], -r[1]["id"]))
+        return [{
+            "chat_id": chat["id"],
+            "title": chat["title"],
+            "snippet": max(chat_hits, key=lambda h: (h[0], -h[1]))[2] if chat_hits else None,
+            "snippets": [s for _, _, s in chat_hits],
+        } for _, chat, chat_hits in results]
+
+    def _title_matches(self, query, substring):
+        # Newest chats first
+        if substring:
+            return self._query(
+                # CROSS JOIN keeps the index as the outer loop (not a scan of every chat)
+                "SELECT c.id, c.title FROM chats_trigram CROSS JOIN chats c ON c.id = chats_trigram.rowid "
+                "WHERE chats_trigram MATCH ? AND c.archived = 0 ORDER BY c.id DESC", (_phrase(query),))
+        # Too short for a trigram (or no trigram index): titles are few, scan them
+        pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        return self._query(
+            "SELECT id, title FROM chats WHERE archived = 0 AND title LIKE ? ESCAPE '\\' ORDER BY id DESC",
+            (pattern,))
+
+    def _message_matches(self, query, substring, seen):
+        """
+        Pages of up to CHAT_PAGE chats with matching messages, not in seen, by
+        their newest match: [{"id", "title"}, ...] per page. The index is read
+        newest first, HIT_PAGE matches a step, only as far as the pages taken.
+        """
+        if substring:
+            index, match = "messages_trigram", _phrase(query)
+        elif self.store.fts:
+            words = _WORD_RE.findall(query)
+            if not words:
+                return
+            index, match = "messages_fts", " ".join(_phrase(w) + "*" for w in words)
+        else:
+            index = None
+
+        page = []
+        before = 1 << 62 # Message ids below the last step
+        while True:
+            if index is None:
+                # No FTS5 in this SQLite build: scan the message text
+                rows = self._query(
+                    "SELECT c.id, c.title, c.archived, m.id AS message_id "
+                    "FROM messages m JOIN chats c ON c.id = m.chat_id "
+                    "WHERE m.id < ? AND instr(lower(m.text), ?) > 0 ORDER BY m.id DESC LIMIT ?",
+                    (before, query.lower(), HIT_PAGE))
             else:
-                # Check content
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as file:
-                        data = json.load(file)
-                        for msg in data:
-                            msg_text = msg.get('text', '')
-                            if query in msg_text.lower():
-                                match = True
-                                # Create snippet
-                                start_idx = msg_text.lower().find(query)
-                                start = max(0, start_idx - 15)
-                                end = min(len(msg_text), start_idx + len(query) + 15)
-                                snippet = "..." + msg_text[start:end].replace("\n", " ") + "..."
-                                break
-                except (json.JSONDecodeError, OSError, UnicodeDecodeError):
+                # Walks the index newest first (FTS5's bm25() would count the
+                # matches of the whole history before returning any)
+                rows = self._query(
+                    "SELECT c.id, c.title, c.archived, m.id AS message_id "
+                    f"FROM (SELECT rowid FROM {index} WHERE {index} MATCH ? AND rowid < ? "
+                    "ORDER BY rowid DESC LIMIT ?) hits "
+                    "JOIN messages m ON m.id = hits.rowid JOIN chats c ON c.id = m.chat_id",
+                    (match, before, HIT_PAGE))
+            rows.sort(key=lambda row: -row["message_id"])
+            for row in rows:
+                if row["archived"] or row["id"] in seen:
                     continue
-            
-            if match:
-                results.append({"filename": f, "snippet": snippet})
-        
-        return results
\ No newline at end of file
+                seen.add(row["id"])
+                page.append(row)
+                if len(page) == CHAT_PAGE:
+                    yield page
+                    page = []
+            if len(rows) < HIT_PAGE:
+                break
+            before = rows[-1]["message_id"]
+        if page:
+            yield page
+
+
+def rank_hits(texts, pattern):
+    """
+    BM25 scores of matching messages (higher is better). Every hit contains
+    every query term, so the IDF factor is the same for all of them and only
+    term frequency and length normalization are left.
+    """
+    if not texts:
+        return []
+    avg_length = sum(len(t) for t in texts) / len(texts) or 1
+    scores = []
+    for text in texts:
+        tf = len(pattern.findall(text))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * len(text) / avg_length)
+        scores.append(tf * (BM25_K1 + 1) / (tf + norm) if tf else 0.0)
+    return scores
+
+
+def manifest_result(chat):
+    """A search result for a manifest row (list_chats); the sidebar keeps
+    these rows in order and up to date without searching again."""
+    return {
+        "chat_id": chat["id"],
+        "title": chat["title"],
+        "snippet": None,
+        "snippets": [],
+        "updated_at": chat["updated_at"],
+        "message_count": chat["message_count"],
+        "last_snippet": chat["last_snippet"],
+    }
+
+def _phrase(text):
+    # FTS5 string literal: matched as-is, operators and punctuation included
+    return '"' + text.replace('"', '""') + '"'
+
+def _snippet(text, pattern):
+    # Text around the first match in the message
+    found = pattern.search(text)
+    start_idx, end_idx = (found.start(), found.end()) if found else (0, 0)
+    start = max(0, start_idx - SNIPPET_CONTEXT)
+    end = min(len(text), end_idx + SNIPPET_CONTEXT)
+    return "..." + text[start:end].replace("\n", " ") + "..."
@@ -0,0 +1,48 @@
+import re
+from collections import Counter
+
+DEFAULT_TITLE = "New Chat"
+
+STOPWORDS = {
+    "a", "about", "after", "all", "also", "am", "an", "and", "any", "are", "as", "at",
+    "be", "because", "been", "but", "by", "can", "could", "do", "does", "for", "from",
+    "get", "give", "good", "had", "has", "have", "hello", "help", "hey", "hi", "how",
+    "i", "if", "in", "into", "is", "it", "its", "just", "know", "let", "like", "make",
+    "me", "my", "need", "no", "not", "now", "of", "on", "one", "or", "our", "out",
+    "please", "should", "so", "some", "tell", "than", "thanks", "that", "the", "their",
+    "them", "then", "there", "these", "they", "this", "to", "up", "us", "use", "want",
+    "was", "we", "what", "when", "where", "which", "while", "who", "why", "will",
+    "with", "would", "you", "your",
+}
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z0-9+#.\-]*[A-Za-z0-9+#]|[A-Za-z]")
+
+def sanitize_title(title):
+    """Makes a title safe to use inside a file name."""
+    title = title.strip().replace('"', '').replace("'", "").replace("/", "-").replace("\\", "-").replace(":", "-")
+    for ch in '*?<>|\n\r\t':
+        title = title.replace(ch, " ")
+    title = " ".join(title.split())
+    return title[:60] or DEFAULT_TITLE
+
+def derive_local_title(text, max_words=5):
+    """
+    Builds a short title from the first message without a network call:
+    picks the most frequent non-stopword keywords (ties go to the earliest)
+    and keeps them in their original order.
+    """
+    words = _WORD_RE.findall(text or "")
+    keywords = [w for w in words if w.lower() not in STOPWORDS and len(w) > 1]
+    if not keywords:
+        return DEFAULT_TITLE
+
+    counts = Counter(w.lower() for w in keywords)
+    first_seen = {}
+    for i, w in enumerate(keywords):
+        first_seen.setdefault(w.lower(), i)
+
+    ranked = sorted(counts, key=lambda w: (-counts[w], first_seen[w]))[:max_words]
+    chosen = sorted(ranked, key=lambda w: first_seen[w])
+
+    title = " ".join(keywords[first_seen[w]] for w in chosen)
+    return sanitize_title(title[:1].upper() + title[1:])
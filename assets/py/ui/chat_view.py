@@ -0,0 +1,618 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from math import ceil
+import hashlib
+import re
+from PyQt6.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView, QApplication
+from PyQt6.QtCore import Qt, QObject, QAbstractListModel, QModelIndex, QPersistentModelIndex, QRectF, QPointF, QPoint, QSize, QUrl, QTimer, pyqtSignal
+from PyQt6.QtGui import (
+    QTextDocument, QAbstractTextDocumentLayout, QTextLayout, QTextCharFormat, QPainter, QPainterPath,
+    QColor, QFont, QFontMetrics, QPalette, QDesktopServices
+)
+from assets.py.chat.highlight_module import tokenize
+
+# Same split as the old widget bubbles: ```lang\ncode``` blocks become canvases
+CODE_BLOCK_RE = re.compile(r"```(\w*)\n(.*?)```", re.DOTALL)
+
+SENDER_ROLE = Qt.ItemDataRole.UserRole
+MESSAGE_ID_ROLE = Qt.ItemDataRole.UserRole + 1
+
+# ===== GEOMETRY =====
+# Mirrors the old widget layout (20px margins, 15px spacing, Material You bubbles)
+SIDE_MARGIN = 20
+ROW_SPACING = 15
+BUBBLE_PAD_X = 16
+BUBBLE_PAD_Y = 12
+BUBBLE_RADIUS = 20
+BUBBLE_CORNER = 4
+USER_MAX_WIDTH = 350
+TTS_SIZE = 30
+CANVAS_PAD = 12
+CANVAS_SPACING = 10
+CODE_HEADER = 26
+CODE_PAD = 10
+
+USER_BG = "#4F378B"
+USER_FG = "#FFFFFF"
+AI_BG = "#332D41"
+AI_FG = "#E6E1E5"
+CODE_BG = "#1E1E1E"
+CODE_HEADER_BG = "#2D2D2D"
+CODE_BORDER = "#49454F"
+CODE_FG = "#D4D4D4"
+CODE_LABEL_FG = "#A0A0A0"
+# Syntax colors on the dark code canvas (highlight_module kinds)
+TOKEN_COLORS = {
+    "keyword": "#569CD6",
+    "type": "#4EC9B0",
+    "string": "#CE9178",
+    "comment": "#6A9955",
+    "number": "#B5CEA8",
+    "function": "#DCDCAA",
+    "builtin": "#4FC1FF",
+}
+
+# Parsed messages are shared by content hash (see RenderCache)
+SEGMENT_CACHE_SIZE = 1024
+DOCUMENT_CACHE_SIZE = 512
+LAYOUT_CACHE_SIZE = 512
+HIGHLIGHT_CACHE_SIZE = 256
+# Entries a streaming message keeps between frames (its finished segments)
+STREAM_CACHE_SIZE = 32
+
+
+def split_segments(text):
+    """[("text", markdown), ("code", lang, code), ...] of an AI message."""
+    parts = CODE_BLOCK_RE.split(text)
+    segments = []
+    i = 0
+    while i < len(parts):
+        content = parts[i].strip()
+        if content:
+            segments.append(("text", content))
+        if i + 2 < len(parts):
+            segments.append(("code", parts[i + 1].strip(), parts[i + 2].strip()))
+            i += 3
+        else:
+            i += 1
+    return segments
+
+
+def content_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """A bounded map; get() builds and remembers missing entries."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, build):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        value = self._entries[key] = build()
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def find(self, key):
+        """The entry for key, or None (nothing is built)."""
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._entries[key]
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RenderCache:
+    """
+    What painting a message needs, keyed by content hash: its text/code
+    segments, the parsed document of each segment and its layout per row
+    width. Reopening a chat finds its messages laid out already, and a
+    resize only re-wraps the cached documents instead of parsing them again.
+    """
+
+    def __init__(self, max_entries=None):
+        self.segments = LRUCache(max_entries or SEGMENT_CACHE_SIZE)
+        self.documents = LRUCache(max_entries or DOCUMENT_CACHE_SIZE)
+        self.layouts = LRUCache(max_entries or LAYOUT_CACHE_SIZE)
+
+    def segments_for(self, key, text):
+        return self.segments.get(key, lambda: split_segments(text))
+
+    def document(self, text, markdown=True, font=None, key=None):
+        """A parsed document, shared: set its text width before using it."""
+        return self.documents.get((key or content_hash(text), markdown),
+                                  lambda: make_document(text, markdown, font))
+
+    def layout(self, key, text, sender, width):
+        return self.layouts.get((key, sender, width), lambda: MessageLayout(text, sender, width, self, key))
+
+
+def text_font():
+    font = QFont(QApplication.font())
+    font.setPixelSize(14)
+    return font
+
+def code_font():
+    font = QFont()
+    font.setFamilies(["Consolas", "Monaco", "monospace"])
+    font.setStyleHint(QFont.StyleHint.Monospace)
+    font.setPixelSize(13)
+    return font
+
+def label_font():
+    font = QFont(QApplication.font())
+    font.setPixelSize(12)
+    font.setBold(True)
+    return font
+
+def make_document(text, markdown=True, font=None):
+    doc = QTextDocument()
+    doc.setDocumentMargin(0)
+    doc.setDefaultFont(font or text_font())
+    if markdown:
+        doc.setMarkdown(text)
+    else:
+        doc.setPlainText(text)
+    return doc
+
+def wrap(doc, width):
+    # Documents are shared between layouts of different widths
+    width = max(width, 1)
+    if doc.textWidth() != width:
+        doc.setTextWidth(width)
+    return doc
+
+def bubble_path(rect, sender):
+    # Rounded bubble with a sharp corner at the bottom, on the sender's side
+    path = QPainterPath()
+    path.addRoundedRect(rect, BUBBLE_RADIUS, BUBBLE_RADIUS)
+    x = rect.right() - BUBBLE_RADIUS if sender == 'user' else rect.left()
+    corner = QPainterPath()
+    corner.addRoundedRect(QRectF(x, rect.bottom() - BUBBLE_RADIUS, BUBBLE_RADIUS, BUBBLE_RADIUS),
+                          BUBBLE_CORNER, BUBBLE_CORNER)
+    return path.united(corner)
+
+def draw_document(painter, doc, origin, color, width, clip=None):
+    wrap(doc, width)
+    context = QAbstractTextDocumentLayout.PaintContext()
+    if clip is not None:
+        # Only the lines inside clip (a long code block may be mostly off screen)
+        context.clip = clip.translated(-origin.x(), -origin.y())
+        if context.clip.bottom() < 0 or context.clip.top() > doc.size().height():
+            return
+    painter.save()
+    painter.translate(origin)
+    context.palette.setColor(QPalette.ColorRole.Text, QColor(color))
+    doc.documentLayout().draw(painter, context)
+    painter.restore()
+
+
+class MessageLayout:
+    """
+    One message laid out for a row width: its bubble and text documents,
+    plus the clickable areas (read aloud, copy code, links). Coordinates
+    are relative to the row's top left corner.
+    """
+
+    def __init__(self, text, sender, width, cache, key):
+        self.text = text
+        self.sender = sender
+        self.blocks = [] # (origin, document, color, text width)
+        self.canvases = [] # (canvas rect, lang, copy rect, code, document)
+        self.tts_rect = None
+        available = max(width - 2 * SIDE_MARGIN, 120)
+        if sender == 'ai' and "```" in text:
+            self._layout_canvas(cache.segments_for(key, text), available, cache)
+        else:
+            self._layout_simple(cache.document(text, key=key), available)
+        if sender == 'ai':
+            self.tts_rect = QRectF(self.bubble.right(), self.bubble.center().y() - TTS_SIZE / 2, TTS_SIZE, TTS_SIZE)
+        self.height = ceil(self.bubble.bottom()) + ROW_SPACING
+        self.path = bubble_path(self.bubble, sender)
+
+    def _layout_simple(self, doc, available):
+        user = self.sender == 'user'
+        max_width = min(USER_MAX_WIDTH, available) if user else available - TTS_SIZE
+        wrap(doc, max_width - 2 * BUBBLE_PAD_X)
+        # Short messages get a bubble as wide as their text
+        wrap(doc, min(ceil(doc.idealWidth()) + 1, max_width - 2 * BUBBLE_PAD_X))
+        width = doc.textWidth() + 2 * BUBBLE_PAD_X
+        height = doc.size().height() + 2 * BUBBLE_PAD_Y
+        x = SIDE_MARGIN + available - width if user else SIDE_MARGIN
+        self.bubble = QRectF(x, ROW_SPACING, width, height)
+        self.blocks.append((QPointF(x + BUBBLE_PAD_X, ROW_SPACING + BUBBLE_PAD_Y), doc,
+                            USER_FG if user else AI_FG, doc.textWidth()))
+
+    def _layout_canvas(self, segments, available, cache):
+        width = available - TTS_SIZE
+        inner = width - 2 * CANVAS_PAD
+        x = SIDE_MARGIN + CANVAS_PAD
+        y = ROW_SPACING + CANVAS_PAD
+        label_metrics = QFontMetrics(label_font())
+        for segment in segments:
+            if segment[0] == "text":
+                doc = wrap(cache.document(segment[1]), inner)
+                self.blocks.append((QPointF(x, y), doc, AI_FG, inner))
+                y += doc.size().height() + CANVAS_SPACING
+                continue
+            _, lang, code = segment
+            doc = wrap(cache.document(code, markdown=False, font=code_font()), inner - 2 * CODE_PAD)
+            canvas = QRectF(x, y, inner, CODE_HEADER + doc.size().height() + 2 * CODE_PAD)
+            copy_width = label_metrics.horizontalAdvance("Copy Code")
+            copy_rect = QRectF(canvas.right() - 10 - copy_width, y, copy_width, CODE_HEADER)
+            self.canvases.append((canvas, lang, copy_rect, code, doc))
+            self.blocks.append((QPointF(x + CODE_PAD, y + CODE_HEADER + CODE_PAD), doc, CODE_FG, inner - 2 * CODE_PAD))
+            y += canvas.height() + CANVAS_SPACING
+        height = y - CANVAS_SPACING + CANVAS_PAD - ROW_SPACING if self.blocks else 2 * CANVAS_PAD
+        self.bubble = QRectF(SIDE_MARGIN, ROW_SPACING, width, height)
+
+    def action_at(self, pos):
+        """("speak", text), ("copy", code), ("link", url) or None at a row position."""
+        if self.tts_rect is not None and self.tts_rect.contains(pos):
+            return ("speak", self.text)
+        for _, _, copy_rect, code, _ in self.canvases:
+            if copy_rect.contains(pos):
+                return ("copy", code)
+        for origin, doc, _, width in self.blocks:
+            anchor = wrap(doc, width).documentLayout().anchorAt(pos - origin)
+            if anchor:
+                return ("link", anchor)
+        return None
+
+    def paint(self, painter, clip=None):
+        """Paints the message; clip (row coordinates) limits the text drawn."""
+        painter.fillPath(self.path, QColor(USER_BG if self.sender == 'user' else AI_BG))
+        for canvas, lang, copy_rect, _, _ in self.canvases:
+            painter.setPen(QColor(CODE_BORDER))
+            painter.setBrush(QColor(CODE_BG))
+            painter.drawRoundedRect(canvas.adjusted(0.5, 0.5, -0.5, -0.5), 8, 8)
+            header = QPainterPath()
+            header.addRoundedRect(QRectF(canvas.x() + 1, canvas.y() + 1, canvas.width() - 2, CODE_HEADER), 7, 7)
+            header.addRect(QRectF(canvas.x() + 1, canvas.y() + CODE_HEADER / 2, canvas.width() - 2, CODE_HEADER / 2))
+            painter.fillPath(header.simplified(), QColor(CODE_HEADER_BG))
+            painter.setFont(label_font())
+            painter.setPen(QColor(CODE_LABEL_FG))
+            painter.drawText(QRectF(canvas.x() + 10, canvas.y(), canvas.width() / 2, CODE_HEADER),
+                             Qt.AlignmentFlag.AlignVCenter, f"Canvas ({lang})" if lang else "Canvas")
+            painter.drawText(copy_rect, Qt.AlignmentFlag.AlignCenter, "Copy Code")
+        for origin, doc, color, width in self.blocks:
+            draw_document(painter, doc, origin, color, width, clip)
+        if self.tts_rect is not None:
+            font = text_font()
+            font.setPixelSize(16)
+            painter.setFont(font)
+            painter.setPen(QColor(AI_FG))
+            painter.drawText(self.tts_rect, Qt.AlignmentFlag.AlignCenter, "🔊")
+
+
+class TranscriptModel(QAbstractListModel):
+    """
+    The messages shown in the transcript, as {"text", "sender", "id"} rows;
+    id is the message's id in the Conversation (None while it is streaming).
+    Rows also remember their height for the width they were measured at,
+    so laying out the list never re-measures an unchanged message.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return row["text"]
+        if role == SENDER_ROLE:
+            return row["sender"]
+        if role == MESSAGE_ID_ROLE:
+            return row["id"]
+        return None
+
+    def text_at(self, row):
+        return self.rows[row]["text"]
+
+    def sender_at(self, row):
+        return self.rows[row]["sender"]
+
+    def id_at(self, row):
+        return self.rows[row]["id"]
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
+
+    def insert_messages(self, row, messages):
+        """Inserts (text, sender, message id) rows at row."""
+        if not messages:
+            return
+        self.beginInsertRows(QModelIndex(), row, row + len(messages) - 1)
+        self.rows[row:row] = [{"text": text, "sender": sender, "id": message_id,
+                               "key": content_hash(text), "height": None}
+                              for text, sender, message_id in messages]
+        self.endInsertRows()
+
+    def append_message(self, text, sender, message_id=None):
+        """Adds a row at the bottom; the returned index follows it as rows are added above."""
+        self.insert_messages(len(self.rows), [(text, sender, message_id)])
+        return QPersistentModelIndex(self.index(len(self.rows) - 1))
+
+    def set_text(self, row, text):
+        self.rows[row]["text"] = text
+        self.rows[row]["key"] = content_hash(text)
+        self.rows[row]["height"] = None
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def remove_from(self, row):
+        """Removes this row and every row after it."""
+        if row < 0 or row >= len(self.rows):
+            return
+        self.beginRemoveRows(QModelIndex(), row, len(self.rows) - 1)
+        del self.rows[row:]
+        self.endRemoveRows()
+
+
+def format_ranges(lines, formats):
+    # tokenize() spans as per line format ranges (plain values, built on the worker)
+    result = []
+    for spans in lines:
+        ranges = []
+        for start, length, kind in spans:
+            format_range = QTextLayout.FormatRange()
+            format_range.start = start
+            format_range.length = length
+            format_range.format = formats[kind]
+            ranges.append(format_range)
+        result.append(ranges)
+    return result
+
+def apply_highlighting(doc, lines):
+    # Extra formats on each line's text layout: colors only, the document text and size stay
+    block = doc.begin()
+    for ranges in lines:
+        if not block.isValid():
+            break
+        block.layout().setFormats(ranges)
+        block = block.next()
+    # setFormats drops the lines' layout, lay them out again
+    doc.markContentsDirty(0, doc.characterCount())
+    doc.highlighted = True
+
+
+class CodeHighlighter(QObject):
+    """
+    Syntax highlighting for code canvases. Blocks are tokenized on a worker
+    thread, only when painted or near the viewport (want()), and the results
+    are cached per code hash, so scrolling back never tokenizes again.
+    A document is colored once its formats are in; updated then asks for a repaint.
+    """
+    updated = pyqtSignal()
+    # (key, format ranges or None if the block was scrolled away before its turn)
+    _tokenized = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.spans = LRUCache(HIGHLIGHT_CACHE_SIZE)
+        self.formats = {}
+        for kind, color in TOKEN_COLORS.items():
+            char_format = QTextCharFormat()
+            char_format.setForeground(QColor(color))
+            self.formats[kind] = char_format
+        self._pending = {} # key -> documents waiting for its formats
+        self._wanted = set() # Keys in or near the viewport; others are skipped
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="highlight")
+        self._tokenized.connect(self._on_tokenized)
+
+    def want(self, blocks):
+        """Highlights these (code, lang, document) blocks, and no others still queued."""
+        self._wanted = {(content_hash(code), lang) for code, lang, _ in blocks}
+        for code, lang, doc in blocks:
+            self.ensure(code, lang, doc)
+
+    def ensure(self, code, lang, doc):
+        if getattr(doc, "highlighted", False):
+            return
+        key = (content_hash(code), lang)
+        lines = self.spans.find(key)
+        if lines is not None:
+            apply_highlighting(doc, lines)
+            return
+        self._wanted.add(key)
+        waiting = self._pending.get(key)
+        if waiting is None:
+            self._pending[key] = [doc]
+            self._executor.submit(self._tokenize, key, code, lang)
+        elif not any(d is doc for d in waiting):
+            waiting.append(doc)
+
+    def _tokenize(self, key, code, lang):
+        # Worker thread
+        if key not in self._wanted:
+            self._tokenized.emit(key, None)
+            return
+        try:
+            lines = format_ranges(tokenize(code, lang), self.formats)
+        except Exception as e:
+            print(f"Error highlighting code: {e}")
+            lines = []
+        self._tokenized.emit(key, lines)
+
+    def _on_tokenized(self, key, lines):
+        waiting = self._pending.pop(key, [])
+        if lines is None:
+            return # Requested again if it comes back into view
+        self.spans.put(key, lines)
+        for doc in waiting:
+            apply_highlighting(doc, lines)
+        self.updated.emit()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class MessageDelegate(QStyledItemDelegate):
+    """
+    Lays out and paints messages. Heights are cached on the model rows and
+    layouts in a RenderCache shared by content hash, so the cost of a long
+    transcript is a list of heights, not a widget tree.
+    """
+
+    def __init__(self, view):
+        super().__init__(view)
+        self.view = view
+        self.cache = RenderCache()
+        self.highlighter = CodeHighlighter(self)
+        self.highlighter.updated.connect(self.view.viewport().update)
+
+    def row_width(self):
+        # Leave room for the scroll bar even while it is hidden: its showing up
+        # must not change the width and re-measure every row
+        return self.view.contentsRect().width() - self.view.verticalScrollBar().sizeHint().width()
+
+    def layout_for(self, index):
+        # Always at the viewport width, the width sizeHint() measured the row at
+        row = index.model().rows[index.row()] # The row itself; data() would hand out a copy
+        width = self.row_width()
+        layout = self.cache_for(row).layout(row["key"], row["text"], row["sender"], width)
+        row["height"] = (width, layout.height)
+        return layout
+
+    def cache_for(self, row):
+        # A streaming row (no message id yet) has new text every frame: keep it
+        # out of the shared cache, where each frame would evict a finished
+        # message, and only reuse its unchanged segments between frames
+        if row["id"] is not None:
+            return self.cache
+        if row.get("cache") is None:
+            row["cache"] = RenderCache(STREAM_CACHE_SIZE)
+        return row["cache"]
+
+    def sizeHint(self, option, index):
+        row = index.model().rows[index.row()]
+        width = self.row_width()
+        if row["height"] is None or row["height"][0] != width:
+            self.layout_for(index)
+        return QSize(width, row["height"][1])
+
+    def paint(self, painter, option, index):
+        layout = self.layout_for(index)
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.translate(QPointF(option.rect.topLeft()))
+        visible = option.rect.intersected(self.view.viewport().rect()).translated(-option.rect.topLeft())
+        layout.paint(painter, QRectF(visible))
+        painter.restore()
+        for _, lang, _, code, doc in layout.canvases:
+            self.highlighter.ensure(code, lang, doc)
+
+
+class ChatView(QListView):
+    """
+    The chat transcript: a list view over a TranscriptModel that only
+    lays out and paints the messages on screen.
+    Emits speak_requested for a message's read-aloud button; code copy
+    buttons and links are handled here.
+    """
+    speak_requested = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.chat_model = TranscriptModel(self)
+        self.setModel(self.chat_model)
+        self.delegate = MessageDelegate(self)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.verticalScrollBar().setSingleStep(20)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.NoSelection)
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+        self.setMouseTracking(True)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.setObjectName("chatView") # Styled by the application stylesheet
+        # A streamed message grows: lay the list out again
+        self.chat_model.dataChanged.connect(lambda top, bottom: self.delegate.sizeHintChanged.emit(top))
+        # Highlight code about to scroll into view once the view settles
+        self.prefetch_timer = QTimer(self)
+        self.prefetch_timer.setSingleShot(True)
+        self.prefetch_timer.timeout.connect(self.prefetch_highlighting)
+        self.verticalScrollBar().valueChanged.connect(lambda value: self.prefetch_timer.start())
+        self.verticalScrollBar().rangeChanged.connect(lambda low, high: self.prefetch_timer.start())
+
+    def prefetch_highlighting(self):
+        """Queues the code blocks on screen, then those within a screen below and above."""
+        count = self.chat_model.rowCount()
+        first = self.indexAt(QPoint(self.viewport().width() // 2, 0))
+        if not count or not first.isValid():
+            return
+        height = self.viewport().height()
+        visible, near = [], []
+        row = first.row()
+        while row < count:
+            top = self.visualRect(self.chat_model.index(row)).top()
+            if top >= 2 * height:
+                break
+            (visible if top < height else near).append(row)
+            row += 1
+        row = first.row() - 1
+        while row >= 0 and self.visualRect(self.chat_model.index(row)).bottom() > -height:
+            near.append(row)
+            row -= 1
+
+        blocks = []
+        for row in visible + near:
+            layout = self.delegate.layout_for(self.chat_model.index(row))
+            blocks.extend((code, lang, doc) for _, lang, _, code, doc in layout.canvases)
+        self.delegate.highlighter.want(blocks)
+
+    def shutdown(self):
+        self.prefetch_timer.stop()
+        self.delegate.highlighter.shutdown()
+
+    def action_at(self, pos):
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return None
+        rect = self.visualRect(index)
+        layout = self.delegate.layout_for(index)
+        return layout.action_at(QPointF(pos - rect.topLeft()))
+
+    def mouseMoveEvent(self, event):
+        action = self.action_at(event.position().toPoint())
+        self.viewport().setCursor(Qt.CursorShape.PointingHandCursor if action else Qt.CursorShape.ArrowCursor)
+        super().mouseMoveEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            action = self.action_at(event.position().toPoint())
+            if action and action[0] == "speak":
+                self.speak_requested.emit(action[1])
+            elif action and action[0] == "copy":
+                QApplication.clipboard().setText(action[1])
+            elif action and action[0] == "link":
+                QDesktopServices.openUrl(QUrl(action[1]))
+        super().mouseReleaseEvent(event)
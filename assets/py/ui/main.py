@@ -1,22 +1,39 @@
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QPushButton, QLineEdit, QScrollArea, QSizePolicy, QListWidget,
-    QFrame, QFileDialog, QMenu, QApplication, QMessageBox, QListWidgetItem
+    QPushButton, QLineEdit, QListWidget,
+    QFileDialog, QMenu, QApplication, QMessageBox, QListWidgetItem
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QSize
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QSize, QFileSystemWatcher, QPersistentModelIndex
 from PyQt6.QtTextToSpeech import QTextToSpeech
 from assets.py.ui.ui_models import ModelsWindow
 from assets.py.chat.chat_module import ChatModule
-from assets.py.chat.search_module import SearchModule
+from assets.py.chat.search_module import SearchModule, manifest_result
+from assets.py.chat.context_module import ContextBuilder
+from assets.py.chat.response_cache_module import ResponseCache
+from assets.py.chat.title_module import DEFAULT_TITLE, derive_local_title, sanitize_title
+from assets.py.chat.metrics_module import MetricsRecorder
+from assets.py.chat.attachment_module import load_attachment
+from assets.py.chat.blob_store_module import BlobStore
+from assets.py.chat.chat_history_module import HistoryStore
+from assets.py.chat.conversation_module import Conversation
+from assets.py.chat.models_config_module import load_models, active_model, model_type_for, model_targets
 from assets.py.ui.settings import SettingsWindow
-import json
+from assets.py.ui.chat_view import ChatView
+from assets.py.ui.theme import apply_theme, set_variant
 import os
-import base64
-import datetime
+import bisect
+import threading
+import time
 import re
 
 class ARSGPTMainWindow(QMainWindow):
-    ai_response_signal = pyqtSignal(str)
+    # Attachments are read on a worker thread: (load id, Attachment) / (load id, error)
+    attachment_loaded = pyqtSignal(int, object)
+    attachment_failed = pyqtSignal(int, str)
+    # Number of chats imported from the old per-file history (worker thread)
+    history_imported = pyqtSignal(int)
+    # Sidebar search results from the worker thread, a page at a time: (search id, page)
+    search_finished = pyqtSignal(int, object)
 
     def __init__(self):
         super().__init__()
@@ -24,28 +41,97 @@ class ARSGPTMainWindow(QMainWindow):
         self.resize(450, 650)
 
         self.current_api_key = None
+        self.current_model_name = None
+        self.current_base_url = None
         self.current_model_type = "gpt-4o" # Default fallback
+        self.model_targets = []
+        self.hedging_enabled = False # Hedge/fail over to the other configured keys
+        self.hedge_max_delay = 4.0 # Seconds to wait for a first token before hedging
         self.current_temperature = 0.7
+        self.current_context_budget = None # None = per-model default
+        self.context_builder = ContextBuilder()
+        self.response_cache_enabled = False # Opt-in, see Settings
+        self.response_cache = None
+        self.local_titles = False # Derive chat titles from keywords instead of asking the model
+        self.metrics = MetricsRecorder() # Recent per-request timings, see Settings > Diagnostics
+        self.metrics_logging = False
         self.chat_module = None
-        self.attachment_content = None
-        self.attachment_name = None
+        self.attachment = None
+        self.attachment_load_id = 0 # Ignores a slow read once another file was picked
+        self.attachment_read_started = None # time.time() of the file being read, if any
+        self.max_attachment_mb = 20 # Images and other binaries, see Settings
+        self.attachment_loaded.connect(self.on_attachment_loaded)
+        self.attachment_failed.connect(self.on_attachment_failed)
         self.is_generating = False
-        self.chat_messages = []
-        self.current_chat_file = None
-        self.pending_first_message = None
-        self.temp_module = None
+        # The open chat's loaded messages by id; transcript row i shows conversation.messages[i]
+        self.conversation = Conversation()
+        self.current_chat_id = None # Row id in the history store
+        # Chats open with their last page of messages; older pages are read
+        # from the store as the transcript is scrolled to the top
+        self.chat_page_messages = 30
+        self.chat_scroll_anchor = None # Distance from the bottom to keep while pages are added
+        # Request routing: responses are matched to their chat by request id
+        self.active_request_id = None
+        self.request_chats = {}
+        self.title_requests = {} # request id -> (chat id, first message)
         self.speech_engine = QTextToSpeech()
         self.tts_enabled = True
         self.current_pitch = 0.0
         self.current_rate = 0.0
         self.current_volume = 1.0
 
-        # Setup history directories
+        # Streaming state: deltas are buffered and repainted once per frame
+        self.stream_bubble = None
+        self.stream_text = ""
+        self.stream_dirty = False
+        self.stream_timer = QTimer(self)
+        self.stream_timer.setInterval(16) # ~60 FPS
+        self.stream_timer.timeout.connect(self.flush_stream)
+
+        # Sidebar search: runs once typing pauses, on a worker thread. Results
+        # come a page of chats at a time, and rows are added a few milliseconds
+        # per event loop pass; both only as far as the list is scrolled, so
+        # typing never stutters
+        self.search_id = 0 # Results of superseded searches are dropped
+        self.search_more = threading.Event() # Set when the sidebar wants the next page
+        self.history_search_shown = None # Search whose results the sidebar shows
+        self.history_pending = [] # Results not added to the sidebar yet
+        self.history_rows_wanted = 0
+        self.history_page_rows = 60
+        self.history_render_budget = 0.008 # Seconds of row building per pass
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(lambda: self.filter_chat_history(self.search_bar.text()))
+        self.history_render_timer = QTimer(self)
+        self.history_render_timer.setInterval(0)
+        self.history_render_timer.timeout.connect(self.render_history_batch)
+        self.search_finished.connect(self.on_search_finished)
+        # The unfiltered list is kept in manifest order by moving, adding and
+        # removing single rows as chats change (chat id -> (item, result))
+        self.history_items = {}
+        self.history_is_manifest = True
+
+        # Setup history store (chat_history also holds the old one-file-per-chat history)
         base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
         self.history_dir = os.path.join(base_dir, "chat_history")
-        self.archive_dir = os.path.join(self.history_dir, "archive")
-        os.makedirs(self.archive_dir, exist_ok=True)
-        self.search_module = SearchModule(self.history_dir)
+        self.history_store = HistoryStore(os.path.join(self.history_dir, "history.db"))
+        self.cache_dir = os.path.join(base_dir, "cache")
+        self.metrics_file = os.path.join(base_dir, "logs", "request_metrics.jsonl")
+        # Attachments, stored once per content hash and referenced from the chats
+        self.blob_store = BlobStore(os.path.join(base_dir, "blobs"))
+        self.context_builder.blob_store = self.blob_store
+        self.search_module = SearchModule(self.history_store)
+        # Other instances writing to the same history: the database files are
+        # watched and the sidebar is synced once their writes settle
+        self.history_watcher = QFileSystemWatcher(self)
+        self.history_watcher.fileChanged.connect(self.on_history_files_changed)
+        self.history_watcher.directoryChanged.connect(self.on_history_files_changed)
+        self.history_sync_timer = QTimer(self)
+        self.history_sync_timer.setSingleShot(True)
+        self.history_sync_timer.setInterval(200)
+        self.history_sync_timer.timeout.connect(self.sync_history_rows)
+        self.watch_history_files()
 
         # --- MAIN CONTAINER ---
         main_widget = QWidget()
@@ -54,32 +140,34 @@ class ARSGPTMainWindow(QMainWindow):
         main_layout.setSpacing(0)
 
         # ===== SIDEBAR =====
+        # Widgets are styled by the application stylesheet (theme.py), through
+        # their object names and variant properties
         self.sidebar = QWidget()
+        self.sidebar.setObjectName("sidebar")
+        self.sidebar.setAttribute(Qt.WidgetAttribute.WA_StyledBackground)
         self.sidebar.setFixedWidth(260)
         sidebar_layout = QVBoxLayout()
         sidebar_layout.setContentsMargins(10, 20, 10, 20)
 
         self.new_chat_btn = QPushButton("+ New Chat")
+        self.new_chat_btn.setObjectName("newChatButton")
         self.new_chat_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.new_chat_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #4F378B; color: white; border-radius: 16px; 
-                padding: 15px; font-weight: bold; text-align: left; padding-left: 20px;
-            }
-            QPushButton:hover { background-color: #6750A4; }
-        """)
         sidebar_layout.addWidget(self.new_chat_btn)
 
         self.hist_label = QLabel("History")
+        self.hist_label.setObjectName("historyLabel")
         sidebar_layout.addWidget(self.hist_label)
 
         self.search_bar = QLineEdit()
+        self.search_bar.setObjectName("searchBar")
         self.search_bar.setPlaceholderText("Search chats...")
-        self.search_bar.textChanged.connect(self.filter_chat_history)
+        self.search_bar.textChanged.connect(self.on_search_text_changed)
         sidebar_layout.addWidget(self.search_bar)
 
         self.history_list = QListWidget()
+        self.history_list.setObjectName("historyList")
         self.history_list.itemClicked.connect(self.on_history_item_clicked)
+        self.history_list.verticalScrollBar().valueChanged.connect(self.on_history_scrolled)
         sidebar_layout.addWidget(self.history_list)
         
         self.sidebar.setLayout(sidebar_layout)
@@ -95,13 +183,17 @@ class ARSGPTMainWindow(QMainWindow):
         header = QHBoxLayout()
         header.setContentsMargins(10, 10, 10, 0)
         self.menu_btn = QPushButton("≡")
+        self.menu_btn.setProperty("variant", "icon")
         self.menu_btn.setFixedWidth(40)
         self.menu_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         
         self.title = QLabel("ARS-GPT")
+        self.title.setObjectName("title")
         self.title.setAlignment(Qt.AlignmentFlag.AlignCenter)
         
         self.settings_btn = QPushButton("⚙")
+        self.settings_btn.setObjectName("settingsButton")
+        self.settings_btn.setProperty("variant", "icon")
         self.settings_btn.setFixedWidth(40)
         self.settings_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         
@@ -111,28 +203,30 @@ class ARSGPTMainWindow(QMainWindow):
 
         # ===== GREETING =====
         self.greeting = QLabel("Welcome to ARS-GPT!")
+        self.greeting.setObjectName("greeting")
         self.greeting.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
         # ===== CHAT AREA =====
-        self.chat_scroll = QScrollArea()
-        self.chat_scroll.setWidgetResizable(True)
-        self.chat_content = QWidget()
-        self.chat_content.setStyleSheet("background: transparent;")
-        self.chat_layout = QVBoxLayout()
-        self.chat_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        self.chat_layout.setSpacing(15)
-        self.chat_layout.setContentsMargins(20, 20, 20, 20)
-        self.chat_content.setLayout(self.chat_layout)
-        self.chat_scroll.setWidget(self.chat_content)
+        # Messages are rows of a model, painted by a delegate only while on screen
+        self.chat_view = ChatView()
+        self.chat_model = self.chat_view.chat_model
+        self.chat_view.customContextMenuRequested.connect(self.show_message_context_menu)
+        self.chat_view.speak_requested.connect(self.speak_text)
+        self.chat_view.verticalScrollBar().valueChanged.connect(self.on_chat_scrolled)
+        self.chat_view.verticalScrollBar().rangeChanged.connect(self.on_chat_range_changed)
 
         # ===== INPUT BAR =====
         input_bar = QHBoxLayout()
         input_bar.setContentsMargins(15, 10, 15, 15)
         self.plus_btn = QPushButton("+")
+        self.plus_btn.setObjectName("attachButton")
+        self.plus_btn.setProperty("variant", "tonal")
         self.plus_btn.setFixedSize(40, 40)
         self.plus_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         
         self.mode_btn = QPushButton("◎")
+        self.mode_btn.setObjectName("modeButton")
+        self.mode_btn.setProperty("variant", "tonal")
         self.mode_btn.setFixedSize(40, 40)
         self.mode_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         
@@ -140,10 +234,13 @@ class ARSGPTMainWindow(QMainWindow):
         self.prompt.setPlaceholderText("Ask ARS-GPT")
         
         self.model_btn = QPushButton("Models")
+        self.model_btn.setObjectName("modelButton")
+        self.model_btn.setProperty("variant", "tonal")
         self.model_btn.setFixedHeight(40)
         self.model_btn.setCursor(Qt.CursorShape.PointingHandCursor)
         
         self.send_btn = QPushButton("➤")
+        self.send_btn.setObjectName("sendButton")
         self.send_btn.setFixedSize(40, 40)
         
         input_bar.addWidget(self.plus_btn)
@@ -155,7 +252,7 @@ class ARSGPTMainWindow(QMainWindow):
         # ===== ASSEMBLE =====
         content_layout.addLayout(header)
         content_layout.addWidget(self.greeting)
-        content_layout.addWidget(self.chat_scroll, 1)
+        content_layout.addWidget(self.chat_view, 1)
         content_layout.addLayout(input_bar)
         
         content_widget.setLayout(content_layout)
@@ -173,46 +270,52 @@ class ARSGPTMainWindow(QMainWindow):
         self.plus_btn.clicked.connect(self.upload_file)
         self.menu_btn.clicked.connect(self.toggle_sidebar)
         self.new_chat_btn.clicked.connect(self.start_new_chat)
-        self.ai_response_signal.connect(self.handle_ai_response)
+        self.history_imported.connect(self.on_history_imported)
         
         # Load history
         self.load_chat_history()
+        if not self.history_store.is_imported():
+            threading.Thread(target=self.import_history, daemon=True).start()
         self.load_active_model()
         self.update_send_button_state()
         self.set_theme("dark")
 
     def closeEvent(self, event):
-        # Clean up threads to prevent crash on exit
-        if self.chat_module and hasattr(self.chat_module, 'isRunning') and self.chat_module.isRunning():
-            self.chat_module.terminate()
-            self.chat_module.wait()
-        
-        if self.temp_module and hasattr(self.temp_module, 'isRunning') and self.temp_module.isRunning():
-            self.temp_module.terminate()
-            self.temp_module.wait()
+        # Abort in-flight requests and let the worker threads exit to prevent crash on exit
+        if self.chat_module:
+            self.chat_module.shutdown()
+        self.cancel_search()
+        self.search_module.close()
+        # Closing the store rewrites its -wal file; the watcher must not sync against it
+        self.history_watcher.blockSignals(True)
+        watched = self.history_watcher.files() + self.history_watcher.directories()
+        if watched:
+            self.history_watcher.removePaths(watched)
+        self.history_sync_timer.stop()
+        self.chat_view.shutdown()
+        self.history_store.close()
         event.accept()
 
     def update_send_button_state(self):
+        # Send, stop (generating) and disabled looks all come from the stylesheet
+        set_variant(self.send_btn, "generating", self.is_generating)
         if self.is_generating:
             self.send_btn.setEnabled(True)
             self.send_btn.setText("■")
             self.send_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-            self.send_btn.setStyleSheet("background-color: #B3261E; border-radius: 20px; color: white; font-size: 16px; padding-left: 0px;")
             return
 
         text = self.prompt.text().strip()
-        has_attachment = self.attachment_content is not None
+        has_attachment = self.attachment is not None
         
         if text or has_attachment:
             self.send_btn.setEnabled(True)
             self.send_btn.setCursor(Qt.CursorShape.PointingHandCursor)
             self.send_btn.setText("➤")
-            self.send_btn.setStyleSheet("background-color: #4F378B; border-radius: 20px; color: white; font-size: 20px; padding-left: 3px;")
         else:
             self.send_btn.setEnabled(False)
             self.send_btn.setCursor(Qt.CursorShape.ArrowCursor)
             self.send_btn.setText("➤")
-            self.send_btn.setStyleSheet("background-color: #2B2930; border-radius: 20px; color: #555; font-size: 20px; padding-left: 3px;")
 
     def toggle_sidebar(self):
         if self.sidebar.isVisible():
@@ -221,21 +324,13 @@ class ARSGPTMainWindow(QMainWindow):
             self.sidebar.show()
 
     def start_new_chat(self):
-        # Clear chat layout
-        while self.chat_layout.count():
-            item = self.chat_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.layout():
-                # Clear sub-layout (message container)
-                while item.layout().count():
-                    sub_item = item.layout().takeAt(0)
-                    if sub_item.widget():
-                        sub_item.widget().deleteLater()
+        self.detach_active_request()
+
+        self.chat_model.clear()
         
-        self.chat_messages = []
-        self.current_chat_file = None
-        self.pending_first_message = None
+        self.conversation.clear()
+        self.current_chat_id = None
+        self.chat_scroll_anchor = None
         
         self.greeting.show()
         self.prompt.clear()
@@ -243,26 +338,184 @@ class ARSGPTMainWindow(QMainWindow):
             self.sidebar.hide()
 
     def load_chat_history(self):
-        self.history_list.clear()
-        if os.path.exists(self.history_dir):
-            try:
-                files = sorted([f for f in os.listdir(self.history_dir) if f.endswith('.json')], reverse=True)
-                for f in files:
-                    self.add_history_item(f)
-            except Exception as e:
-                print(f"Error loading history: {e}")
+        self.cancel_search()
+        try:
+            chats = self.history_store.list_chats()
+        except Exception as e:
+            print(f"Error loading history: {e}")
+            return
+        self.show_history_rows([manifest_result(c) for c in chats])
+
+    def import_history(self):
+        # One-time move of the old .json/.jsonl chat files into the store
+        try:
+            self.history_imported.emit(self.history_store.import_legacy(self.history_dir))
+        except Exception as e:
+            print(f"Error importing chat history: {e}")
+
+    def on_history_imported(self, count):
+        if count:
+            self.filter_chat_history(self.search_bar.text())
+
+    def on_search_text_changed(self, text):
+        # Abort the running search right away; the new one starts when typing pauses
+        self.cancel_search()
+        self.search_timer.start()
+
+    def cancel_search(self):
+        self.search_id += 1
+        self.search_timer.stop()
+        self.search_module.cancel()
+        self.search_more.set() # A search waiting for the sidebar wakes up and stops
 
     def filter_chat_history(self, text):
+        self.cancel_search()
+        search_id = self.search_id
+        self.search_more = threading.Event()
+        threading.Thread(target=self.run_search, args=(search_id, text, self.search_more), daemon=True).start()
+
+    def run_search(self, search_id, text, more):
+        # Sends each page as soon as it is found, the next one once the sidebar wants it
+        try:
+            for page in self.search_module.pages(text, cancelled=lambda: search_id != self.search_id):
+                if page is None:
+                    return
+                more.clear()
+                self.search_finished.emit(search_id, page)
+                more.wait()
+        except Exception as e:
+            print(f"Error searching history: {e}")
+
+    def on_search_finished(self, search_id, results):
+        if search_id != self.search_id:
+            return
+        if self.history_search_shown != search_id:
+            # Old rows stay until the first page is in (no flicker while typing)
+            self.history_search_shown = search_id
+            self.show_history_rows(results)
+        else:
+            self.history_pending[:0] = reversed(results) # After the rows still pending
+            self.render_history_batch()
+
+    def show_history_rows(self, results):
         self.history_list.clear()
-        results = self.search_module.search(text)
-        for result in results:
-            self.add_history_item(result['filename'], result['snippet'])
+        self.history_items = {}
+        self.history_is_manifest = all("updated_at" in r for r in results)
+        self.history_pending = list(reversed(results)) # Popped from the end
+        self.history_rows_wanted = self.history_page_rows
+        self.render_history_batch()
+
+    def render_history_batch(self):
+        deadline = time.perf_counter() + self.history_render_budget
+        while (self.history_pending and self.history_list.count() < self.history_rows_wanted
+               and time.perf_counter() < deadline):
+            self.add_history_item(self.history_pending.pop())
+        if self.history_pending and self.history_list.count() < self.history_rows_wanted:
+            self.history_render_timer.start()
+        else:
+            self.history_render_timer.stop()
+            if self.history_list.count() < self.history_rows_wanted:
+                self.search_more.set() # Out of rows; have the search find more
+
+    def on_history_scrolled(self, value):
+        # Add the next page of rows when the list is scrolled near its end
+        if value >= self.history_list.verticalScrollBar().maximum() - 100:
+            self.history_rows_wanted = self.history_list.count() + self.history_page_rows
+            self.render_history_batch()
+
+    # ===== SIDEBAR ROWS =====
+    def history_key(self, result):
+        # Manifest order: most recently active first
+        return (-result['updated_at'], -result['chat_id'])
+
+    def place_history_row(self, result):
+        """Adds a manifest row where it belongs (binary search over the rendered rows)."""
+        rows = self.history_list.count()
+        row = bisect.bisect_left(range(rows), self.history_key(result), key=lambda r: self.history_key(
+            self.history_items[self.history_list.item(r).data(Qt.ItemDataRole.UserRole)][1]))
+        if row == rows and self.history_pending:
+            # Below the rendered rows: wait with the others (oldest first, popped from the end)
+            bisect.insort(self.history_pending, result, key=lambda r: (r['updated_at'], r['chat_id']))
+        else:
+            self.add_history_item(result, row)
+
+    def remove_history_row(self, chat_id):
+        entry = self.history_items.pop(chat_id, None)
+        if entry is not None:
+            self.history_list.takeItem(self.history_list.row(entry[0]))
+        else:
+            self.history_pending = [r for r in self.history_pending if r['chat_id'] != chat_id]
 
-    def add_history_item(self, filename, snippet=None):
+    def refresh_history_row(self, chat_id):
+        # One chat changed here: re-read its manifest row and move it into place
+        if self.search_bar.text() or not self.history_is_manifest:
+            self.search_timer.start() # Matches may have changed; search again
+            return
+        try:
+            chat = self.history_store.get_chat(chat_id)
+        except Exception as e:
+            print(f"Error loading history: {e}")
+            return
+        self.remove_history_row(chat_id)
+        if chat is not None and not chat['archived']:
+            self.place_history_row(manifest_result(chat))
+
+    def watch_history_files(self):
+        # The -wal file comes and goes with the connections, so re-add it when it is back
+        db_path = self.history_store.db_path
+        watched = set(self.history_watcher.files() + self.history_watcher.directories())
+        missing = [p for p in (self.history_dir, db_path, db_path + "-wal")
+                   if p not in watched and os.path.exists(p)]
+        if missing:
+            self.history_watcher.addPaths(missing)
+
+    def on_history_files_changed(self, path):
+        self.watch_history_files()
+        self.history_sync_timer.start()
+
+    def sync_history_rows(self):
+        # Applies what other instances changed, touching only the rows that differ
+        try:
+            if not self.history_store.changed_elsewhere():
+                return # Our own writes; the rows are up to date
+            if self.search_bar.text() or not self.history_is_manifest:
+                self.filter_chat_history(self.search_bar.text())
+                return
+            chats = [manifest_result(c) for c in self.history_store.list_chats()]
+        except Exception as e:
+            print(f"Error loading history: {e}")
+            return
+        wanted = {r['chat_id'] for r in chats}
+        for chat_id in [c for c in self.history_items if c not in wanted]:
+            self.remove_history_row(chat_id)
+        rows = min(len(chats), self.history_list.count())
+        for row, result in enumerate(chats[:rows]):
+            entry = self.history_items.get(result['chat_id'])
+            if entry is None or entry[1] != result or self.history_list.row(entry[0]) != row:
+                if entry is not None:
+                    self.remove_history_row(result['chat_id'])
+                self.add_history_item(result, row)
+        while self.history_list.count() > rows:
+            item = self.history_list.takeItem(self.history_list.count() - 1)
+            del self.history_items[item.data(Qt.ItemDataRole.UserRole)]
+        self.history_pending = list(reversed(chats[rows:]))
+        self.render_history_batch()
+
+    def add_history_item(self, result, row=None):
+        chat_id = result['chat_id']
+        title = result['title']
+        snippet = result['snippet']
+        snippets = result['snippets']
         item = QListWidgetItem()
         height = 65 if snippet else 50
         item.setSizeHint(QSize(0, height))
-        item.setData(Qt.ItemDataRole.UserRole, filename)
+        item.setData(Qt.ItemDataRole.UserRole, chat_id)
+        if snippets and len(snippets) > 1:
+            # Best match in the row, every match on hover
+            item.setToolTip("\n".join(snippets))
+        elif result.get('message_count'):
+            count = result['message_count']
+            item.setToolTip(f"{count} message{'s' if count != 1 else ''} · {result['last_snippet']}")
         
         widget = QWidget()
         layout = QHBoxLayout()
@@ -273,20 +526,16 @@ class ARSGPTMainWindow(QMainWindow):
         text_layout.setSpacing(0)
         text_layout.setContentsMargins(0, 0, 0, 0)
         
-        # Parse filename for display: YYYYMMDD_HHMMSS_Title.json
-        display_name = filename.replace(".json", "")
-        parts = display_name.split('_', 2)
-        if len(parts) > 2:
-            display_name = parts[2]
-            
-        label = QLabel(display_name)
-        label.setStyleSheet("background: transparent; border: none; color: inherit; font-weight: bold;")
+        label = QLabel(title)
+        label.setProperty("role", "rowTitle")
         label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents) # Let click pass to list item
         text_layout.addWidget(label)
 
         if snippet:
+            if snippets and len(snippets) > 1:
+                snippet = f"{snippet} (+{len(snippets) - 1})"
             snip_label = QLabel(snippet)
-            snip_label.setStyleSheet("background: transparent; border: none; color: #888888; font-size: 11px;")
+            snip_label.setProperty("role", "rowSnippet")
             snip_label.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
             text_layout.addWidget(snip_label)
         else:
@@ -298,267 +547,133 @@ class ARSGPTMainWindow(QMainWindow):
         menu_btn = QPushButton("⋮")
         menu_btn.setFixedSize(24, 24)
         menu_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        menu_btn.setStyleSheet("""
-            QPushButton { background: transparent; border: none; color: inherit; font-weight: bold; border-radius: 12px; }
-            QPushButton:hover { background-color: rgba(128, 128, 128, 0.3); }
-        """)
-        menu_btn.clicked.connect(lambda: self.show_history_menu(menu_btn, filename, item))
+        menu_btn.setProperty("variant", "rowMenu")
+        menu_btn.clicked.connect(lambda: self.show_history_menu(menu_btn, chat_id, item))
         
         layout.addWidget(menu_btn)
         widget.setLayout(layout)
         
-        self.history_list.addItem(item)
+        if row is None:
+            self.history_list.addItem(item)
+        else:
+            self.history_list.insertItem(row, item)
         self.history_list.setItemWidget(item, widget)
+        self.history_items[chat_id] = (item, result)
 
-    def show_history_menu(self, btn, filename, item):
+    def show_history_menu(self, btn, chat_id, item):
         menu = QMenu(self)
         delete_action = menu.addAction("Delete")
         archive_action = menu.addAction("Archive")
         
-        # Style the menu
-        menu.setStyleSheet("""
-            QMenu { background-color: #2B2930; color: #E6E1E5; border: 1px solid #49454F; }
-            QMenu::item { padding: 8px 20px; }
-            QMenu::item:selected { background-color: #4F378B; }
-        """)
-        
         action = menu.exec(btn.mapToGlobal(btn.rect().bottomLeft()))
         
         if action == delete_action:
-            self.delete_chat(filename, item)
+            self.delete_chat(chat_id, item)
         elif action == archive_action:
-            self.archive_chat(filename, item)
+            self.archive_chat(chat_id, item)
 
-    def delete_chat(self, filename, item):
-        path = os.path.join(self.history_dir, filename)
-        if os.path.exists(path):
-            try:
-                os.remove(path)
-            except: pass
-        
-        row = self.history_list.row(item)
-        self.history_list.takeItem(row)
+    def delete_chat(self, chat_id, item):
+        try:
+            self.history_store.delete_chat(chat_id)
+        except Exception as e:
+            print(f"Error deleting chat: {e}")
+
+        self.remove_history_row(chat_id)
+        self.render_history_batch()
         
-        if self.current_chat_file == path:
+        if self.current_chat_id == chat_id:
             self.start_new_chat()
 
-    def archive_chat(self, filename, item):
-        src = os.path.join(self.history_dir, filename)
-        dst = os.path.join(self.archive_dir, filename)
-        if os.path.exists(src):
-            try:
-                os.rename(src, dst)
-            except: pass
-            
-        row = self.history_list.row(item)
-        self.history_list.takeItem(row)
+    def archive_chat(self, chat_id, item):
+        try:
+            self.history_store.set_archived(chat_id)
+        except Exception as e:
+            print(f"Error archiving chat: {e}")
+
+        self.remove_history_row(chat_id)
+        self.render_history_batch()
         
-        if self.current_chat_file == src:
+        if self.current_chat_id == chat_id:
             self.start_new_chat()
 
     def on_history_item_clicked(self, item):
-        filename = item.data(Qt.ItemDataRole.UserRole)
-        path = os.path.join(self.history_dir, filename)
-        
-        if not os.path.exists(path):
-            return
+        chat_id = item.data(Qt.ItemDataRole.UserRole)
+
+        self.detach_active_request()
             
-        # Clear current UI without resetting file logic yet
-        while self.chat_layout.count():
-            item = self.chat_layout.takeAt(0)
-            if item.widget():
-                item.widget().deleteLater()
-            elif item.layout():
-                while item.layout().count():
-                    sub_item = item.layout().takeAt(0)
-                    if sub_item.widget():
-                        sub_item.widget().deleteLater()
-                item.layout().deleteLater()
+        self.chat_model.clear()
             
         self.greeting.hide()
-        self.current_chat_file = path
-        self.chat_messages = []
+        self.current_chat_id = chat_id
+        self.conversation.clear()
         
         try:
-            with open(path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                self.chat_messages = data
-                for msg in data:
-                    self.render_message(msg['text'], msg['sender'])
-            
-            # Scroll to bottom
-            QTimer.singleShot(100, lambda: self.chat_scroll.verticalScrollBar().setValue(
-                self.chat_scroll.verticalScrollBar().maximum()))
+            # Only the last page; older ones follow as the user scrolls up
+            start, data = self.history_store.load_tail(chat_id, self.chat_page_messages)
+            self.conversation.clear(start)
+            ids = self.conversation.prepend(start, data)
+            self.chat_scroll_anchor = 0 # Stay at the bottom while the page lays out
+            self.chat_model.insert_messages(0, [(msg['text'], msg['sender'], message_id)
+                                                for msg, message_id in zip(data, ids)])
+        except Exception as e:
+            print(f"Error loading chat: {e}")
+
+    def load_older_messages(self):
+        # Prepends the page before the loaded ones, keeping the view where it was
+        try:
+            start, page = self.history_store.load_tail(
+                self.current_chat_id, self.chat_page_messages, before=self.conversation.offset)
         except Exception as e:
             print(f"Error loading chat: {e}")
+            return
+        bar = self.chat_view.verticalScrollBar()
+        self.chat_scroll_anchor = bar.maximum() - bar.value()
+        ids = self.conversation.prepend(start, page)
+        self.chat_model.insert_messages(0, [(msg['text'], msg['sender'], message_id)
+                                            for msg, message_id in zip(page, ids)])
+
+    def on_chat_scrolled(self, value):
+        bar = self.chat_view.verticalScrollBar()
+        if self.chat_scroll_anchor is not None and value != bar.maximum() - self.chat_scroll_anchor:
+            self.chat_scroll_anchor = None # The user scrolled; stop pinning the view
+        if self.conversation.offset > 0 and value <= 100 and self.current_chat_id is not None:
+            self.load_older_messages()
+
+    def on_chat_range_changed(self, minimum, maximum):
+        # Runs once the added messages are laid out
+        bar = self.chat_view.verticalScrollBar()
+        if self.chat_scroll_anchor is not None:
+            bar.setValue(maximum - self.chat_scroll_anchor)
+        # A page shorter than the window can't be scrolled up; fill the window first
+        if self.conversation.offset > 0 and maximum <= 100 and self.current_chat_id is not None:
+            QTimer.singleShot(0, self.load_older_messages)
 
     # ===== CHAT FUNCTIONS =====
-    def add_message(self, text, sender='user'):
-        bubble = self.render_message(text, sender)
-        
+    def add_message(self, text, sender='user', prompt=None, notice=False, attachments=None):
         # Save to memory and file
-        self.chat_messages.append({"sender": sender, "text": text})
-        if self.current_chat_file:
-            self.save_chat()
-            
-        return bubble
-
-    def render_complex_message(self, text, sender):
-        bubble = QWidget()
-        bubble.setProperty("sender", sender)
-        bubble.setProperty("original_text", text)
-        
-        layout = QVBoxLayout(bubble)
-        layout.setContentsMargins(12, 12, 12, 12)
-        layout.setSpacing(10)
-        
-        # Split text by code blocks
-        parts = re.split(r"```(\w*)\n(.*?)```", text, flags=re.DOTALL)
-        
-        i = 0
-        while i < len(parts):
-            content = parts[i].strip()
-            if content:
-                lbl = QLabel(content)
-                lbl.setTextFormat(Qt.TextFormat.MarkdownText)
-                lbl.setWordWrap(True)
-                lbl.setOpenExternalLinks(True)
-                lbl.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-                lbl.setStyleSheet("background: transparent; color: #E6E1E5; font-size: 14px;")
-                layout.addWidget(lbl)
-            
-            if i + 2 < len(parts):
-                lang = parts[i+1].strip()
-                code = parts[i+2].strip()
-                
-                # Canvas Container
-                canvas = QFrame()
-                canvas.setStyleSheet("background-color: #1E1E1E; border-radius: 8px; border: 1px solid #49454F;")
-                canvas_layout = QVBoxLayout(canvas)
-                canvas_layout.setContentsMargins(0, 0, 0, 0)
-                canvas_layout.setSpacing(0)
-                
-                # Header
-                header_widget = QWidget()
-                header_widget.setStyleSheet("background-color: #2D2D2D; border-top-left-radius: 8px; border-top-right-radius: 8px;")
-                header_layout = QHBoxLayout(header_widget)
-                header_layout.setContentsMargins(10, 5, 10, 5)
-                
-                lang_label = QLabel(f"Canvas ({lang})" if lang else "Canvas")
-                lang_label.setStyleSheet("color: #A0A0A0; font-weight: bold; font-size: 12px; border: none; background: transparent;")
-                header_layout.addWidget(lang_label)
-                
-                header_layout.addStretch()
-                
-                copy_btn = QPushButton("Copy Code")
-                copy_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-                copy_btn.setStyleSheet("QPushButton { color: #A0A0A0; border: none; font-weight: bold; font-size: 12px; background: transparent; } QPushButton:hover { color: #FFFFFF; }")
-                copy_btn.clicked.connect(lambda checked, c=code: QApplication.clipboard().setText(c))
-                header_layout.addWidget(copy_btn)
-                
-                canvas_layout.addWidget(header_widget)
-                
-                # Code Body
-                code_lbl = QLabel(code)
-                code_lbl.setTextFormat(Qt.TextFormat.PlainText)
-                code_lbl.setStyleSheet("color: #D4D4D4; font-family: 'Consolas', 'Monaco', monospace; padding: 10px; font-size: 13px; background: transparent;")
-                code_lbl.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-                code_lbl.setWordWrap(True)
-                canvas_layout.addWidget(code_lbl)
-                
-                layout.addWidget(canvas)
-                i += 3
-            else:
-                i += 1
-        
-        # Apply AI Bubble Style
-        bubble.setStyleSheet("""
-            QWidget { background-color: #332D41; color: #E6E1E5; border-radius: 20px; border-bottom-left-radius: 4px; }
-        """)
-        
-        bubble.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        bubble.customContextMenuRequested.connect(lambda pos: self.show_message_context_menu(pos, bubble))
-        
-        container = QHBoxLayout()
-        container.setContentsMargins(0, 0, 0, 0)
-        container.addWidget(bubble)
-        
-        tts_btn = QPushButton("🔊")
-        tts_btn.setFixedSize(30, 30)
-        tts_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        tts_btn.setStyleSheet("background: transparent; border: none; font-size: 16px; color: #E6E1E5;")
-        tts_btn.setToolTip("Read Aloud")
-        tts_btn.clicked.connect(lambda checked, t=text: self.speak_text(t))
-        container.addWidget(tts_btn)
-        
-        container.addStretch()
-        
-        self.chat_layout.addLayout(container)
-        QTimer.singleShot(10, lambda: self.chat_scroll.verticalScrollBar().setValue(
-            self.chat_scroll.verticalScrollBar().maximum()))
-        return bubble
-
-    def render_message(self, text, sender):
-        if sender == 'ai' and "```" in text:
-            return self.render_complex_message(text, sender)
-            
-        bubble = QLabel()
-        bubble.setTextFormat(Qt.TextFormat.MarkdownText)
-        bubble.setText(text)
-        bubble.setOpenExternalLinks(True)
-        bubble.setWordWrap(True)
-        if sender == 'user':
-            bubble.setMaximumWidth(350)
-        bubble.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
-        bubble.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
-        bubble.setProperty("sender", sender)
-        bubble.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        bubble.customContextMenuRequested.connect(lambda pos: self.show_message_context_menu(pos, bubble))
-
-        if sender == 'user':
-            # Material You Primary Container (Right side)
-            bubble.setStyleSheet("""
-                background-color: #4F378B; 
-                color: #FFFFFF; 
-                padding: 12px 16px; 
-                border-radius: 20px;
-                border-bottom-right-radius: 4px;
-                font-size: 14px;
-            """)
-        else:
-            # Material You Surface Variant (Left side)
-            bubble.setStyleSheet("""
-                background-color: #332D41; 
-                color: #E6E1E5; 
-                padding: 12px 16px; 
-                border-radius: 20px;
-                border-bottom-left-radius: 4px;
-                font-size: 14px;
-            """)
-
-        container = QHBoxLayout()
-        container.setContentsMargins(0, 0, 0, 0)
-        if sender == 'user':
-            container.addStretch()
-            container.addWidget(bubble)
-        else:
-            container.addWidget(bubble)
-            
-            tts_btn = QPushButton("🔊")
-            tts_btn.setFixedSize(30, 30)
-            tts_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-            tts_btn.setStyleSheet("background: transparent; border: none; font-size: 16px; color: #E6E1E5;")
-            tts_btn.setToolTip("Read Aloud")
-            tts_btn.clicked.connect(lambda checked, t=text: self.speak_text(t))
-            container.addWidget(tts_btn)
-            
-            container.addStretch()
-            
-        self.chat_layout.addLayout(container)
-        # Scroll to bottom after layout update to prevent rendering glitches
-        QTimer.singleShot(10, lambda: self.chat_scroll.verticalScrollBar().setValue(
-            self.chat_scroll.verticalScrollBar().maximum()))
-        return bubble
+        message = {"sender": sender, "text": text}
+        if prompt and prompt != text:
+            message["prompt"] = prompt # What the model sees (e.g. with file content)
+        if notice:
+            message["notice"] = True # UI-only, never sent as context
+        if attachments:
+            message["attachments"] = attachments # Images/files sent as native parts
+        position = None
+        if self.current_chat_id is not None:
+            position = self.append_message_to_chat(self.current_chat_id, message)
+        message_id = self.conversation.append(message, position)
+        return self.render_message(text, sender, message_id)
+
+    def render_message(self, text, sender, message_id=None):
+        # The chat view lays out and paints the row; the returned index keeps
+        # pointing at it while older pages are added above
+        self.chat_scroll_anchor = 0 # Follow new messages to the bottom
+        if message_id is not None and self.stream_bubble is not None and self.stream_bubble.isValid():
+            # A background answer finished while another one streams; keep the streaming row last
+            row = self.stream_bubble.row()
+            self.chat_model.insert_messages(row, [(text, sender, message_id)])
+            return QPersistentModelIndex(self.chat_model.index(row))
+        return self.chat_model.append_message(text, sender, message_id)
 
     def speak_text(self, text):
         if not self.tts_enabled:
@@ -593,133 +708,123 @@ class ARSGPTMainWindow(QMainWindow):
         self.current_volume = value
         self.speech_engine.setVolume(value)
 
-    def save_chat(self):
-        if self.current_chat_file:
-            try:
-                with open(self.current_chat_file, 'w', encoding='utf-8') as f:
-                    json.dump(self.chat_messages, f, indent=4)
-            except Exception as e:
-                print(f"Error saving chat: {e}")
-
-    def show_message_context_menu(self, pos, bubble):
+    def append_message_to_chat(self, chat_id, message):
+        # Returns the store position the message was saved at (None if it wasn't)
+        # Count tokens before saving, so the count is stored with the message
+        self.context_builder.message_tokens(message)
+        try:
+            position = self.history_store.append_message(chat_id, message)
+        except Exception as e:
+            print(f"Error saving chat: {e}")
+            return None
+        # The chat is now the most recently active one
+        self.refresh_history_row(chat_id)
+        return position
+
+    def show_message_context_menu(self, pos):
+        index = self.chat_view.indexAt(pos)
+        if not index.isValid():
+            return
+        row = index.row()
         menu = QMenu(self)
-        sender = bubble.property("sender")
+        # Actions act on the message id, which stays valid if pages load while the menu is open
+        message_id = self.chat_model.id_at(row)
+        sender = self.conversation.sender(message_id) # None for the streaming row
         
         # Actions
         if sender == 'user':
-            if self.is_last_user_message(bubble):
+            if self.conversation.is_last_user(message_id):
                 edit_action = menu.addAction("Edit")
-                edit_action.triggered.connect(lambda: self.edit_user_message(bubble))
+                edit_action.triggered.connect(lambda: self.edit_user_message(message_id))
         
         copy_action = menu.addAction("Copy")
-        
-        # Handle copy for both simple labels and complex widgets
-        text = bubble.property("original_text")
-        if text is None and hasattr(bubble, "text"):
-            text = bubble.text()
+        text = self.chat_model.text_at(row)
         copy_action.triggered.connect(lambda: QApplication.clipboard().setText(text or ""))
         
         if sender == 'ai':
-            if self.is_last_message(bubble):
+            if self.conversation.is_last(message_id):
                 regen_action = menu.addAction("Regenerate")
-                regen_action.triggered.connect(lambda: self.regenerate_response(bubble))
+                regen_action.triggered.connect(lambda: self.regenerate_response(message_id))
             think_action = menu.addAction("Show thinking process")
             think_action.triggered.connect(lambda: self.show_thinking_process())
             
-        menu.setStyleSheet("""
-            QMenu { background-color: #2B2930; color: #E6E1E5; border: 1px solid #49454F; }
-            QMenu::item { padding: 8px 20px; }
-            QMenu::item:selected { background-color: #4F378B; }
-        """)
-        menu.exec(bubble.mapToGlobal(pos))
-
-    def is_last_user_message(self, bubble):
-        index = self.get_bubble_layout_index(bubble)
-        if index == -1: return False
-        
-        # Check subsequent messages for any user messages
-        for i in range(index + 1, self.chat_layout.count()):
-            item = self.chat_layout.itemAt(i)
-            if item and item.layout():
-                for j in range(item.layout().count()):
-                    widget = item.layout().itemAt(j).widget()
-                    if isinstance(widget, QLabel) and widget.property("sender") == "user":
-                        return False
-        return True
-
-    def is_last_message(self, bubble):
-        return self.get_bubble_layout_index(bubble) == self.chat_layout.count() - 1
-
-    def get_bubble_layout_index(self, bubble):
-        for i in range(self.chat_layout.count()):
-            item = self.chat_layout.itemAt(i)
-            if item.layout():
-                for j in range(item.layout().count()):
-                    if item.layout().itemAt(j).widget() == bubble:
-                        return i
-        return -1
-
-    def edit_user_message(self, bubble):
-        self.prompt.setText(bubble.text())
+        menu.exec(self.chat_view.viewport().mapToGlobal(pos))
+
+    def edit_user_message(self, message_id):
+        message = self.conversation.message(message_id)
+        if message is None or self.is_generating:
+            return
+        self.prompt.setText(message["text"])
         self.prompt.setFocus()
-        self.remove_messages_from(bubble)
+        self.remove_messages_from(message_id)
 
-    def regenerate_response(self, ai_bubble):
-        ai_index = self.get_bubble_layout_index(ai_bubble)
-        if ai_index == -1: return
-        
-        user_text = None
-        # Find preceding user message
-        for i in range(ai_index - 1, -1, -1):
-            item = self.chat_layout.itemAt(i)
-            if item.layout():
-                for j in range(item.layout().count()):
-                    widget = item.layout().itemAt(j).widget()
-                    if isinstance(widget, QLabel) and widget.property("sender") == "user":
-                        user_text = widget.property("full_prompt")
-                        if not user_text:
-                            user_text = widget.text()
-                        break
-            if user_text: break
-            
-        if user_text:
-            self.remove_messages_from(ai_bubble)
-            self.is_generating = True
-            self.update_send_button_state()
-            self.get_ai_response(user_text)
+    def regenerate_response(self, message_id):
+        # Regenerate from the stored messages (attachments are referenced by blob hash),
+        # so it works the same after a reload
+        if self.is_generating or not self.conversation.has_user_before(message_id):
+            return
+        history = self.conversation.before(message_id)
+        self.remove_messages_from(message_id)
+        self.is_generating = True
+        self.update_send_button_state()
+        # Regenerate must produce a new answer, so skip the response cache
+        self.get_ai_response(history, use_cache=False)
 
     def show_thinking_process(self):
         QMessageBox.information(self, "Thinking Process", "Thinking process data is not available for this message.")
 
-    def remove_messages_from(self, bubble):
-        index = self.get_bubble_layout_index(bubble)
-        if index != -1:
-            # Remove this and all subsequent messages
-            while self.chat_layout.count() > index:
-                item = self.chat_layout.takeAt(index)
-                if item.layout():
-                    while item.layout().count():
-                        sub_item = item.layout().takeAt(0)
-                        if sub_item.widget():
-                            sub_item.widget().deleteLater()
-                    item.layout().deleteLater()
+    def remove_messages_from(self, message_id):
+        # Remove this and all subsequent messages, on screen and in the store
+        row = self.conversation.row(message_id)
+        if row is None:
+            return
+        self.chat_model.remove_from(row)
+        position = self.conversation.truncate(message_id)
+        if self.current_chat_id is not None and position is not None:
+            try:
+                self.history_store.truncate_messages(self.current_chat_id, position)
+            except Exception as e:
+                print(f"Error saving chat: {e}")
+                return
+            self.refresh_history_row(self.current_chat_id)
 
     def upload_file(self):
         fname, _ = QFileDialog.getOpenFileName(self, 'Open file', '', "All Files (*);;Images (*.png *.jpg *.jpeg *.gif *.webp);;Text files (*.txt *.md *.py *.json *.csv)")
         if fname:
-            try:
-                self.attachment_name = os.path.basename(fname)
-                try:
-                    with open(fname, 'r', encoding='utf-8') as f:
-                        self.attachment_content = f.read()
-                except UnicodeDecodeError:
-                    with open(fname, 'rb') as f:
-                        self.attachment_content = f"Base64 Encoded Media ({self.attachment_name}):\n{base64.b64encode(f.read()).decode('utf-8')}"
-                self.plus_btn.setStyleSheet("background-color: #4F378B; border-radius: 20px; color: white; font-size: 20px;")
-                self.prompt.setPlaceholderText(f"Ask about {self.attachment_name}...")
-                self.update_send_button_state()
-            except Exception as e:
-                self.add_message(f"Error reading file: {e}", 'ai')
+            # Read off the GUI thread; large files must not freeze the window
+            self.attachment = None
+            self.attachment_load_id += 1
+            self.attachment_read_started = time.time()
+            self.prompt.setPlaceholderText(f"Reading {os.path.basename(fname)}...")
+            self.update_send_button_state()
+            max_bytes = int(self.max_attachment_mb * 1024 * 1024)
+            threading.Thread(target=self.read_attachment, args=(self.attachment_load_id, fname, max_bytes),
+                             daemon=True).start()
+
+    def read_attachment(self, load_id, path, max_bytes):
+        # Worker thread: the signals are delivered to the GUI thread
+        try:
+            attachment = load_attachment(path, self.blob_store, max_binary_bytes=max_bytes)
+        except Exception as e:
+            self.attachment_failed.emit(load_id, str(e))
+            return
+        self.attachment_loaded.emit(load_id, attachment)
+
+    def on_attachment_loaded(self, load_id, attachment):
+        if load_id != self.attachment_load_id:
+            return
+        self.attachment_read_started = None
+        self.attachment = attachment
+        set_variant(self.plus_btn, "attached", True)
+        self.prompt.setPlaceholderText(f"Ask about {attachment.name}...")
+        self.update_send_button_state()
+
+    def on_attachment_failed(self, load_id, error):
+        if load_id != self.attachment_load_id:
+            return
+        self.attachment_read_started = None
+        self.prompt.setPlaceholderText("Ask ARS-GPT")
+        self.add_message(f"Error reading file: {error}", 'ai', notice=True)
 
     def on_toggle_generation(self):
         if self.is_generating:
@@ -733,41 +838,33 @@ class ARSGPTMainWindow(QMainWindow):
             
         text = self.prompt.text().strip()
         
-        if (not text and not self.attachment_content) or not self.current_api_key:
+        if (not text and not self.attachment) or not self.current_api_key:
             return
             
         display_text = text
         full_prompt = text
-
-        if self.attachment_content:
-            display_text = f"📎 {self.attachment_name}\n{text}" if text else f"📎 {self.attachment_name}"
-            full_prompt = f"Here is a file content ({self.attachment_name}):\n\n{self.attachment_content}\n\nUser: {text}"
+        attachments = None
+
+        if self.attachment:
+            name = self.attachment.name
+            display_text = f"📎 {name}\n{text}" if text else f"📎 {name}"
+            # The message only references the stored blob; its content is added when the
+            # request is built (inlined text, matching excerpts or an image/file part)
+            full_prompt = text or f"Here is a file ({name})."
+            attachments = [self.attachment.to_dict()]
             
             # Reset attachment
-            self.attachment_content = None
-            self.attachment_name = None
-            self.plus_btn.setStyleSheet("background-color: #2B2930; border-radius: 20px; color: #CAC4D0; font-size: 20px;")
+            self.attachment = None
+            set_variant(self.plus_btn, "attached", False)
             self.prompt.setPlaceholderText("Ask ARS-GPT")
 
-        # Handle New Chat (Title Generation)
-        if not self.current_chat_file:
-            self.pending_first_message = full_prompt
-            
-            # Show user message immediately
-            user_bubble = self.add_message(display_text, 'user')
-            user_bubble.setProperty("full_prompt", full_prompt)
-            if self.greeting.isVisible(): self.greeting.hide()
-            self.prompt.clear()
-            
-            self.is_generating = True
-            self.update_send_button_state()
-            
-            # Generate Title
-            self.generate_chat_title(text)
-            return
+        # Handle New Chat: save under a provisional title right away, so the
+        # answer and the title request can run at the same time
+        is_new_chat = self.current_chat_id is None
+        if is_new_chat:
+            self.current_chat_id = self.history_store.create_chat(DEFAULT_TITLE)
 
-        user_bubble = self.add_message(display_text, 'user')
-        user_bubble.setProperty("full_prompt", full_prompt)
+        self.add_message(display_text, 'user', prompt=full_prompt, attachments=attachments)
         if self.greeting.isVisible():
             self.greeting.hide()
         self.prompt.clear()
@@ -775,95 +872,212 @@ class ARSGPTMainWindow(QMainWindow):
         
         self.is_generating = True
         self.update_send_button_state()
-        self.get_ai_response(full_prompt)
+        self.get_ai_response(self.conversation.messages)
 
-    def generate_chat_title(self, first_message):
-        # Clean up previous temp_module if it exists
-        if self.temp_module and hasattr(self.temp_module, 'isRunning') and self.temp_module.isRunning():
-            self.temp_module.terminate()
-            self.temp_module.wait()
-            
-        # Use a temporary ChatModule to avoid polluting the main context
-        self.temp_module = ChatModule(self.current_api_key)
-        self.temp_module.ai_response.connect(self.handle_title_response)
-        self.temp_module.error_signal.connect(self.handle_title_error)
-        
+        if is_new_chat:
+            # Its sidebar row was added with the first message
+            self.generate_chat_title(text or display_text, self.current_chat_id)
+
+    def generate_chat_title(self, first_message, chat_id):
+        if self.local_titles:
+            self.rename_chat(chat_id, derive_local_title(first_message))
+            return
+
+        # Title requests are routed by id and never touch the chat itself
         prompt = f"Generate a very short, concise title (max 5 words) for a chat that starts with this message: '{first_message}'. Return ONLY the title, no quotes."
-        self.temp_module.send_message(self.current_model_type, prompt)
+        request_id = self.get_chat_module().send_message(self.current_model_type, prompt)
+        self.title_requests[request_id] = (chat_id, first_message)
 
-    def handle_title_response(self, title):
-        title = title.strip().replace('"', '').replace("'", "").replace("/", "-").replace("\\", "-").replace(":", "-")
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{title}.json"
-        self.current_chat_file = os.path.join(self.history_dir, filename)
-        
-        # Save the first message (which was already added to chat_messages)
-        self.save_chat()
-        
-        # Add to sidebar (insert at top)
-        self.history_list.clear() # Refresh list to ensure order or just insert
-        self.load_chat_history()
-        
-        # Proceed with actual response
-        if self.pending_first_message:
-            self.get_ai_response(self.pending_first_message)
-            self.pending_first_message = None
+    def handle_title_response(self, request_id, title):
+        chat_id, _ = self.title_requests.pop(request_id)
+        self.rename_chat(chat_id, sanitize_title(title or ""))
 
-    def handle_title_error(self, error):
+    def handle_title_error(self, request_id, error):
         # Fallback if title generation fails
-        self.handle_title_response("New Chat")
+        chat_id, first_message = self.title_requests.pop(request_id)
+        self.rename_chat(chat_id, derive_local_title(first_message))
+
+    def rename_chat(self, chat_id, title):
+        # Chats are referenced by id, so only the stored title changes
+        try:
+            self.history_store.rename_chat(chat_id, title)
+        except Exception as e:
+            print(f"Error renaming chat: {e}")
+            return
+        self.refresh_history_row(chat_id)
 
     def stop_generation(self):
         self.is_generating = False
         self.update_send_button_state()
-        self.add_message("Generation stopped.", 'ai')
+        # Abort the provider request so it stops generating billable tokens
+        if self.chat_module and self.active_request_id is not None:
+            self.chat_module.cancel(self.active_request_id)
+        # A response already queued for this request must not be saved as a second answer
+        self.request_chats.pop(self.active_request_id, None)
+        self.active_request_id = None
+        # Keep whatever was streamed so far
+        partial = self.stream_text
+        self.end_stream()
+        if partial:
+            self.add_message(partial, 'ai')
+        self.add_message("Generation stopped.", 'ai', notice=True)
+
+    def handle_ai_delta(self, request_id, delta):
+        if not self.is_generating or request_id != self.active_request_id:
+            return
+        if self.stream_bubble is None:
+            self.stream_bubble = self.render_message("", 'ai')
+            self.stream_timer.start()
+        self.stream_text += delta
+        self.stream_dirty = True
+
+    def flush_stream(self):
+        if not self.stream_dirty or self.stream_bubble is None:
+            return
+        self.stream_dirty = False
+        self.chat_model.set_text(self.stream_bubble.row(), self.stream_text)
+        self.chat_scroll_anchor = 0
+
+    def end_stream(self):
+        # Drop the temporary streaming bubble; the final text is rendered and saved once
+        self.stream_timer.stop()
+        if self.stream_bubble is not None and self.stream_bubble.isValid():
+            self.chat_model.remove_from(self.stream_bubble.row())
+        self.stream_bubble = None
+        self.stream_text = ""
+        self.stream_dirty = False
+
+    def handle_ai_response(self, request_id, text):
+        if request_id in self.title_requests:
+            self.handle_title_response(request_id, text)
+            return
 
-    def handle_ai_response(self, text):
-        if self.is_generating:
-            self.is_generating = False
-            self.update_send_button_state()
+        chat_id = self.request_chats.pop(request_id, None)
+        if request_id == self.active_request_id:
+            self.active_request_id = None
+            if self.is_generating:
+                self.is_generating = False
+                self.update_send_button_state()
+                self.end_stream()
+                self.add_message(text, 'ai')
+        elif chat_id is not None and chat_id == self.current_chat_id:
+            # The user left the chat while this answer was generating and came back
             self.add_message(text, 'ai')
+        elif chat_id is not None:
+            # The user switched chats while this answer was generating
+            self.append_message_to_chat(chat_id, {"sender": "ai", "text": text})
+
+    def handle_error(self, request_id, error_msg):
+        if request_id in self.title_requests:
+            self.handle_title_error(request_id, error_msg)
+            return
+
+        self.request_chats.pop(request_id, None)
+        if request_id != self.active_request_id:
+            print(f"Background request {request_id} failed: {error_msg}")
+            return
+
+        self.active_request_id = None
+        self.is_generating = False
+        self.update_send_button_state()
+        self.end_stream()
+        self.add_message(f"Error: {error_msg}", 'ai', notice=True)
+
+    def handle_cancelled(self, request_id):
+        self.request_chats.pop(request_id, None)
+        self.title_requests.pop(request_id, None)
 
-    def handle_error(self, error_msg):
+    def detach_active_request(self):
+        # Leave the running answer to finish in the background; it is saved to its own chat
+        self.active_request_id = None
         self.is_generating = False
+        self.end_stream()
         self.update_send_button_state()
-        self.add_message(f"Error: {error_msg}", 'ai')
 
-    def get_ai_response(self, prompt):
+    def get_ai_response(self, history, use_cache=True):
         if not self.current_api_key:
-            self.add_message("Please select an AI model and provide an API key first.", 'ai')
+            self.add_message("Please select an AI model and provide an API key first.", 'ai', notice=True)
             return
 
+        # Send as much of the conversation as fits the model's token budget
+        history = self.with_older_messages(history)
+        messages = self.context_builder.build(history, self.current_model_type, self.current_context_budget)
+        fallbacks = None
+        if self.hedging_enabled:
+            fallbacks = [t for t in self.model_targets if t.name != self.current_model_name]
+        self.active_request_id = self.get_chat_module().send_message(
+            self.current_model_type, messages, stream=True, chat_id=self.current_chat_id,
+            use_cache=use_cache, fallbacks=fallbacks)
+        self.request_chats[self.active_request_id] = self.current_chat_id
+
+    def with_older_messages(self, history):
+        # history starts at the loaded window; pages before it are read until the budget is covered
+        if self.current_chat_id is None:
+            return history
+        budget = self.current_context_budget or self.context_builder.budget_for(self.current_model_type)
+        used = self.count_saved_tokens(zip(self.conversation.positions, history))
+        start = self.conversation.offset
+        try:
+            while start > 0 and used < budget:
+                start, page = self.history_store.load_tail(self.current_chat_id, self.chat_page_messages, before=start)
+                used += self.count_saved_tokens(zip(range(start, start + len(page)), page))
+                history = page + history
+        except Exception as e:
+            print(f"Error loading chat: {e}")
+        return history
+
+    def count_saved_tokens(self, saved):
+        # Tokens of the open chat's (store position, message) pairs. Messages saved
+        # without a count (imported chats) are counted once and the count is stored
+        counts = {}
+        total = 0
+        for position, message in saved:
+            if position is not None and message.get("tokens") is None:
+                counts[position] = self.context_builder.message_tokens(message)
+            total += self.context_builder.message_tokens(message)
+        if counts:
+            try:
+                self.history_store.save_tokens(self.current_chat_id, counts)
+            except Exception as e:
+                print(f"Error saving chat: {e}")
+        return total
+
+    def get_chat_module(self):
         # Initialize or update ChatModule
         if self.chat_module is None:
-            self.chat_module = ChatModule(self.current_api_key)
+            self.chat_module = ChatModule(self.current_api_key, response_cache=self.response_cache, metrics=self.metrics)
+            self.chat_module.temperature = self.current_temperature
+            self.chat_module.base_url = self.current_base_url
+            self.chat_module.dispatcher.hedge_policy.max_delay = self.hedge_max_delay
+            self.apply_rate_limits()
             self.chat_module.ai_response.connect(self.handle_ai_response)
+            self.chat_module.ai_delta.connect(self.handle_ai_delta)
             self.chat_module.error_signal.connect(self.handle_error)
+            self.chat_module.cancelled.connect(self.handle_cancelled)
         else:
             self.chat_module.api_key = self.current_api_key
-
-        # Send message using the active model type
-        self.chat_module.send_message(self.current_model_type, prompt)
+        return self.chat_module
 
     def load_active_model(self):
-        # Calculate path to api/models.json
-        base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-        models_file = os.path.join(base_dir, 'api', 'models.json')
-        
-        if os.path.exists(models_file):
-            try:
-                with open(models_file, 'r') as f:
-                    data = json.load(f)
-                    for name, info in data.items():
-                        if info.get("state") == "active":
-                            self.current_api_key = info.get("key")
-                            # Determine model type based on name
-                            if "Google" in name: self.current_model_type = "gemini"
-                            elif "OpenAI" in name: self.current_model_type = "gpt-4o"
-                            elif "DeepSeek" in name: self.current_model_type = "deepseek-chat"
-                            break
-            except Exception as e:
-                print(f"Error loading active model: {e}")
+        previous_key = self.current_api_key
+        models = load_models()
+        name, info = active_model(models)
+        if info:
+            self.current_model_name = name
+            self.current_api_key = info.get("key")
+            self.current_base_url = info.get("base_url")
+            self.current_context_budget = info.get("context_tokens")
+            # Determine model type based on name
+            self.current_model_type = model_type_for(name, info) or self.current_model_type
+        # Every usable key, for hedging/failover
+        self.model_targets = model_targets(models)
+        if self.chat_module:
+            self.chat_module.base_url = self.current_base_url
+            self.apply_rate_limits()
+
+        # Drop pooled connections that belong to the key we switched away from
+        if self.chat_module and previous_key and previous_key != self.current_api_key:
+            self.chat_module.client_pool.invalidate(previous_key)
 
     # ===== MODELS WINDOW =====
     def open_models_window(self):
@@ -883,78 +1097,62 @@ class ARSGPTMainWindow(QMainWindow):
         if self.chat_module:
             self.chat_module.temperature = value
 
+    def apply_rate_limits(self):
+        # Keys with "rpm"/"tpm" in models.json override the provider defaults
+        for target in self.model_targets:
+            if target.limits:
+                self.chat_module.rate_limiter.configure(target)
+
+    def set_hedging_enabled(self, enabled):
+        self.hedging_enabled = enabled
+
+    def set_hedge_max_delay(self, seconds):
+        self.hedge_max_delay = seconds
+        if self.chat_module:
+            self.chat_module.dispatcher.hedge_policy.max_delay = seconds
+
+    def set_local_titles(self, enabled):
+        self.local_titles = enabled
+
+    def set_response_cache_enabled(self, enabled):
+        self.response_cache_enabled = enabled
+        if enabled and self.response_cache is None:
+            self.response_cache = ResponseCache(os.path.join(self.cache_dir, "responses"))
+        if self.chat_module:
+            self.chat_module.set_response_cache(self.response_cache if enabled else None)
+
+    def set_max_attachment_mb(self, value):
+        self.max_attachment_mb = value
+
+    def set_metrics_logging(self, enabled):
+        self.metrics_logging = enabled
+        self.metrics.set_sink(self.metrics_file if enabled else None)
+
     def set_theme(self, theme):
-        self.setProperty("theme", theme)
-        if theme == "light":
-            self.setStyleSheet("""
-                QMainWindow { background-color: #FFFFFF; }
-                QWidget { color: #1D1B20; font-family: 'Segoe UI', 'Segoe UI Emoji', 'Apple Color Emoji', 'Noto Color Emoji', sans-serif; font-size: 14px; }
-                QLineEdit { background-color: #F3F3F3; border: none; border-radius: 24px; padding: 12px 20px; color: #1D1B20; }
-                QScrollArea { border: none; background: transparent; }
-                QScrollBar:vertical { border: none; background: #FFFFFF; width: 8px; margin: 0; }
-                QScrollBar::handle:vertical { background: #E0E0E0; min-height: 20px; border-radius: 4px; }
-            """)
-            
-            self.menu_btn.setStyleSheet("background: transparent; font-size: 24px; color: #1D1B20;")
-            self.title.setStyleSheet("font-weight: bold; font-size: 18px; color: #1D1B20;")
-            self.settings_btn.setStyleSheet("background: transparent; font-size: 20px; color: #1D1B20;")
-            self.greeting.setStyleSheet("font-size: 24px; color: #1D1B20; margin-top: 40px;")
-            
-            self.plus_btn.setStyleSheet("background-color: #F3F3F3; border-radius: 20px; color: #1D1B20; font-size: 20px;")
-            self.mode_btn.setStyleSheet("background-color: #F3F3F3; border-radius: 20px; color: #1D1B20; font-size: 18px;")
-            self.model_btn.setStyleSheet("background-color: #F3F3F3; border-radius: 20px; padding: 0 15px; color: #1D1B20;")
-            
-            self.sidebar.setStyleSheet("background-color: #F3F3F3; border-right: 1px solid #E0E0E0;")
-            self.hist_label.setStyleSheet("font-size: 12px; margin-top: 20px; margin-bottom: 5px; padding-left: 10px; border: none; color: #1D1B20;")
-            self.history_list.setStyleSheet("""
-                QListWidget { border: none; background: transparent; }
-                QListWidget::item { padding: 12px; border-radius: 24px; color: #1D1B20; margin-bottom: 4px; }
-                QListWidget::item:hover { background-color: #E0E0E0; }
-                QListWidget::item:selected { background-color: #D0D0D0; }
-            """)
-            self.search_bar.setStyleSheet("""
-                background-color: #E0E0E0; color: #1D1B20; border: none; border-radius: 15px; padding: 8px 12px; margin-bottom: 5px;
-            """)
-        else:
-            self.setStyleSheet("""
-                QMainWindow { background-color: #141218; }
-                QWidget { color: #E6E1E5; font-family: 'Segoe UI', 'Segoe UI Emoji', 'Apple Color Emoji', 'Noto Color Emoji', sans-serif; font-size: 14px; }
-                QLineEdit { background-color: #2B2930; border: none; border-radius: 24px; padding: 12px 20px; color: #E6E1E5; }
-                QScrollArea { border: none; background: transparent; }
-                QScrollBar:vertical { border: none; background: #141218; width: 8px; margin: 0; }
-                QScrollBar::handle:vertical { background: #49454F; min-height: 20px; border-radius: 4px; }
-            """)
-            
-            self.menu_btn.setStyleSheet("background: transparent; font-size: 24px; color: #E6E1E5;")
-            self.title.setStyleSheet("font-weight: bold; font-size: 18px; color: #E6E1E5;")
-            self.settings_btn.setStyleSheet("background: transparent; font-size: 20px; color: #E6E1E5;")
-            self.greeting.setStyleSheet("font-size: 24px; color: #CAC4D0; margin-top: 40px;")
-            
-            self.plus_btn.setStyleSheet("background-color: #2B2930; border-radius: 20px; color: #CAC4D0; font-size: 20px;")
-            self.mode_btn.setStyleSheet("background-color: #2B2930; border-radius: 20px; color: #CAC4D0; font-size: 18px;")
-            self.model_btn.setStyleSheet("background-color: #2B2930; border-radius: 20px; padding: 0 15px; color: #E6E1E5;")
-            
-            self.sidebar.setStyleSheet("background-color: #1D1B20; border-right: 1px solid #333;")
-            self.hist_label.setStyleSheet("font-size: 12px; margin-top: 20px; margin-bottom: 5px; padding-left: 10px; border: none; color: #CAC4D0;")
-            self.history_list.setStyleSheet("""
-                QListWidget { border: none; background: transparent; }
-                QListWidget::item { padding: 12px; border-radius: 24px; color: #E6E1E5; margin-bottom: 4px; }
-                QListWidget::item:hover { background-color: #332D41; }
-                QListWidget::item:selected { background-color: #4A4458; }
-            """)
-            self.search_bar.setStyleSheet("""
-                background-color: #332D41; color: #E6E1E5; border: none; border-radius: 15px; padding: 8px 12px; margin-bottom: 5px;
-            """)
+        # The window's dialogs and menus follow it (see theme.py)
+        apply_theme(self, theme)
 
     def clear_all_history(self):
-        # This needs to be updated to handle the new file structure if needed, 
-        # but the existing implementation deletes all .json files in chat_history, which is still valid.
-        # We just need to reset the current chat state.
-        if os.path.exists(self.history_dir):
-            for f in os.listdir(self.history_dir):
-                if f.endswith('.json'):
-                    try:
-                        os.remove(os.path.join(self.history_dir, f))
-                    except: pass
-        self.history_list.clear()
+        # Deletes every chat except the archived ones
+        try:
+            self.history_store.clear()
+        except Exception as e:
+            print(f"Error clearing history: {e}")
+        self.show_history_rows([])
         self.start_new_chat()
+        # Drop attachment blobs that only the deleted chats used. The file picked
+        # for the next message isn't saved yet, and one still being read isn't known yet
+        keep = {self.attachment.blob} if self.attachment else set()
+        threading.Thread(target=self.collect_blobs, args=(keep, self.attachment_read_started),
+                         daemon=True).start()
+
+    def collect_blobs(self, keep=(), since=None):
+        # Chats that are not imported yet may still use any blob
+        if not self.history_store.is_imported():
+            return
+        try:
+            referenced = self.history_store.referenced_blobs() | set(keep)
+        except Exception as e:
+            print(f"Error reading attachments: {e}")
+            return # Never delete blobs a chat we couldn't read might use
+        self.blob_store.collect_garbage(referenced, since)
@@ -1,5 +1,6 @@
-from PyQt6.QtWidgets import QDialog, QVBoxLayout, QGroupBox, QRadioButton, QPushButton, QHBoxLayout, QSlider, QLabel, QCheckBox, QComboBox
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QGroupBox, QRadioButton, QPushButton, QHBoxLayout, QSlider, QLabel, QCheckBox, QComboBox, QTableWidget, QTableWidgetItem, QHeaderView
 from PyQt6.QtCore import Qt
+from assets.py.ui.theme import apply_theme
 
 class SettingsWindow(QDialog):
     def __init__(self, parent=None):
@@ -15,15 +16,12 @@ class SettingsWindow(QDialog):
         self.light_theme_radio = QRadioButton("Light")
         self.dark_theme_radio = QRadioButton("Dark")
         
-        # Get current theme from parent
-        current_theme = "dark"
+        # Get current theme from parent (the dialog follows the application stylesheet)
         if parent:
-            current_theme = parent.property("theme")
-            if current_theme == "dark":
+            if parent.property("theme") == "dark":
                 self.dark_theme_radio.setChecked(True)
             else:
                 self.light_theme_radio.setChecked(True)
-        self.apply_theme(current_theme)
 
         theme_layout.addWidget(self.light_theme_radio)
         theme_layout.addWidget(self.dark_theme_radio)
@@ -54,6 +52,65 @@ class SettingsWindow(QDialog):
         temp_layout.addWidget(self.temp_val_label)
         
         params_layout.addLayout(temp_layout)
+
+        self.local_titles_cb = QCheckBox("Generate chat titles locally (no API call)")
+        if parent and hasattr(parent, "local_titles"):
+            self.local_titles_cb.setChecked(parent.local_titles)
+        self.local_titles_cb.toggled.connect(self.on_local_titles_toggled)
+        params_layout.addWidget(self.local_titles_cb)
+
+        # Hedging / failover across the other configured keys
+        self.hedge_cb = QCheckBox("Fail over to other keys when slow or failing")
+        if parent and hasattr(parent, "hedging_enabled"):
+            self.hedge_cb.setChecked(parent.hedging_enabled)
+        self.hedge_cb.toggled.connect(self.on_hedge_toggled)
+        params_layout.addWidget(self.hedge_cb)
+
+        hedge_layout = QHBoxLayout()
+        hedge_label = QLabel("Max wait for first token:")
+        self.hedge_val_label = QLabel()
+        self.hedge_slider = QSlider(Qt.Orientation.Horizontal)
+        self.hedge_slider.setRange(1, 20) # 0.5s to 10s in 0.5s steps
+        current_delay = 4.0
+        if parent and hasattr(parent, "hedge_max_delay"):
+            current_delay = parent.hedge_max_delay
+        self.hedge_slider.setValue(int(current_delay * 2))
+        self.hedge_val_label.setText(f"{current_delay:.1f}s")
+        self.hedge_slider.valueChanged.connect(self.on_hedge_delay_changed)
+        hedge_layout.addWidget(hedge_label)
+        hedge_layout.addWidget(self.hedge_slider)
+        hedge_layout.addWidget(self.hedge_val_label)
+        params_layout.addLayout(hedge_layout)
+
+        # Largest image/binary attachment sent to the provider
+        attach_layout = QHBoxLayout()
+        attach_label = QLabel("Max attachment size:")
+        self.attach_val_label = QLabel()
+        self.attach_slider = QSlider(Qt.Orientation.Horizontal)
+        self.attach_slider.setRange(1, 50) # MB
+        current_mb = 20
+        if parent and hasattr(parent, "max_attachment_mb"):
+            current_mb = parent.max_attachment_mb
+        self.attach_slider.setValue(current_mb)
+        self.attach_val_label.setText(f"{current_mb} MB")
+        self.attach_slider.valueChanged.connect(self.on_attachment_size_changed)
+        attach_layout.addWidget(attach_label)
+        attach_layout.addWidget(self.attach_slider)
+        attach_layout.addWidget(self.attach_val_label)
+        params_layout.addLayout(attach_layout)
+
+        # Response cache (opt-in)
+        self.cache_cb = QCheckBox("Cache identical responses")
+        if parent and hasattr(parent, "response_cache_enabled"):
+            self.cache_cb.setChecked(parent.response_cache_enabled)
+        self.cache_cb.toggled.connect(self.on_cache_toggled)
+        params_layout.addWidget(self.cache_cb)
+
+        self.cache_stats_label = QLabel()
+        self.cache_stats_label.setObjectName("caption")
+        params_layout.addWidget(self.cache_stats_label)
+        self.update_cache_stats()
+
         params_group.setLayout(params_layout)
         layout.addWidget(params_group)
 
@@ -134,6 +191,32 @@ class SettingsWindow(QDialog):
         tts_group.setLayout(tts_layout)
         layout.addWidget(tts_group)
 
+        # Diagnostics: recent request timings per provider
+        diag_group = QGroupBox("Diagnostics")
+        diag_layout = QVBoxLayout()
+        self.metrics_table = QTableWidget(0, 6)
+        self.metrics_table.setHorizontalHeaderLabels(
+            ["Provider", "Requests", "Errors", "First token p50/p95", "Total p50/p95", "Tokens/s p50"])
+        self.metrics_table.verticalHeader().setVisible(False)
+        self.metrics_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.metrics_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.metrics_table.setMaximumHeight(120)
+        diag_layout.addWidget(self.metrics_table)
+
+        diag_buttons = QHBoxLayout()
+        self.metrics_log_cb = QCheckBox("Log requests to logs/request_metrics.jsonl")
+        if parent and hasattr(parent, "metrics_logging"):
+            self.metrics_log_cb.setChecked(parent.metrics_logging)
+        self.metrics_log_cb.toggled.connect(self.on_metrics_logging_toggled)
+        self.metrics_refresh_btn = QPushButton("Refresh")
+        self.metrics_refresh_btn.clicked.connect(self.update_metrics)
+        diag_buttons.addWidget(self.metrics_log_cb)
+        diag_buttons.addWidget(self.metrics_refresh_btn)
+        diag_layout.addLayout(diag_buttons)
+        diag_group.setLayout(diag_layout)
+        layout.addWidget(diag_group)
+        self.update_metrics()
+
         # Chat history settings
         history_group = QGroupBox("Chat History")
         history_layout = QVBoxLayout()
@@ -149,30 +232,6 @@ class SettingsWindow(QDialog):
 
         self.setLayout(layout)
 
-    def apply_theme(self, theme):
-        if theme == "light":
-            self.setStyleSheet("""
-                QDialog { background-color: #FFFFFF; color: #1D1B20; font-family: 'Segoe UI', sans-serif; }
-                QGroupBox { font-weight: bold; color: #1D1B20; border: 1px solid #E0E0E0; border-radius: 8px; margin-top: 12px; }
-                QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top left; padding: 0 5px; }
-                QRadioButton { color: #1D1B20; }
-                QPushButton { background-color: #6750A4; color: white; border-radius: 15px; padding: 8px; }
-                QLabel { color: #1D1B20; }
-                QCheckBox { color: #1D1B20; }
-                QComboBox { background-color: #F3F3F3; color: #1D1B20; border: 1px solid #E0E0E0; border-radius: 4px; padding: 5px; }
-            """)
-        else:
-            self.setStyleSheet("""
-                QDialog { background-color: #141218; color: #E6E1E5; font-family: 'Segoe UI', sans-serif; }
-                QGroupBox { font-weight: bold; color: #E6E1E5; border: 1px solid #49454F; border-radius: 8px; margin-top: 12px; }
-                QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top left; padding: 0 5px; }
-                QRadioButton { color: #E6E1E5; }
-                QPushButton { background-color: #4F378B; color: white; border-radius: 15px; padding: 8px; }
-                QLabel { color: #E6E1E5; }
-                QCheckBox { color: #E6E1E5; }
-                QComboBox { background-color: #2B2930; color: #E6E1E5; border: 1px solid #49454F; border-radius: 4px; padding: 5px; }
-            """)
-
     def on_theme_changed(self, checked):
         if checked:
             if self.sender() == self.light_theme_radio:
@@ -180,9 +239,10 @@ class SettingsWindow(QDialog):
             else:
                 theme = "dark"
             
-            self.apply_theme(theme)
             if self.parent():
                 self.parent().set_theme(theme)
+            else:
+                apply_theme(self, theme)
 
     def on_temp_changed(self, value):
         temp = value / 100.0
@@ -190,6 +250,64 @@ class SettingsWindow(QDialog):
         if self.parent():
             self.parent().set_temperature(temp)
     
+    def on_hedge_toggled(self, checked):
+        if self.parent():
+            self.parent().set_hedging_enabled(checked)
+
+    def on_hedge_delay_changed(self, value):
+        seconds = value / 2.0
+        self.hedge_val_label.setText(f"{seconds:.1f}s")
+        if self.parent():
+            self.parent().set_hedge_max_delay(seconds)
+
+    def on_attachment_size_changed(self, value):
+        self.attach_val_label.setText(f"{value} MB")
+        if self.parent():
+            self.parent().set_max_attachment_mb(value)
+
+    def on_local_titles_toggled(self, checked):
+        if self.parent():
+            self.parent().set_local_titles(checked)
+
+    def on_cache_toggled(self, checked):
+        if self.parent():
+            self.parent().set_response_cache_enabled(checked)
+        self.update_cache_stats()
+
+    def update_cache_stats(self):
+        cache = getattr(self.parent(), "response_cache", None)
+        if not cache:
+            self.cache_stats_label.setText("Cache: off")
+            return
+        stats = cache.stats()
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        self.cache_stats_label.setText(
+            f"Cache: {hits} hits ({stats['disk_hits']} from disk), {stats['misses']} misses, "
+            f"{stats['disk_bytes'] // 1024} KB on disk")
+
+    def on_metrics_logging_toggled(self, checked):
+        if self.parent():
+            self.parent().set_metrics_logging(checked)
+
+    def update_metrics(self):
+        metrics = getattr(self.parent(), "metrics", None)
+        summary = metrics.summary() if metrics else {}
+
+        def seconds(stats, field):
+            p50, p95 = stats[f"{field}_p50"], stats[f"{field}_p95"]
+            if p50 is None:
+                return "-"
+            return f"{p50:.2f}s / {p95:.2f}s"
+
+        self.metrics_table.setRowCount(len(summary))
+        for row, (provider, stats) in enumerate(summary.items()):
+            rate = stats["tokens_per_s_p50"]
+            values = [provider, str(stats["count"]), str(stats["errors"]),
+                      seconds(stats, "ttft"), seconds(stats, "total"),
+                      f"{rate:.0f}" if rate is not None else "-"]
+            for col, value in enumerate(values):
+                self.metrics_table.setItem(row, col, QTableWidgetItem(value))
+
     def on_tts_enable_toggled(self, checked):
         if self.parent():
             self.parent().set_tts_enabled(checked)
@@ -0,0 +1,177 @@
+from functools import lru_cache
+from string import Template
+from PyQt6.QtWidgets import QApplication, QWidget
+from PyQt6.QtGui import QFont
+
+# Set once as the application font: a font rule in the stylesheet would be
+# resolved again for every widget on each theme switch
+FONT_FAMILIES = ["Segoe UI", "Segoe UI Emoji", "Apple Color Emoji", "Noto Color Emoji", "sans-serif"]
+FONT_PIXEL_SIZE = 14
+
+# Material You color roles of each theme; the stylesheet only refers to these
+THEMES = {
+    "dark": {
+        "background": "#141218",
+        "surface_container_low": "#1D1B20",
+        "surface_container_high": "#2B2930",
+        "surface_container_highest": "#332D41",
+        "secondary_container": "#4A4458",
+        "on_surface": "#E6E1E5",
+        "on_surface_variant": "#CAC4D0",
+        "outline_variant": "#49454F",
+        "divider": "#333333",
+        "muted": "#888888",
+        "disabled": "#555555",
+        "scrollbar": "#49454F",
+        "primary": "#4F378B",
+        "primary_hover": "#6750A4",
+        "on_primary": "#FFFFFF",
+        "error": "#B3261E",
+        "on_error": "#FFFFFF",
+    },
+    "light": {
+        "background": "#FFFFFF",
+        "surface_container_low": "#F3F3F3",
+        "surface_container_high": "#F3F3F3",
+        "surface_container_highest": "#E0E0E0",
+        "secondary_container": "#D0D0D0",
+        "on_surface": "#1D1B20",
+        "on_surface_variant": "#49454F",
+        "outline_variant": "#E0E0E0",
+        "divider": "#E0E0E0",
+        "muted": "#777777",
+        "disabled": "#A0A0A0",
+        "scrollbar": "#E0E0E0",
+        "primary": "#6750A4",
+        "primary_hover": "#7F67BE",
+        "on_primary": "#FFFFFF",
+        "error": "#B3261E",
+        "on_error": "#FFFFFF",
+    },
+}
+
+# One copy per theme ($scope: that theme's windows). Widgets are picked by
+# object name, variants by dynamic property (see set_variant)
+_STYLESHEET = Template("""
+QMainWindow[theme="$name"], $scope QDialog { background-color: $background; }
+$scope QWidget { color: $on_surface; }
+$scope QLineEdit { background-color: $surface_container_high; border: none; border-radius: 24px; padding: 12px 20px; color: $on_surface; }
+$scope QScrollArea { border: none; background: transparent; }
+$scope QScrollBar:vertical { border: none; background: $background; width: 8px; margin: 0; }
+$scope QScrollBar::handle:vertical { background: $scrollbar; min-height: 20px; border-radius: 4px; }
+$scope QMenu { background-color: $surface_container_high; color: $on_surface; border: 1px solid $outline_variant; }
+$scope QMenu::item { padding: 8px 20px; }
+$scope QMenu::item:selected { background-color: $primary; color: $on_primary; }
+
+/* ===== SIDEBAR ===== */
+$scope QWidget#sidebar { background-color: $surface_container_low; border-right: 1px solid $divider; }
+$scope QPushButton#newChatButton {
+    background-color: $primary; color: $on_primary; border-radius: 16px;
+    padding: 15px; font-weight: bold; text-align: left; padding-left: 20px;
+}
+$scope QPushButton#newChatButton:hover { background-color: $primary_hover; }
+$scope QLabel#historyLabel { font-size: 12px; margin-top: 20px; margin-bottom: 5px; padding-left: 10px; border: none; color: $on_surface_variant; }
+$scope QLineEdit#searchBar { background-color: $surface_container_highest; color: $on_surface; border: none; border-radius: 15px; padding: 8px 12px; margin-bottom: 5px; }
+$scope QListWidget#historyList { border: none; background: transparent; }
+$scope QListWidget#historyList::item { padding: 12px; border-radius: 24px; color: $on_surface; margin-bottom: 4px; }
+$scope QListWidget#historyList::item:hover { background-color: $surface_container_highest; }
+$scope QListWidget#historyList::item:selected { background-color: $secondary_container; }
+$scope QLabel[role="rowTitle"] { background: transparent; border: none; font-weight: bold; }
+$scope QLabel[role="rowSnippet"] { background: transparent; border: none; color: $muted; font-size: 11px; }
+$scope QPushButton[variant="rowMenu"] { background: transparent; border: none; font-weight: bold; border-radius: 12px; }
+$scope QPushButton[variant="rowMenu"]:hover { background-color: rgba(128, 128, 128, 0.3); }
+
+/* ===== HEADER ===== */
+$scope QPushButton[variant="icon"] { background: transparent; font-size: 24px; color: $on_surface; }
+$scope QPushButton#settingsButton { font-size: 20px; }
+$scope QLabel#title { font-weight: bold; font-size: 18px; color: $on_surface; }
+$scope QLabel#greeting { font-size: 24px; color: $on_surface_variant; margin-top: 40px; }
+$scope QListView#chatView { border: none; background: transparent; }
+
+/* ===== INPUT BAR ===== */
+$scope QPushButton[variant="tonal"] { background-color: $surface_container_high; border-radius: 20px; color: $on_surface_variant; font-size: 20px; }
+$scope QPushButton#modeButton { font-size: 18px; }
+$scope QPushButton#modelButton { padding: 0 15px; color: $on_surface; font-size: 14px; }
+$scope QPushButton#attachButton[attached="true"] { background-color: $primary; color: $on_primary; }
+$scope QPushButton#sendButton { background-color: $primary; border-radius: 20px; color: $on_primary; font-size: 20px; padding-left: 3px; }
+$scope QPushButton#sendButton:disabled { background-color: $surface_container_high; color: $disabled; }
+$scope QPushButton#sendButton[generating="true"] { background-color: $error; color: $on_error; font-size: 16px; padding-left: 0px; }
+
+/* ===== DIALOGS ===== */
+$scope QDialog QPushButton { background-color: $primary; color: $on_primary; border-radius: 15px; padding: 8px; }
+$scope QGroupBox { font-weight: bold; color: $on_surface; border: 1px solid $outline_variant; border-radius: 8px; margin-top: 12px; }
+$scope QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top left; padding: 0 5px; }
+$scope QComboBox { background-color: $surface_container_high; color: $on_surface; border: 1px solid $outline_variant; border-radius: 4px; padding: 5px; }
+$scope QTableWidget { background-color: $surface_container_high; color: $on_surface; border: 1px solid $outline_variant; gridline-color: $outline_variant; }
+$scope QHeaderView::section { background-color: $background; color: $on_surface; border: none; padding: 4px; }
+$scope QLabel#caption { font-size: 12px; }
+
+$scope QDialog#addModelDialog QLabel { font-weight: bold; }
+$scope QDialog#addModelDialog QLabel#hint { color: $on_surface_variant; font-size: 12px; font-weight: normal; margin-bottom: 5px; }
+$scope QDialog#addModelDialog QComboBox, $scope QDialog#addModelDialog QLineEdit { border: none; padding: 12px; border-radius: 8px; }
+$scope QDialog#addModelDialog QComboBox::drop-down { border: none; }
+$scope QDialog#addModelDialog QPushButton { border-radius: 20px; padding: 10px 20px; font-weight: bold; }
+$scope QDialog#addModelDialog QPushButton:hover { background-color: $primary_hover; }
+
+$scope QLabel#dialogTitle { font-size: 22px; font-weight: bold; }
+$scope QLabel#emptyHint { color: $muted; margin-top: 50px; }
+$scope QWidget#modelList { background: transparent; }
+$scope QPushButton[variant="fab"] { border-radius: 20px; font-size: 24px; padding: 0 0 4px 0; }
+$scope QPushButton[variant="fab"]:hover { background-color: $primary_hover; }
+$scope QPushButton[variant="tonalWide"] { background-color: $surface_container_high; color: $on_surface; border-radius: 20px; padding: 12px; font-weight: bold; }
+$scope QPushButton[variant="tonalWide"]:hover { background-color: $outline_variant; }
+$scope QFrame#modelItem { background-color: $surface_container_high; border-radius: 16px; }
+$scope QFrame#modelItem QLabel { background: transparent; border: none; }
+$scope QLabel#modelName { font-size: 16px; font-weight: bold; }
+$scope QLabel#modelKey { font-size: 12px; color: $on_surface_variant; }
+$scope QFrame#modelItem QPushButton {
+    background-color: $surface_container_low; color: $on_surface; border: 1px solid $outline_variant;
+    border-radius: 18px; font-weight: bold; padding: 8px 16px;
+}
+$scope QFrame#modelItem QPushButton[active="true"] { background-color: $primary; color: $on_primary; border: none; }
+""")
+
+
+@lru_cache(maxsize=None)
+def stylesheet():
+    """
+    The application stylesheet: every theme's rules, built once from the
+    tokens and scoped to windows whose "theme" property names it.
+    """
+    return "\n".join(_STYLESHEET.substitute(tokens, name=name, scope=f'*[theme="{name}"]')
+                     for name, tokens in THEMES.items())
+
+def apply_theme(window, theme):
+    """
+    Switches a window (and its dialogs and menus) to a theme. The stylesheet
+    is installed once; after that a switch only re-polishes the window's
+    widgets, so no stylesheet is parsed again.
+    """
+    app = QApplication.instance()
+    window.setProperty("theme", theme if theme in THEMES else "dark")
+    if app.styleSheet() != stylesheet():
+        if app.font().families() != FONT_FAMILIES:
+            font = QFont(app.font())
+            font.setFamilies(FONT_FAMILIES)
+            font.setPixelSize(FONT_PIXEL_SIZE)
+            app.setFont(font)
+        app.setStyleSheet(stylesheet())
+        return
+    for widget in [window] + window.findChildren(QWidget):
+        repolish(widget)
+
+def repolish(widget):
+    style = widget.style()
+    style.unpolish(widget)
+    style.polish(widget)
+    widget.update()
+
+def set_variant(widget, name, value):
+    """
+    Switches a widget to another styled variant, e.g. the send button while
+    generating. Only the widget is re-polished; no stylesheet is parsed.
+    """
+    if widget.property(name) == value:
+        return
+    widget.setProperty(name, value)
+    repolish(widget)
@@ -5,6 +5,7 @@ from PyQt6.QtWidgets import (
     QPushButton, QHBoxLayout, QWidget, QScrollArea, QFrame
 )
 from PyQt6.QtCore import Qt
+from assets.py.ui.theme import set_variant
 
 # Calculate path to api/models.json relative to this file
 # assets/py/ui/ui_models.py -> ... -> api/models.json
@@ -16,21 +17,7 @@ class AddModelDialog(QDialog):
         super().__init__(parent)
         self.setWindowTitle("Add Model")
         self.resize(350, 280)
-        self.setStyleSheet("""
-            QDialog { background-color: #141218; color: #E6E1E5; font-family: 'Segoe UI', sans-serif; }
-            QLabel { color: #E6E1E5; font-size: 14px; font-weight: bold; }
-            QComboBox, QLineEdit { 
-                background-color: #2B2930; color: #E6E1E5; border: none; 
-                padding: 12px; border-radius: 8px; font-size: 14px;
-            }
-            QComboBox::drop-down { border: none; }
-            QPushButton {
-                background-color: #4F378B; color: white; border-radius: 20px; 
-                padding: 10px 20px; font-weight: bold; font-size: 14px;
-            }
-            QPushButton:hover { background-color: #6750A4; }
-            QLabel#hint { color: #CAC4D0; font-size: 12px; font-weight: normal; margin-bottom: 5px; }
-        """)
+        self.setObjectName("addModelDialog") # Styled by the application stylesheet
 
         layout = QVBoxLayout()
         layout.setSpacing(15)
@@ -80,18 +67,7 @@ class ModelItem(QFrame):
         super().__init__()
         self.parent_window = parent_window
         self.name = name
-        self.setStyleSheet("""
-            QFrame {
-                background-color: #2B2930;
-                border-radius: 16px;
-            }
-            QLabel { background: transparent; border: none; }
-            QPushButton {
-                border-radius: 18px;
-                font-weight: bold;
-                padding: 8px 16px;
-            }
-        """)
+        self.setObjectName("modelItem")
         
         layout = QHBoxLayout()
         layout.setContentsMargins(15, 15, 15, 15)
@@ -99,12 +75,12 @@ class ModelItem(QFrame):
         info_layout = QVBoxLayout()
         info_layout.setSpacing(4)
         name_lbl = QLabel(name)
-        name_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: #E6E1E5;")
+        name_lbl.setObjectName("modelName")
         
         # Mask key for display
         masked_key = f"{key[:6]}...{key[-4:]}" if len(key) > 10 else "******"
         key_lbl = QLabel(masked_key)
-        key_lbl.setStyleSheet("font-size: 12px; color: #CAC4D0;")
+        key_lbl.setObjectName("modelKey")
         
         info_layout.addWidget(name_lbl)
         info_layout.addWidget(key_lbl)
@@ -122,12 +98,8 @@ class ModelItem(QFrame):
         self.setLayout(layout)
 
     def update_state(self, is_active):
-        if is_active:
-            self.toggle_btn.setText("Active")
-            self.toggle_btn.setStyleSheet("background-color: #4F378B; color: #FFFFFF;")
-        else:
-            self.toggle_btn.setText("Enable")
-            self.toggle_btn.setStyleSheet("background-color: #1D1B20; color: #E6E1E5; border: 1px solid #49454F;")
+        self.toggle_btn.setText("Active" if is_active else "Enable")
+        set_variant(self.toggle_btn, "active", is_active)
 
     def on_toggle(self):
         self.parent_window.set_active(self.name)
@@ -137,7 +109,6 @@ class ModelsWindow(QDialog):
         super().__init__(parent)
         self.setWindowTitle("Models")
         self.resize(400, 500)
-        self.setStyleSheet("background-color: #141218;")
         
         self.models = {}
         self.load_models()
@@ -149,7 +120,7 @@ class ModelsWindow(QDialog):
         # Header
         header_layout = QHBoxLayout()
         title = QLabel("AI Models")
-        title.setStyleSheet("color: #E6E1E5; font-size: 22px; font-weight: bold;")
+        title.setObjectName("dialogTitle")
         header_layout.addWidget(title)
         header_layout.addStretch()
         
@@ -157,13 +128,7 @@ class ModelsWindow(QDialog):
         self.add_btn = QPushButton("+")
         self.add_btn.setFixedSize(40, 40)
         self.add_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.add_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #4F378B; color: white; 
-                border-radius: 20px; font-size: 24px; padding-bottom: 4px;
-            }
-            QPushButton:hover { background-color: #6750A4; }
-        """)
+        self.add_btn.setProperty("variant", "fab")
         self.add_btn.clicked.connect(self.open_add_dialog)
         header_layout.addWidget(self.add_btn)
         layout.addLayout(header_layout)
@@ -171,10 +136,9 @@ class ModelsWindow(QDialog):
         # List
         self.scroll = QScrollArea()
         self.scroll.setWidgetResizable(True)
-        self.scroll.setStyleSheet("border: none; background: transparent;")
         
         self.container = QWidget()
-        self.container.setStyleSheet("background: transparent;")
+        self.container.setObjectName("modelList")
         self.list_layout = QVBoxLayout()
         self.list_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
         self.list_layout.setSpacing(10)
@@ -186,13 +150,7 @@ class ModelsWindow(QDialog):
         # Close Button
         close_btn = QPushButton("Done")
         close_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        close_btn.setStyleSheet("""
-            QPushButton {
-                background-color: #2B2930; color: #E6E1E5; 
-                border-radius: 20px; padding: 12px; font-weight: bold;
-            }
-            QPushButton:hover { background-color: #49454F; }
-        """)
+        close_btn.setProperty("variant", "tonalWide")
         close_btn.clicked.connect(self.accept)
         layout.addWidget(close_btn)
 
@@ -228,7 +186,7 @@ class ModelsWindow(QDialog):
         if not self.models:
             empty_lbl = QLabel("No models found.\nClick + to add one.")
             empty_lbl.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            empty_lbl.setStyleSheet("color: #777; font-size: 14px; margin-top: 50px;")
+            empty_lbl.setObjectName("emptyHint")
             self.list_layout.addWidget(empty_lbl)
             return
 
@@ -244,6 +202,10 @@ class ModelsWindow(QDialog):
             else:
                 self.models[name]["state"] = "disabled"
         self.save_models()
+
+        # Let the main window pick up the new key and drop stale pooled clients
+        if self.parent() and hasattr(self.parent(), "load_active_model"):
+            self.parent().load_active_model()
         
         # Update UI in place instead of rebuilding (prevents QPainter errors)
         for i in range(self.list_layout.count()):
@@ -0,0 +1,44 @@
+"""
+Per-request latency with and without the client pool, against a
+local keep-alive stub provider.
+
+    python -m benchmarks.bench_client_pool [requests]
+
+On loopback there is no TLS handshake, so the latency difference is the
+floor; the connection count shows what a real provider would pay for.
+"""
+import sys
+import time
+from assets.py.chat.client_pool_module import ClientPool
+from assets.py.chat.metrics_module import percentile
+from tests.stub_server import StubProvider
+
+
+def ask(client):
+    client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "hello"}])
+
+
+def run(requests, pooled):
+    with StubProvider() as stub:
+        pool = ClientPool()
+        times = []
+        for _ in range(requests):
+            if not pooled:
+                pool.close() # What every message used to pay: a fresh client
+            start = time.perf_counter()
+            ask(pool.get("openai", "key", stub.url))
+            times.append(time.perf_counter() - start)
+        pool.close()
+        return times, stub.connections
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for pooled in (False, True):
+        times, connections = run(requests, pooled)
+        print(f"{'pooled' if pooled else 'fresh client':>12}: {requests} requests, {connections} connections, "
+              f"median {percentile(times, 0.5) * 1000:.2f} ms, p95 {percentile(times, 0.95) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
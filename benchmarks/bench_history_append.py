@@ -0,0 +1,59 @@
+"""
+Cost of saving one message as a chat grows, compared with
+rewriting the whole chat as indented JSON the way save_chat used to.
+
+    python -m benchmarks.bench_history_append [sizes...]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from assets.py.chat.chat_history_module import HistoryStore
+from assets.py.chat.metrics_module import percentile
+from benchmarks.common import sample_messages, ms
+
+SAMPLES = 50
+
+
+def rewrite_cost(path, messages):
+    # The old save_chat: the whole chat, every message
+    times = []
+    for _ in range(SAMPLES):
+        start = time.perf_counter()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(messages, f, indent=4)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 2000, 5000]
+    tmp = tempfile.mkdtemp()
+    try:
+        store = HistoryStore(os.path.join(tmp, "history.db"))
+        chat_id = store.create_chat("benchmark")
+        messages = sample_messages(max(sizes) + SAMPLES)
+        saved = 0
+        print(f"{'messages':>9} {'append median':>14} {'append p95':>11} {'rewrite median':>15}")
+        for size in sorted(sizes):
+            while saved < size:
+                store.append_message(chat_id, messages[saved])
+                saved += 1
+            times = []
+            for _ in range(SAMPLES):
+                start = time.perf_counter()
+                position = store.append_message(chat_id, messages[saved])
+                times.append(time.perf_counter() - start)
+                store.truncate_messages(chat_id, position) # Stay at this size
+            rewrite = rewrite_cost(os.path.join(tmp, "chat.json"), messages[:size])
+            print(f"{size:>9} {ms(percentile(times, 0.5)):>14} {ms(percentile(times, 0.95)):>11} "
+                  f"{ms(percentile(rewrite, 0.5)):>15}")
+        store.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
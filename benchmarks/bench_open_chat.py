@@ -0,0 +1,67 @@
+"""
+Time to first paint when opening a chat, against chat length,
+and the cost of loading an older page on scroll-up.
+
+    python -m benchmarks.bench_open_chat [sizes...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QListWidgetItem
+from assets.py.chat.metrics_module import percentile
+from benchmarks.common import main_window, pump, sample_messages, ms
+
+PAGES = 5
+
+
+def open_chat(app, window, store, size):
+    # Saves a chat of size messages and opens it from the sidebar; returns the time to first paint
+    chat_id = store.create_chat(f"{size} messages")
+    for message in sample_messages(size):
+        store.append_message(chat_id, message)
+    item = QListWidgetItem()
+    item.setData(Qt.ItemDataRole.UserRole, chat_id)
+    window.start_new_chat()
+    pump(100)
+
+    start = time.perf_counter()
+    window.on_history_item_clicked(item)
+    app.processEvents()
+    window.chat_view.viewport().repaint()
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000, 20000]
+    tmp = tempfile.mkdtemp()
+    try:
+        app, window = main_window(os.path.join(tmp, "history.db"))
+        store = window.history_store
+        open_chat(app, window, store, 10) # Warm-up: fonts, first layouts
+        print(f"{'messages':>9} {'first paint':>12} {'rows':>5} {'older page median':>18}")
+        for size in sizes:
+            first_paint = open_chat(app, window, store, size)
+            rows = window.chat_model.rowCount()
+            pump(200)
+
+            pages = []
+            for _ in range(PAGES):
+                if window.conversation.offset == 0:
+                    break
+                start = time.perf_counter()
+                window.load_older_messages()
+                app.processEvents()
+                window.chat_view.viewport().repaint()
+                pages.append(time.perf_counter() - start)
+            page = ms(percentile(pages, 0.5)) if pages else "-"
+            print(f"{size:>9} {ms(first_paint):>12} {rows:>5} {page:>18}")
+        window.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Theme switch time with 1,000 rendered messages, with the
+number of stylesheets set while switching (none are parsed after startup).
+
+    python -m benchmarks.bench_theme_switch [sidebar rows...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest import mock
+from PyQt6.QtWidgets import QApplication, QWidget
+from assets.py.chat.metrics_module import percentile
+from benchmarks.common import main_window, pump, sample_messages, ms
+
+MESSAGES = 1000
+SWITCHES = 10
+
+
+def main():
+    row_counts = [int(n) for n in sys.argv[1:]] or [60, 300]
+    tmp = tempfile.mkdtemp()
+    try:
+        app, window = main_window(os.path.join(tmp, "history.db"))
+        window.resize(900, 800)
+        window.sidebar.show()
+        window.greeting.hide()
+        messages = sample_messages(MESSAGES)
+        ids = window.conversation.prepend(0, messages)
+        window.chat_model.insert_messages(0, [(m["text"], m["sender"], message_id)
+                                              for m, message_id in zip(messages, ids)])
+        window.chat_view.scrollToBottom()
+        pump(300)
+
+        rows = 0
+        print(f"{'sidebar rows':>13} {'switch median':>14} {'switch max':>11} {'stylesheets set':>16}")
+        for count in row_counts:
+            while rows < count:
+                window.add_history_item({"chat_id": 10 ** 6 + rows, "title": f"Chat {rows}",
+                                         "snippet": None, "snippets": []})
+                rows += 1
+            pump(100)
+
+            calls = []
+            times = []
+            with mock.patch.object(QWidget, "setStyleSheet", lambda self, sheet: calls.append(sheet)), \
+                 mock.patch.object(QApplication, "setStyleSheet", lambda self, sheet: calls.append(sheet)):
+                for i in range(SWITCHES):
+                    start = time.perf_counter()
+                    window.set_theme("light" if i % 2 == 0 else "dark")
+                    app.processEvents()
+                    times.append(time.perf_counter() - start)
+            print(f"{count:>13} {ms(percentile(times, 0.5)):>14} {ms(max(times)):>11} {len(calls):>16}")
+
+        start = time.perf_counter()
+        for i in range(200):
+            window.is_generating = i % 2 == 0
+            window.update_send_button_state()
+        app.processEvents()
+        window.is_generating = False
+        print(f"send button state x200: {ms(time.perf_counter() - start)}")
+        window.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
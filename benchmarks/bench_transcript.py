@@ -0,0 +1,60 @@
+"""
+Memory and frame times of the chat transcript against its length.
+"Frame" is one viewport repaint after scrolling 40 px.
+
+    python -m benchmarks.bench_transcript [sizes...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from assets.py.chat.metrics_module import percentile
+from benchmarks.common import main_window, pump, sample_messages, rss_mb, ms
+
+FRAMES = 60
+
+
+def main():
+    sizes = [int(n) for n in sys.argv[1:]] or [200, 1000, 5000, 20000]
+    tmp = tempfile.mkdtemp()
+    try:
+        app, window = main_window(os.path.join(tmp, "history.db"))
+        window.greeting.hide()
+        view = window.chat_view
+        bar = view.verticalScrollBar()
+        print(f"{'messages':>9} {'load':>10} {'RSS':>9} {'frame median':>13} {'frame p95':>10}")
+        for size in sizes:
+            window.start_new_chat()
+            window.greeting.hide()
+            pump(100)
+            messages = sample_messages(size)
+            before = rss_mb()
+            start = time.perf_counter()
+            # As when a chat is loaded: every message is a model row
+            ids = window.conversation.prepend(0, messages)
+            window.chat_model.insert_messages(0, [(m["text"], m["sender"], message_id)
+                                                  for m, message_id in zip(messages, ids)])
+            app.processEvents()
+            view.viewport().repaint()
+            load = time.perf_counter() - start
+            pump(50)
+            grown = rss_mb() - before
+
+            frames = []
+            bar.setValue(bar.maximum() // 2)
+            view.viewport().repaint()
+            for _ in range(FRAMES):
+                bar.setValue(bar.value() + 40)
+                start = time.perf_counter()
+                view.viewport().repaint()
+                frames.append(time.perf_counter() - start)
+            print(f"{size:>9} {load:>9.2f}s {grown:>+7.1f}MB {ms(percentile(frames, 0.5)):>13} "
+                  f"{ms(percentile(frames, 0.95)):>10}")
+        window.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os
+import sys
+from unittest import mock
+from assets.py.chat.chat_history_module import HistoryStore
+
+
+def sample_messages(count):
+    """count alternating user/AI messages with markdown and some code blocks."""
+    messages = []
+    for i in range(count):
+        if i % 2 == 0:
+            messages.append({"sender": "user", "text": f"question {i} about **things**"})
+        elif i % 10 == 3:
+            messages.append({"sender": "ai", "text": f"answer {i}\n```python\nprint({i})\n```\nmore"})
+        else:
+            messages.append({"sender": "ai", "text": f"answer {i} with some *markdown* and a longer line "
+                                                     "of text to wrap around the bubble"})
+    return messages
+
+
+def rss_mb():
+    # Resident memory of this process (Linux)
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def ms(seconds):
+    return f"{seconds * 1000:.2f} ms"
+
+
+def main_window(db_path):
+    """
+    The main window on a history store at db_path instead of the user's, offscreen
+    unless QT_QPA_PLATFORM is set. Returns (app, window), the window shown at 700x800.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    app = QApplication.instance() or QApplication(sys.argv)
+    from assets.py.ui import main
+    store = HistoryStore(db_path)
+    with mock.patch.object(main, "HistoryStore", lambda path: store):
+        window = main.ARSGPTMainWindow()
+    window.resize(700, 800)
+    window.show()
+    pump(300)
+    return app, window
+
+
+def pump(milliseconds):
+    # Runs the event loop for a while (layouts, timers, queued signals)
+    from PyQt6.QtCore import QEventLoop, QTimer
+    loop = QEventLoop()
+    QTimer.singleShot(milliseconds, loop.quit)
+    loop.exec()
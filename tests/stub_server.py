@@ -0,0 +1,121 @@
+import json
+import select
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class StubProvider:
+    """
+    An OpenAI-compatible chat completions endpoint on localhost, for tests
+    and benchmarks. It can hold back the response headers or pace the
+    streamed chunks, and notes when a client disconnects mid-request
+    (the provider would stop generating).
+    """
+
+    def __init__(self, header_delay=0.0, chunk_delay=0.0, chunks=20, status=200, headers=None, answer="hello"):
+        self.header_delay = header_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.status = status
+        self.headers = headers or {}
+        self.answer = answer
+        self.requests = []
+        self.connections = 0
+        self.disconnected = threading.Event()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _client_gone(conn, timeout):
+    # Waits up to timeout; True if the client closed the connection meanwhile
+    readable, _, _ = select.select([conn], [], [], timeout)
+    if not readable:
+        return False
+    try:
+        return conn.recv(1, socket.MSG_PEEK) == b""
+    except OSError:
+        return True
+
+
+def _handler_for(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            stub.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            stub.requests.append(body)
+
+            deadline = time.monotonic() + stub.header_delay
+            while time.monotonic() < deadline:
+                if _client_gone(self.connection, min(0.05, deadline - time.monotonic())):
+                    stub.disconnected.set()
+                    self.close_connection = True
+                    return
+
+            if stub.status != 200:
+                self._send_json(stub.status, {"error": {"message": "stub error"}})
+            elif body.get("stream"):
+                self._stream()
+            else:
+                self._send_json(200, {
+                    "id": "stub", "object": "chat.completion", "created": 0, "model": body.get("model", ""),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": stub.answer},
+                                 "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4}})
+
+        def _send_json(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            for name, value in stub.headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for i in range(stub.chunks):
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": 0, "model": "stub",
+                             "choices": [{"index": 0, "delta": {"content": f"tok{i} "}, "finish_reason": None}]}
+                    self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                    if stub.chunk_delay and _client_gone(self.connection, stub.chunk_delay):
+                        raise ConnectionResetError
+                self._write_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                stub.disconnected.set()
+                self.close_connection = True
+
+        def _write_chunk(self, data):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    return Handler
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+from assets.py.chat.attachment_module import openai_content, gemini_parts
+
+
+class ProviderPartsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def attachment(self, name, mime, kind="file"):
+        path = os.path.join(self.dir, name)
+        with open(path, 'wb') as f:
+            f.write(b"\x00\x01binary")
+        return {"type": "attachment", "name": name, "path": path, "mime": mime, "kind": kind}
+
+    def content(self, *attachments):
+        return list(attachments) + [{"type": "text", "text": "what is this?"}]
+
+    def test_openai_parts(self):
+        parts = openai_content(self.content(
+            self.attachment("a.pdf", "application/pdf"),
+            self.attachment("a.png", "image/png", "image"),
+            self.attachment("a.zip", "application/zip"),
+            self.attachment("a.bmp", "image/bmp", "image")))
+        self.assertEqual([p["type"] for p in parts], ["file", "image_url", "text", "text", "text"])
+        self.assertTrue(parts[0]["file"]["file_data"].startswith("data:application/pdf;base64,"))
+        self.assertIn("a.zip", parts[2]["text"])
+        self.assertIn("can't be read", parts[3]["text"])
+
+    def test_gemini_parts(self):
+        parts = gemini_parts(self.content(
+            self.attachment("a.pdf", "application/pdf"),
+            self.attachment("a.mp3", "audio/mpeg"),
+            self.attachment("a.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+            self.attachment("a.gif", "image/gif", "image")))
+        self.assertEqual([p["inline_data"]["mime_type"] for p in parts[:2]], ["application/pdf", "audio/mpeg"])
+        self.assertIn("a.docx", parts[2]["text"])
+        self.assertIn("a.gif", parts[3]["text"])
+        self.assertEqual(parts[4], {"text": "what is this?"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from assets.py.chat import batch_module
+from assets.py.chat.batch_module import BatchRunner
+from tests.stub_server import StubProvider
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.out_path = os.path.join(self.dir, "out.jsonl")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write_input(self, lines):
+        path = os.path.join(self.dir, "in.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("".join(line + "\n" for line in lines))
+        return path
+
+    def run_main(self, models, input_path):
+        output = io.StringIO()
+        with mock.patch.object(batch_module, "load_models", return_value=models), redirect_stdout(output):
+            code = batch_module.main([input_path, self.out_path])
+        return code, output.getvalue()
+
+    def test_runs_jobs_and_resumes(self):
+        lines = [json.dumps({"id": i, "prompt": f"q{i}"}) for i in range(5)]
+        with StubProvider() as stub:
+            models = {"Stub": {"key": "k", "state": "active", "model": "gpt-4o", "base_url": stub.url}}
+            self.assertEqual(self.run_main(models, self.write_input(lines[:3]))[0], 0)
+            self.assertEqual(len(stub.requests), 3)
+
+            # The whole input again: only the jobs without a response are sent
+            code, output = self.run_main(models, self.write_input(lines))
+            self.assertEqual(code, 0)
+            self.assertIn("Resuming: 3 of 5 already done", output)
+            self.assertEqual(len(stub.requests), 5)
+            self.assertEqual(sorted(r["messages"][0]["content"] for r in stub.requests[3:]), ["q3", "q4"])
+
+        with open(self.out_path, encoding="utf-8") as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        self.assertEqual(sorted(r["id"] for r in results), [0, 1, 2, 3, 4])
+        self.assertTrue(all(r["response"] == "hello" for r in results))
+
+    def test_skips_lines_that_are_not_jobs(self):
+        path = self.write_input(['{"id": "a", "prompt": "hi"}', "[1, 2]", "42", "not json", '"just a prompt"'])
+        output = io.StringIO()
+        with redirect_stdout(output):
+            jobs = batch_module.read_jobs(path)
+        self.assertEqual(jobs, [{"id": "a", "prompt": "hi"}, {"prompt": "just a prompt", "id": 5}])
+        self.assertEqual(output.getvalue().count("Error reading"), 3)
+
+    def test_key_rate_limits_apply(self):
+        # rpm 2: a minute's worth is two requests, the third waits ~30 s
+        with StubProvider() as stub:
+            runner = BatchRunner("key", "gpt-4o", stub.url, concurrency=4, limits={"rpm": 2})
+            jobs = [{"id": i, "prompt": "q"} for i in range(3)]
+            thread = threading.Thread(target=runner.run, args=(jobs, self.out_path))
+            thread.start()
+            time.sleep(1.0)
+            self.assertEqual(len(stub.requests), 2)
+            runner.dispatcher.shutdown()
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+    def test_unknown_model_is_an_error(self):
+        models = {"Mystery key": {"key": "k", "state": "active"}}
+        code, output = self.run_main(models, self.write_input(['{"prompt": "hi"}']))
+        self.assertEqual(code, 1)
+        self.assertIn("Mystery key", output)
+        self.assertFalse(os.path.exists(self.out_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
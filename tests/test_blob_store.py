@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from assets.py.chat.blob_store_module import BlobStore
+
+
+class BlobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = BlobStore(os.path.join(self.dir, "blobs"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def put(self, name, content):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return self.store.put_file(path)
+
+    def age(self, sha256, seconds=60):
+        # As if stored a while ago
+        past = time.time() - seconds
+        os.utime(self.store.path_for(sha256), (past, past))
+
+    def test_collects_unreferenced_blobs(self):
+        kept = self.put("a.txt", "kept")
+        dropped = self.put("b.txt", "dropped")
+        self.assertEqual(self.store.collect_garbage({kept}), 1)
+        self.assertTrue(self.store.has(kept))
+        self.assertFalse(self.store.has(dropped))
+
+    def test_keeps_blobs_stored_since(self):
+        old = self.put("a.txt", "old")
+        self.age(old)
+        since = time.time()
+        new = self.put("b.txt", "new")
+        self.store.collect_garbage(set(), since)
+        self.assertFalse(self.store.has(old))
+        self.assertTrue(self.store.has(new))
+
+    def test_storing_again_counts_as_new(self):
+        sha256 = self.put("a.txt", "content")
+        for store_again in (lambda: self.store.put_file(os.path.join(self.dir, "a.txt")), # Known this session
+                            lambda: self.put("copy.txt", "content")): # Same content, another file
+            self.age(sha256)
+            since = time.time()
+            self.assertEqual(store_again(), sha256)
+            self.store.collect_garbage(set(), since)
+            self.assertTrue(self.store.has(sha256))
+
+    def test_stores_again_after_collection(self):
+        sha256 = self.put("a.txt", "content")
+        self.store.collect_garbage(set())
+        self.assertEqual(self.put("a.txt", "content"), sha256)
+        self.assertTrue(self.store.has(sha256))
+
+
+if __name__ == "__main__":
+    unittest.main()
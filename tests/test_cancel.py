@@ -0,0 +1,69 @@
+import threading
+import time
+import unittest
+from assets.py.chat.dispatcher_module import ChatDispatcher
+from tests.stub_server import StubProvider
+
+# How soon a cancel must take effect against a provider that is slow to answer
+CANCEL_BOUND = 1.0
+
+
+class CancelBeforeHeadersTest(unittest.TestCase):
+    """The provider holds back its response headers; cancelling must not wait for them."""
+
+    def setUp(self):
+        self.stub = StubProvider(header_delay=5.0).__enter__()
+        self.dispatcher = ChatDispatcher()
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+        self.dispatcher.client_pool.close()
+        self.stub.__exit__()
+
+    def submit_and_cancel(self, stream):
+        cancelled = threading.Event()
+        done = []
+        request_id = self.dispatcher.submit(
+            "key", "gpt-4o", "hello", stream=stream, base_url=self.stub.url,
+            on_done=lambda *args: done.append(args), on_cancel=lambda *args: cancelled.set())
+        time.sleep(0.3) # Sent, waiting for the headers
+        self.assertEqual(len(self.stub.requests), 1)
+
+        start = time.monotonic()
+        self.assertTrue(self.dispatcher.cancel(request_id))
+        self.assertTrue(cancelled.wait(CANCEL_BOUND), "on_cancel not sent in time")
+        self.assertLess(time.monotonic() - start, CANCEL_BOUND)
+        # The provider saw the disconnect and can stop generating
+        self.assertTrue(self.stub.disconnected.wait(CANCEL_BOUND))
+        self.assertEqual(done, [])
+
+    def test_cancel_non_streamed(self):
+        self.submit_and_cancel(stream=False)
+
+    def test_cancel_streamed(self):
+        self.submit_and_cancel(stream=True)
+
+    def test_shutdown_is_bounded(self):
+        for _ in range(3):
+            self.dispatcher.submit("key", "gpt-4o", "hello", stream=True, base_url=self.stub.url)
+        time.sleep(0.3)
+        start = time.monotonic()
+        self.dispatcher.shutdown()
+        self.assertLess(time.monotonic() - start, CANCEL_BOUND)
+        self.assertTrue(all(not worker.is_alive() for worker in self.dispatcher._workers))
+
+    def test_worker_serves_next_request_after_abort(self):
+        # An abort must not leak into the next request run on the same worker
+        self.submit_and_cancel(stream=False)
+        self.stub.header_delay = 0.0
+        answer = []
+        finished = threading.Event()
+        self.dispatcher.submit("key", "gpt-4o", "hello", base_url=self.stub.url,
+                               on_done=lambda _, text: (answer.append(text), finished.set()),
+                               on_error=lambda _, error: (answer.append(error), finished.set()))
+        self.assertTrue(finished.wait(5))
+        self.assertEqual(answer, ["hello"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from assets.py.chat.client_pool_module import ClientPool
+from tests.stub_server import StubProvider
+
+
+def ask(client):
+    response = client.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "hello"}])
+    return response.choices[0].message.content
+
+
+class ClientPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.stub = StubProvider().__enter__()
+        self.pool = ClientPool()
+
+    def tearDown(self):
+        self.pool.close()
+        self.stub.__exit__()
+
+    def test_requests_reuse_one_connection(self):
+        client = self.pool.get("openai", "key", self.stub.url)
+        for _ in range(10):
+            self.assertIs(self.pool.get("openai", "key", self.stub.url), client)
+            self.assertEqual(ask(client), "hello")
+        self.assertEqual(self.stub.connections, 1)
+
+    def test_one_client_per_key(self):
+        first = self.pool.get("openai", "key-1", self.stub.url)
+        second = self.pool.get("openai", "key-2", self.stub.url)
+        self.assertIsNot(first, second)
+        ask(first)
+        ask(second)
+        self.assertEqual(self.stub.connections, 2)
+
+    def test_invalidate_drops_only_that_key(self):
+        kept = self.pool.get("openai", "kept", self.stub.url)
+        old = self.pool.get("openai", "old", self.stub.url)
+        self.pool.invalidate("old")
+        self.assertIs(self.pool.get("openai", "kept", self.stub.url), kept)
+        new = self.pool.get("openai", "old", self.stub.url)
+        self.assertIsNot(new, old)
+        self.assertEqual(ask(new), "hello")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import threading
+import time
+import unittest
+from assets.py.chat.dispatcher_module import ChatDispatcher, ChatTarget
+from assets.py.chat.hedging_module import HedgePolicy, LatencyHistogram
+from tests.stub_server import StubProvider
+
+
+class HedgePolicyTest(unittest.TestCase):
+    def test_max_delay_until_enough_samples(self):
+        policy = HedgePolicy(min_delay=0.5, max_delay=4.0, min_samples=5)
+        for _ in range(4):
+            policy.record_first_token("openai", 0.2)
+        self.assertEqual(policy.delay_for("openai"), 4.0)
+        policy.record_first_token("openai", 0.2)
+        self.assertEqual(policy.delay_for("openai"), 0.5) # p95 of 0.2 s, clamped up
+
+    def test_delay_follows_the_slow_tail(self):
+        policy = HedgePolicy(percentile=0.95, min_delay=0.5, max_delay=4.0, min_samples=5)
+        for _ in range(18):
+            policy.record_first_token("openai", 0.3)
+        for _ in range(2):
+            policy.record_first_token("openai", 1.8)
+        self.assertEqual(policy.delay_for("openai"), 2.0)
+        self.assertEqual(policy.delay_for("deepseek"), 4.0) # Tracked per endpoint
+
+    def test_histogram_percentile(self):
+        histogram = LatencyHistogram()
+        self.assertIsNone(histogram.percentile(0.5))
+        for seconds in (0.04, 0.12, 0.9, 25.0):
+            histogram.record(seconds)
+        self.assertEqual(histogram.percentile(0.5), 0.15)
+        self.assertEqual(histogram.percentile(1.0), 30.0)
+
+
+class HedgingTest(unittest.TestCase):
+    """A primary and a fallback stub provider with different latencies."""
+
+    def setUp(self):
+        self.primary = StubProvider(header_delay=3.0, answer="primary").__enter__()
+        self.fallback = StubProvider(answer="fallback").__enter__()
+        self.dispatcher = ChatDispatcher(hedge_policy=HedgePolicy(min_delay=0.5, max_delay=0.5), max_retries=0)
+
+    def tearDown(self):
+        self.dispatcher.shutdown()
+        self.dispatcher.client_pool.close()
+        self.primary.__exit__()
+        self.fallback.__exit__()
+
+    def ask(self, timeout=5):
+        finished = threading.Event()
+        result = []
+        start = time.monotonic()
+        self.dispatcher.submit(
+            "primary-key", "gpt-4o", "hello", base_url=self.primary.url,
+            fallbacks=[ChatTarget("fallback-key", "gpt-4o", self.fallback.url)],
+            on_done=lambda _, text: (result.append(("done", text)), finished.set()),
+            on_error=lambda _, error: (result.append(("error", error)), finished.set()))
+        self.assertTrue(finished.wait(timeout), "no answer")
+        return result[0], time.monotonic() - start
+
+    def test_slow_primary_is_hedged(self):
+        result, elapsed = self.ask()
+        self.assertEqual(result, ("done", "fallback"))
+        self.assertLess(elapsed, 1.5)
+        # The losing request was aborted
+        self.assertTrue(self.primary.disconnected.wait(1.0))
+
+    def test_fast_primary_is_not_hedged(self):
+        self.primary.header_delay = 0.0
+        result, _ = self.ask()
+        self.assertEqual(result, ("done", "primary"))
+        time.sleep(0.7) # Past the hedge delay
+        self.assertEqual(self.fallback.requests, [])
+
+    def test_failing_primary_fails_over(self):
+        self.primary.header_delay = 0.0
+        self.primary.status = 500
+        result, elapsed = self.ask()
+        self.assertEqual(result, ("done", "fallback"))
+        self.assertLess(elapsed, 0.5) # Didn't wait for the hedge delay
+
+    def test_error_when_every_target_fails(self):
+        self.primary.header_delay = 0.0
+        self.primary.status = 500
+        self.fallback.status = 500
+        result, _ = self.ask()
+        self.assertEqual(result[0], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
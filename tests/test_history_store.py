@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from assets.py.chat.chat_history_module import HistoryStore
+from assets.py.chat.journal_module import _checksum
+
+
+class HistoryStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.dir, "history.db"))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def triggers(self):
+        return {row["name"] for row in self.store.query("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+
+    def search_ids(self, text):
+        return [row["rowid"] for row in self.store.query(
+            "SELECT rowid FROM messages_trigram WHERE messages_trigram MATCH ?", (f'"{text}"',))]
+
+    def test_failed_bulk_write_keeps_index_triggers(self):
+        if not self.store.trigram:
+            self.skipTest("SQLite without the trigram tokenizer")
+        chat_id = self.store.create_chat("giraffes")
+        self.store.append_message(chat_id, {"sender": "user", "text": "tell me about giraffes"})
+        triggers = self.triggers()
+
+        with self.assertRaises(RuntimeError):
+            with self.store._lock, self.store._conn, self.store._bulk("delete"):
+                self.store._conn.execute("DELETE FROM chats")
+                raise RuntimeError("failed mid-way")
+
+        # Rolled back: the chat and every trigger are still there
+        self.assertEqual(self.triggers(), triggers)
+        self.assertEqual([c["id"] for c in self.store.list_chats()], [chat_id])
+
+        # The indexes still follow deletes, so a reused row id matches only its own text
+        self.store.delete_chat(chat_id)
+        self.assertEqual(self.search_ids("giraffes"), [])
+        other = self.store.create_chat("elephants")
+        self.store.append_message(other, {"sender": "user", "text": "and elephants"})
+        self.assertEqual(self.search_ids("giraffes"), [])
+        self.assertEqual(len(self.search_ids("elephants")), 1)
+
+    def test_clear_keeps_index_in_sync(self):
+        for title in ("one", "two"):
+            chat_id = self.store.create_chat(title)
+            self.store.append_message(chat_id, {"sender": "user", "text": f"message {title}"})
+        self.store.clear()
+        self.assertEqual(self.store.list_chats(), [])
+        if self.store.trigram:
+            self.assertEqual(self.search_ids("message"), [])
+
+    def test_append_returns_position_and_truncate_cuts_there(self):
+        chat_id = self.store.create_chat("chat")
+        positions = [self.store.append_message(chat_id, {"sender": "user", "text": str(i)}) for i in range(4)]
+        self.assertEqual(positions, [0, 1, 2, 3])
+        self.store.truncate_messages(chat_id, 2)
+        start, messages = self.store.load_tail(chat_id, 10)
+        self.assertEqual((start, [m["text"] for m in messages]), (0, ["0", "1"]))
+        chat = self.store.get_chat(chat_id)
+        self.assertEqual((chat["message_count"], chat["last_snippet"]), (2, "1"))
+
+    def test_save_tokens(self):
+        chat_id = self.store.create_chat("chat")
+        for i in range(3):
+            self.store.append_message(chat_id, {"sender": "user", "text": str(i), "prompt": f"prompt {i}"})
+        self.store.save_tokens(chat_id, {0: 5, 2: 7})
+        _, messages = self.store.load_tail(chat_id, 10)
+        self.assertEqual([m.get("tokens") for m in messages], [5, None, 7])
+        self.assertEqual(messages[2]["prompt"], "prompt 2") # Other fields are kept
+
+    def test_import_legacy_chats(self):
+        history = os.path.join(self.dir, "chats")
+        os.makedirs(os.path.join(history, "archive"))
+        with open(os.path.join(history, "20240101_120000_Plain.json"), "w", encoding="utf-8") as f:
+            json.dump([{"sender": "user", "text": "hi"}, {"sender": "ai", "text": "hello"}], f)
+        records = [{"op": "append", "message": {"sender": "user", "text": str(i)}} for i in range(3)]
+        records.append({"op": "truncate", "count": 2})
+        with open(os.path.join(history, "archive", "20240102_120000_Journal.jsonl"), "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(dict(record, crc=_checksum(record))) + "\n")
+            f.write('{"op": "append", "message": {"sender": "user", "text": "torn"')
+
+        self.assertEqual(self.store.import_legacy(history), 2)
+        self.assertEqual(self.store.import_legacy(history), 0) # Only once
+        plain, = self.store.list_chats()
+        journal, = self.store.list_chats(archived=True)
+        self.assertEqual((plain["title"], plain["message_count"]), ("Plain", 2))
+        self.assertEqual((journal["title"], journal["message_count"]), ("Journal", 2))
+        _, messages = self.store.load_tail(journal["id"], 10)
+        self.assertEqual([m["text"] for m in messages], ["0", "1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
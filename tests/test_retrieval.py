@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from assets.py.chat.retrieval_module import IndexCache
+
+
+def document(word, lines=400):
+    return "".join(f"line {i} about {word} and other things\n" for i in range(lines))
+
+
+class IndexCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_slow_build_does_not_block_other_keys(self):
+        cache = IndexCache(self.dir)
+        started = threading.Event()
+        builds = []
+
+        def slow_text():
+            builds.append("slow")
+            started.set()
+            time.sleep(0.5)
+            return document("slow")
+
+        def get_slow():
+            cache.get("slow", slow_text)
+
+        threads = [threading.Thread(target=get_slow) for _ in range(2)]
+        for t in threads:
+            t.start()
+        started.wait(1)
+
+        begin = time.monotonic()
+        cache.get("fast", lambda: document("fast"))
+        self.assertLess(time.monotonic() - begin, 0.25)
+
+        for t in threads:
+            t.join()
+        # The second request for the same key waited for the first build
+        self.assertEqual(builds, ["slow"])
+
+    def test_disk_tier_is_bounded(self):
+        cache = IndexCache(self.dir, max_entries=1)
+        cache.get("a", lambda: document("a"))
+        size = os.path.getsize(os.path.join(self.dir, "a.json"))
+
+        cache = IndexCache(self.dir, max_entries=1, max_disk_bytes=int(size * 2.5))
+        for key in "bcde":
+            cache.get(key, lambda: document(key))
+        files = sorted(os.listdir(self.dir))
+        self.assertLessEqual(sum(os.path.getsize(os.path.join(self.dir, f)) for f in files), size * 2.5)
+        # The oldest indexes went first
+        self.assertNotIn("a.json", files)
+        self.assertIn("e.json", files)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from assets.py.chat import search_module
+from assets.py.chat.chat_history_module import HistoryStore
+from assets.py.chat.search_module import SearchModule
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.store = HistoryStore(os.path.join(self.dir, "history.db"))
+        self.search = SearchModule(self.store)
+
+    def tearDown(self):
+        self.search.close()
+        self.store.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def add_chat(self, title, texts, archived=False):
+        chat_id = self.store.create_chat(title)
+        for text in texts:
+            self.store.append_message(chat_id, {"sender": "user", "text": text})
+        if archived:
+            self.store.set_archived(chat_id)
+        return chat_id
+
+    def test_finds_matches_beyond_one_page(self):
+        old = self.add_chat("old", ["a giraffe long ago"])
+        archived = self.add_chat("archived", ["giraffe in the archive"] * 3, archived=True)
+        new = self.add_chat("new", [f"giraffe number {i}" for i in range(25)])
+        others = [self.add_chat(f"other {i}", [f"giraffe {i}"]) for i in range(3)]
+        for query in ("giraffe", "gi"): # Trigram and word index
+            with self.subTest(query=query), mock.patch.object(search_module, "HIT_PAGE", 10), \
+                 mock.patch.object(search_module, "CHAT_PAGE", 2):
+                results = {r["chat_id"]: r for r in self.search.search(query)}
+                self.assertEqual(set(results), {old, new, *others})
+                self.assertEqual(len(results[new]["snippets"]), 25)
+                self.assertEqual(len(results[old]["snippets"]), 1)
+        self.assertNotIn(archived, results)
+
+    def test_pages_come_newest_first(self):
+        chats = [self.add_chat(f"chat {i}", [f"giraffe {i}"] * (i + 1)) for i in range(5)]
+        self.add_chat("giraffes", ["nothing here"])
+        with mock.patch.object(search_module, "CHAT_PAGE", 2):
+            pages = [[r["chat_id"] for r in page] for page in self.search.pages("giraffe")]
+        titled = pages.pop(0)
+        self.assertEqual(len(titled), 1) # Title matches first
+        self.assertEqual([set(page) for page in pages], [set(chats[3:]), set(chats[1:3]), {chats[0]}])
+
+    def test_word_query_matches_word_starts(self):
+        match = self.add_chat("one", ["gimme that"])
+        self.add_chat("two", ["magic trick"])
+        self.assertEqual([r["chat_id"] for r in self.search.search("gi")], [match])
+
+    def test_no_match_gives_one_empty_page(self):
+        self.add_chat("chat", ["hello"])
+        self.assertEqual(list(self.search.pages("giraffe")), [[]])
+
+    def test_cancelled_between_pages(self):
+        for i in range(5):
+            self.add_chat(f"chat {i}", [f"giraffe number {i}"])
+        checks = []
+        def cancelled():
+            checks.append(1)
+            return len(checks) > 2
+        with mock.patch.object(search_module, "CHAT_PAGE", 1):
+            pages = list(self.search.pages("giraffe", cancelled=cancelled))
+            self.assertEqual(len(pages), 3)
+            self.assertIsNone(pages[-1])
+            self.assertIsNone(self.search.search("giraffe", cancelled=lambda: True))
+
+
+if __name__ == "__main__":
+    unittest.main()